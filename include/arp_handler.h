@@ -3,10 +3,13 @@
 
 #include <rte_mbuf.h>
 
-// ARP处理函数
+// ARP处理函数: 先筛出发给本机的请求, 再批量分配响应 (nb_pkts <= BURST_SIZE)
+int handle_arp_burst(struct rte_mempool *endsys_pktmbuf_pool, struct rte_mbuf **pkts, uint16_t nb_pkts,
+                     uint16_t port_id);
+
 int handle_arp_packet(struct rte_mempool *endsys_pktmbuf_pool,struct rte_mbuf *pkt, uint16_t port_id);
 
 // 初始化ARP处理器
-int init_arp_handler(const char *ip_addr);
+int init_arp_handler(void);
 
 #endif /* ARP_HANDLER_H */
\ No newline at end of file
@@ -0,0 +1,16 @@
+#ifndef BENCH_H
+#define BENCH_H
+
+#include <stdint.h>
+#include "worker.h"
+
+// 每包周期直方图: 线性分桶, 最后一个桶包含所有更大的值
+#define BENCH_HIST_BUCKETS 256
+#define BENCH_HIST_WIDTH 8
+
+// 基准测试模式: 把抓包读入内存中的mbuf数组, 以BURST_SIZE为单位反复交给process_burst,
+// 不经过网卡收包; 先跑一遍预热, 再计时passes遍
+// 结果以JSON写入json_path, 为NULL时写到标准输出
+int bench_run(struct worker_conf *conf, const char *pcap_path, uint32_t passes, const char *json_path);
+
+#endif /* BENCH_H */
@@ -0,0 +1,51 @@
+#ifndef FLOW_TABLE_H
+#define FLOW_TABLE_H
+
+#include <stdint.h>
+#include <rte_hash.h>
+
+#define FLOW_TABLE_SIZE 65536
+// 空闲超时, 按RoCE包的MAC时间戳计 (ns); 必须大于FLOWLET_TIMEOUT
+#define FLOW_IDLE_TIMEOUT_NS 1000000000ULL
+// 每个burst最多检查的表项数, 老化开销与活跃流数无关
+#define FLOW_EXPIRE_BATCH 32
+
+// 流键: 源IP (网络字节序) + 目的QP
+struct flow_key {
+    uint32_t src_ip;
+    uint32_t dst_qp;
+};
+
+// 每个流的flowlet状态
+struct flow_state {
+    struct flow_key key;
+    uint64_t last_timestamp;    // 上一个包的MAC时间戳, 新流为0
+    uint64_t pause_until;       // 最近一次PFC暂停的结束时刻 (MAC时间戳)
+    uint64_t pfc_sent;
+    uint8_t in_use;
+};
+
+// 每个worker独占一张表, 不需要加锁
+struct flow_table {
+    struct rte_hash *hash;
+    struct flow_state *states;  // 按rte_hash返回的位置索引
+    uint32_t entries;
+    uint32_t active;
+    uint32_t expire_cursor;
+    uint64_t idle_ns;
+    uint64_t now;               // 已见到的最大MAC时间戳
+};
+
+struct flow_table *flow_table_create(const char *name, uint32_t entries, uint64_t idle_ns, int socket_id);
+
+void flow_table_free(struct flow_table *ft);
+
+// 批量查找n个键 (n <= RTE_HASH_LOOKUP_BULK_MAX), 未命中的插入新表项; 表满时states[i]为NULL
+// 返回新建的流数, 参数错误返回负值
+int flow_table_lookup_bulk(struct flow_table *ft, const struct flow_key *keys, uint32_t n,
+                           struct flow_state **states);
+
+// 从上次位置起检查最多budget个表项, 删除空闲超过idle_ns的流, 返回删除数
+uint32_t flow_table_expire(struct flow_table *ft, uint32_t budget);
+
+#endif /* FLOW_TABLE_H */
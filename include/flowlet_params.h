@@ -0,0 +1,43 @@
+#ifndef FLOWLET_PARAMS_H
+#define FLOWLET_PARAMS_H
+
+#include <stdint.h>
+#include <rte_ether.h>
+
+#define DEFAULT_LOCAL_IP "10.10.10.3"
+
+// 可在运行时修改的flowlet参数, 默认值为roce_handler.h中的宏
+struct flowlet_params {
+    uint64_t flowlet_timeout;       // ns
+    uint64_t time_gap;              // ns, 间隔不小于该值才可能触发PFC
+    uint64_t stop_time;             // ns, 固定暂停时间; 0表示按 1+flowlet_timeout-间隔 计算
+    double quanta_ns;               // 一个quanta的时长
+    uint32_t local_ip;              // 网络字节序
+    struct rte_ether_addr pfc_dst;  // PFC帧的目的MAC
+};
+
+// 用默认值填充
+void flowlet_params_defaults(struct flowlet_params *p);
+
+// 按名称修改一项: flowlet_timeout, time_gap, stop_time, quanta_ns, local_ip, pfc_dst
+// 名称或取值无效返回负值
+int flowlet_params_set(struct flowlet_params *p, const char *name, const char *value);
+
+// 检查参数组合, 不合法时把原因写入err并返回负值
+// idle_ns为流表的空闲超时, flowlet_timeout不能超过它
+int flowlet_params_check(const struct flowlet_params *p, uint64_t idle_ns, char *err, size_t err_len);
+
+// 发布初始参数; 必须在worker启动前调用
+int flowlet_params_init(const struct flowlet_params *p, uint64_t idle_ns);
+
+// 在当前参数上应用 "name=value,name=value" 形式的修改并发布, 由控制线程调用
+// 任一项无效则不做任何修改
+int flowlet_params_update(const char *assignments, char *err, size_t err_len);
+
+// 读取当前参数的一致快照, 返回其版本号; 只在版本号变化时调用
+uint32_t flowlet_params_read(struct flowlet_params *p);
+
+// 当前发布的版本号, 数据面每个burst检查一次
+uint32_t flowlet_params_generation(void);
+
+#endif /* FLOWLET_PARAMS_H */
@@ -5,22 +5,49 @@
 #include <rte_ip.h>
 #include <rte_udp.h>
 
-// 协议处理函数的类型定义
-typedef int (*protocol_handler_fn)(struct rte_mempool *endsys_pktmbuf_pool,struct rte_mbuf *pkt, uint16_t port_id);
+struct worker_conf;
+
+#define MAX_HANDLERS 32             // 包括下标0的"未注册"
+#define ROCE_UDP_PORT 4791
+
+// 协议处理函数的类型定义, 每次处理同一类型的一组包 (nb_pkts <= BURST_SIZE)
+// 处理函数只读取pkts, 不释放也不转发; 收到的mbuf由收包循环在burst处理完后统一释放
+typedef int (*protocol_handler_fn)(struct rte_mempool *endsys_pktmbuf_pool, struct rte_mbuf **pkts,
+                                   uint16_t nb_pkts, uint16_t port_id);
 
 // 协议处理器结构体
 struct protocol_handler {
-    uint16_t type;                  // 协议类型
+    const char *name;
     protocol_handler_fn handler;    // 处理函数
 };
 
-// 注册协议处理器
-int register_protocol_handler(uint16_t type, protocol_handler_fn handler);
+// 注册以太网类型的处理器; 同一类型重复注册时替换
+int register_protocol_handler(uint16_t type, const char *name, protocol_handler_fn handler);
+
+// 注册RoCE处理器: UDP源端口为4791的IPv4包交给它, 其余IPv4包仍按以太网类型分发
+int register_roce_handler(const char *name, protocol_handler_fn handler);
+
+// 已注册处理器的个数 (含下标0) 和名称, 用于按处理器输出统计
+int protocol_handler_count(void);
+const char *protocol_handler_name(int slot);
 
-// 处理数据包
+// 处理单个数据包
 int process_packet(struct rte_mempool *endsys_pktmbuf_pool,struct rte_mbuf *pkt, uint16_t port_id);
 
+// 基准测试时按处理器累计的TSC周期和包数, 正常运行时传NULL, 不计时
+// 下标与处理器编号一致, 0为没有处理器的包
+struct dispatch_cycles {
+    uint64_t classify_cycles;       // 分类和分组
+    uint64_t cycles[MAX_HANDLERS];
+    uint64_t pkts[MAX_HANDLERS];
+};
+
+// 处理一个burst (nb_pkts <= BURST_SIZE): 先按以太网类型 (IPv4再按UDP端口区分RoCE) 查表分类,
+// 再以每个处理器一组的方式各调用一次; 不刷新发送缓冲, 也不释放mbuf
+void process_burst(struct worker_conf *conf, struct rte_mbuf **pkts, uint16_t nb_pkts,
+                   struct dispatch_cycles *cycles);
+
 // 初始化协议处理系统
 int init_protocol_handlers(void);
 
-#endif /* PROTOCOL_HANDLER_H */
\ No newline at end of file
+#endif /* PROTOCOL_HANDLER_H */
@@ -1,8 +1,12 @@
 #ifndef ROCE_HANDLER_H
 #define ROCE_HANDLER_H
 #include <rte_mbuf.h>
+#include <rte_ether.h>
 
 #define RTE_ETHER_TYPE_CTL 0x8808
+// 以下为默认值, 可用命令行参数或遥测命令 /prototype/set_params 在运行时修改 (见flowlet_params.h)
+// PFC帧的目的MAC; 标准地址为 01:80:c2:00:00:01
+#define PFC_DST_MAC "e8:eb:d3:58:a0:2c"
 // 100Gbps 的quanta大小为5.12ns
 #define QUANTA_DURATION_NS 5.12
 // 单位 ns
@@ -14,11 +18,6 @@
 
 //#define USE_DSCP_VALUE
 
-static uint32_t local_ip;
-static uint64_t last_timestamp;
-static uint64_t time_gap;
-
-static struct rte_ether_addr local_mac;
 struct pfc_header
 {
     uint16_t opcode;
@@ -27,6 +26,13 @@ struct pfc_header
     char pad[26];
 } __attribute__((__packed__));
 
+// 完整的PFC帧, 以太网头 + PFC头
+struct pfc_frame
+{
+    struct rte_ether_hdr eth;
+    struct pfc_header pfc;
+} __attribute__((__packed__));
+
 struct roce_header {  
     uint8_t opcode;        // 操作码  
     uint8_t flags;         // 标志位  
@@ -35,12 +41,20 @@ struct roce_header {
     uint32_t qp_num;       // QP号  
     uint8_t ack_request;
     uint32_t psn;         // 包序列号  
-} __attribute__((__packed__));  
+} __attribute__((__packed__));
+
+// roce处理函数: 整个burst批量查找流表后按到达顺序逐包判定
+int handle_roce_burst(struct rte_mempool *endsys_pktmbuf_pool, struct rte_mbuf **pkts, uint16_t nb_pkts,
+                      uint16_t port_id);
 
-// roce处理函数
 int handle_roce_packet(struct rte_mempool *endsys_pktmbuf_pool,struct rte_mbuf *pkt, uint16_t port_id);
 
+struct worker_conf;
+
+// 读取最新发布的参数并重建本worker的PFC帧模板
+void roce_apply_params(struct worker_conf *conf);
+
 // 初始化UDP处理器
-int init_roce_handler(const char *ip_addr);
+int init_roce_handler(void);
 
 #endif /* ROCE_HANDLER_H */
\ No newline at end of file
@@ -0,0 +1,17 @@
+#ifndef TELEMETRY_H
+#define TELEMETRY_H
+
+#include <stdint.h>
+#include "worker.h"
+
+// 注册rte_telemetry命令, 通过 /var/run/dpdk/<prefix>/dpdk_telemetry.v2 查询:
+//   /prototype/stats[,queue]       计数器, 不带队列号时为所有队列之和
+//   /prototype/gap_hist[,queue]    RoCE包间隔的log2直方图 (ns)
+//   /prototype/cycle_hist[,queue]  每个burst处理周期的log2直方图 (TSC)
+//   /prototype/params              当前flowlet参数, 以及所有worker已应用的版本
+//   /prototype/set_params,a=1,b=2  修改flowlet参数, 返回新参数或错误原因
+// 命令在遥测线程中执行, 只读取worker的计数器, 数据面不需要任何同步;
+// 参数通过seqlock发布, worker每个burst检查一次版本号 (见flowlet_params.h)
+int telemetry_init(struct worker_conf *workers, uint16_t nb_queues);
+
+#endif /* TELEMETRY_H */
@@ -3,10 +3,13 @@
 
 #include <rte_mbuf.h>
 
-// UDP处理函数
+// UDP处理函数: 先筛出发给本机的包, 再批量分配响应 (nb_pkts <= BURST_SIZE)
+int handle_udp_burst(struct rte_mempool *endsys_pktmbuf_pool, struct rte_mbuf **pkts, uint16_t nb_pkts,
+                     uint16_t port_id);
+
 int handle_udp_packet(struct rte_mempool *endsys_pktmbuf_pool,struct rte_mbuf *pkt, uint16_t port_id);
 
 // 初始化UDP处理器
-int init_udp_handler(const char *ip_addr);
+int init_udp_handler(void);
 
 #endif /* UDP_HANDLER_H */
\ No newline at end of file
@@ -0,0 +1,101 @@
+#ifndef WORKER_H
+#define WORKER_H
+
+#include <stdint.h>
+#include <rte_common.h>
+#include <rte_mempool.h>
+#include <rte_ether.h>
+#include <rte_ethdev.h>
+#include <rte_per_lcore.h>
+#include <rte_bitops.h>
+#include "flow_table.h"
+#include "flowlet_params.h"
+#include "roce_handler.h"
+
+#define BURST_SIZE 32              // 每次收包的最大个数
+#define PFC_STASH_SIZE 32          // 预分配的PFC帧mbuf数, 用尽时批量补充
+
+// 按以太网类型计数的分类
+enum ether_class {
+    ETHER_CLASS_IPV4,
+    ETHER_CLASS_ARP,
+    ETHER_CLASS_CTL,            // 0x8808 MAC控制帧 (PFC)
+    ETHER_CLASS_OTHER,
+    ETHER_CLASS_MAX,
+};
+
+// log2直方图: 桶0为0, 桶i为 [2^(i-1), 2^i), 最后一个桶包含所有更大的值
+#define GAP_HIST_BUCKETS 49         // RoCE包间隔 (ns), 时间戳为48位
+#define CYCLE_HIST_BUCKETS 32       // 每个burst从收包返回到处理完的TSC周期
+
+// 每个worker的计数器, 只由所属lcore写入, 汇总和遥测只读, 不使用原子操作
+// 所有字段均为uint64_t, 汇总时按数组逐项累加
+struct worker_stats {
+    uint64_t rx_pkts;
+    uint64_t rx_bursts;
+    uint64_t ether_pkts[ETHER_CLASS_MAX];
+    uint64_t roce_pkts;
+    uint64_t gaps_below;            // 间隔小于TIME_GAP
+    uint64_t gaps_above;            // 间隔大于FLOWLET_TIMEOUT
+    uint64_t pfc_sent;
+    uint64_t tx_failed;
+    uint64_t alloc_failed;
+    uint64_t flow_table_full;       // 流表已满而未跟踪的RoCE包
+    uint64_t flows_expired;
+    uint64_t reaction_bursts;       // 发出了响应帧的burst数
+    uint64_t reaction_cycles;       // 这些burst从收包返回到发送队列刷新的TSC周期之和
+    uint64_t gap_hist[GAP_HIST_BUCKETS];
+    uint64_t cycle_hist[CYCLE_HIST_BUCKETS];
+} __rte_cache_aligned;
+
+// 每个RX/TX队列对应一个worker lcore
+struct worker_conf {
+    unsigned lcore_id;
+    uint16_t port_id;
+    uint16_t queue_id;              // 收包和发包都使用该队列
+    struct rte_mempool *pool;       // 本队列独占的mbuf池
+    struct flow_table *flows;       // 本队列的每流flowlet状态
+    struct rte_eth_dev_tx_buffer *tx_buffer;    // 处理函数的发包缓冲, 每个burst结束时刷新
+    uint32_t params_gen;            // 已应用的参数版本, 与flowlet_params_generation()不同时重新读取
+    struct flowlet_params params;   // 本worker使用的参数快照
+    struct pfc_frame pfc_template;  // 按当前参数构造的PFC帧, 发送时整体拷贝
+    uint16_t pfc_stash_len;
+    struct rte_mbuf *pfc_stash[PFC_STASH_SIZE];
+    struct worker_stats stats;
+} __rte_cache_aligned;
+
+static inline unsigned log2_bucket(uint64_t value, unsigned nb_buckets)
+{
+    unsigned bucket = rte_fls_u64(value);
+
+    return bucket < nb_buckets ? bucket : nb_buckets - 1;
+}
+
+static inline void worker_stats_add(struct worker_stats *total, const struct worker_stats *s)
+{
+    uint64_t *dst = (uint64_t *)total;
+    const uint64_t *src = (const uint64_t *)s;
+    size_t k;
+
+    for (k = 0; k < sizeof(*s) / sizeof(uint64_t); k++)
+        dst[k] += src[k];
+}
+
+static inline enum ether_class ether_class_of(rte_be16_t ether_type)
+{
+    switch (rte_be_to_cpu_16(ether_type)) {
+    case RTE_ETHER_TYPE_IPV4:
+        return ETHER_CLASS_IPV4;
+    case RTE_ETHER_TYPE_ARP:
+        return ETHER_CLASS_ARP;
+    case 0x8808:
+        return ETHER_CLASS_CTL;
+    default:
+        return ETHER_CLASS_OTHER;
+    }
+}
+
+// 当前lcore的worker, 供协议处理函数取队列号、状态和计数器
+RTE_DECLARE_PER_LCORE(struct worker_conf *, worker_ctx);
+
+#endif /* WORKER_H */
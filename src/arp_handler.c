@@ -2,25 +2,20 @@
 #include <rte_arp.h>
 #include <rte_ethdev.h>
 #include "arp_handler.h"
+#include "worker.h"
 
-static uint32_t local_ip;
 static struct rte_ether_addr local_mac;
 
-int init_arp_handler(const char *ip_addr) {
-    // 转换IP地址字符串为网络字节序的32位整数
-    if (inet_pton(AF_INET, ip_addr, &local_ip) != 1) {
-        return -1;
-    }
-
+int init_arp_handler(void) {
     // 获取本地MAC地址
     rte_eth_macaddr_get(0, &local_mac);
     return 0;
 }
 
-int handle_arp_packet(struct rte_mempool *endsys_pktmbuf_pool,struct rte_mbuf *pkt, uint16_t port_id) {
+// 按请求构建ARP响应
+static inline void build_arp_reply(struct rte_mbuf *arp_reply, struct rte_mbuf *pkt, uint32_t local_ip) {
     struct rte_ether_hdr *eth_hdr;
     struct rte_arp_hdr *arp_hdr;
-    struct rte_mbuf *arp_reply;
     struct rte_ether_hdr *reply_eth_hdr;
     struct rte_arp_hdr *reply_arp_hdr;
 
@@ -28,24 +23,6 @@ int handle_arp_packet(struct rte_mempool *endsys_pktmbuf_pool,struct rte_mbuf *p
     arp_hdr = rte_pktmbuf_mtod_offset(pkt, struct rte_arp_hdr *, 
                                      sizeof(struct rte_ether_hdr));
 
-    // 只处理ARP请求
-    if (rte_be_to_cpu_16(arp_hdr->arp_opcode) != RTE_ARP_OP_REQUEST) {
-        rte_pktmbuf_free(pkt);
-        return 0;
-    }
-
-    // 检查目标IP是否匹配
-    if (arp_hdr->arp_data.arp_tip != local_ip) {
-        rte_pktmbuf_free(pkt);
-        return 0;
-    }
-
-    // 分配新的mbuf用于ARP响应
-    arp_reply = rte_pktmbuf_alloc(endsys_pktmbuf_pool);
-    if (arp_reply == NULL) {
-        rte_pktmbuf_free(pkt);
-        return -1;
-    }
     // 计算总长度
     uint16_t total_length = sizeof(struct rte_ether_hdr) + sizeof(struct rte_arp_hdr);
     arp_reply->data_len = total_length;
@@ -71,13 +48,44 @@ int handle_arp_packet(struct rte_mempool *endsys_pktmbuf_pool,struct rte_mbuf *p
     rte_ether_addr_copy(&arp_hdr->arp_data.arp_sha, 
                         &reply_arp_hdr->arp_data.arp_tha);
     reply_arp_hdr->arp_data.arp_tip = arp_hdr->arp_data.arp_sip;
+}
 
-    // 发送响应
-    if(rte_eth_tx_burst(port_id, 0, &arp_reply, 1) < 1) {  
-        rte_pktmbuf_free(arp_reply);  
-        printf("ARP Reply Send Failed.");
-    }  
-    rte_pktmbuf_free(pkt);
-    
+int handle_arp_burst(struct rte_mempool *endsys_pktmbuf_pool, struct rte_mbuf **pkts, uint16_t nb_pkts,
+                     uint16_t port_id) {
+    struct worker_conf *conf = RTE_PER_LCORE(worker_ctx);
+    struct rte_mbuf *requests[BURST_SIZE];
+    struct rte_mbuf *replies[BURST_SIZE];
+    struct rte_arp_hdr *arp_hdr;
+    // 本机IP随运行时参数变化, 取本worker的参数快照
+    uint32_t local_ip = conf->params.local_ip;
+    uint16_t i, n = 0;
+
+    for (i = 0; i < nb_pkts && n < BURST_SIZE; i++) {
+        arp_hdr = rte_pktmbuf_mtod_offset(pkts[i], struct rte_arp_hdr *, 
+                                         sizeof(struct rte_ether_hdr));
+
+        // 只处理目标IP匹配的ARP请求
+        if (rte_be_to_cpu_16(arp_hdr->arp_opcode) != RTE_ARP_OP_REQUEST ||
+            arp_hdr->arp_data.arp_tip != local_ip)
+            continue;
+        requests[n++] = pkts[i];
+    }
+    if (n == 0)
+        return 0;
+
+    // 一次分配所有ARP响应的mbuf
+    if (rte_pktmbuf_alloc_bulk(endsys_pktmbuf_pool, replies, n) != 0) {
+        conf->stats.alloc_failed += n;
+        return -1;
+    }
+    for (i = 0; i < n; i++) {
+        build_arp_reply(replies[i], requests[i], local_ip);
+        // 发送响应, 放入本lcore的发送缓冲, 失败由缓冲回调计数
+        rte_eth_tx_buffer(port_id, conf->queue_id, conf->tx_buffer, replies[i]);
+    }
     return 0;
-}
\ No newline at end of file
+}
+
+int handle_arp_packet(struct rte_mempool *endsys_pktmbuf_pool,struct rte_mbuf *pkt, uint16_t port_id) {
+    return handle_arp_burst(endsys_pktmbuf_pool, &pkt, 1, port_id);
+}
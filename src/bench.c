@@ -0,0 +1,302 @@
+#include <errno.h>
+#include <inttypes.h>
+#include <stdio.h>
+#include <string.h>
+#include <rte_byteorder.h>
+#include <rte_cycles.h>
+#include <rte_ethdev.h>
+#include <rte_malloc.h>
+#include <rte_mbuf.h>
+#include "bench.h"
+#include "protocol_handler.h"
+#include "roce_handler.h"
+
+#define PCAP_MAGIC_US 0xa1b2c3d4
+#define PCAP_MAGIC_NS 0xa1b23c4d
+#define PCAP_LINKTYPE_ETHERNET 1
+
+struct pcap_file_header {
+    uint32_t magic;
+    uint16_t version_major;
+    uint16_t version_minor;
+    int32_t thiszone;
+    uint32_t sigfigs;
+    uint32_t snaplen;
+    uint32_t linktype;
+};
+
+struct pcap_record_header {
+    uint32_t ts_sec;
+    uint32_t ts_frac;
+    uint32_t caplen;
+    uint32_t len;
+};
+
+// 内存中的抓包, 每个包一个mbuf, 测试期间只读
+struct bench_capture {
+    struct rte_mempool *pool;
+    struct rte_mbuf **pkts;
+    uint32_t nb_pkts;
+    uint32_t skipped;               // 超过mbuf数据区的包
+    uint64_t bytes;
+};
+
+struct bench_hist {
+    uint64_t counts[BENCH_HIST_BUCKETS];
+    uint64_t total;
+};
+
+static inline void hist_add(struct bench_hist *h, uint64_t cycles)
+{
+    uint64_t bucket = cycles / BENCH_HIST_WIDTH;
+
+    h->counts[bucket < BENCH_HIST_BUCKETS ? bucket : BENCH_HIST_BUCKETS - 1]++;
+    h->total++;
+}
+
+// 分位数所在桶的上界 (周期)
+static uint64_t hist_percentile(const struct bench_hist *h, double q)
+{
+    uint64_t target = (uint64_t)(q * h->total), seen = 0;
+    unsigned k;
+
+    for (k = 0; k < BENCH_HIST_BUCKETS; k++) {
+        seen += h->counts[k];
+        if (seen > target)
+            break;
+    }
+    return (uint64_t)(k + 1) * BENCH_HIST_WIDTH;
+}
+
+static int read_header(FILE *f, struct pcap_file_header *hdr, int *swapped)
+{
+    if (fread(hdr, sizeof(*hdr), 1, f) != 1)
+        return -EINVAL;
+    *swapped = hdr->magic == rte_bswap32(PCAP_MAGIC_US) || hdr->magic == rte_bswap32(PCAP_MAGIC_NS);
+    if (*swapped) {
+        hdr->magic = rte_bswap32(hdr->magic);
+        hdr->linktype = rte_bswap32(hdr->linktype);
+    }
+    if (hdr->magic != PCAP_MAGIC_US && hdr->magic != PCAP_MAGIC_NS) {
+        printf("Bench: only classic pcap files are supported\n");
+        return -EINVAL;
+    }
+    if ((hdr->linktype & 0xFFFF) != PCAP_LINKTYPE_ETHERNET) {
+        printf("Bench: unsupported link type %u\n", hdr->linktype);
+        return -EINVAL;
+    }
+    return 0;
+}
+
+static int read_record(FILE *f, struct pcap_record_header *rec, int swapped)
+{
+    if (fread(rec, sizeof(*rec), 1, f) != 1)
+        return 0;
+    if (swapped)
+        rec->caplen = rte_bswap32(rec->caplen);
+    return 1;
+}
+
+// 第一遍数记录数以确定mbuf池大小, 第二遍把包拷贝进mbuf
+static int load_capture(const char *path, struct bench_capture *cap, int socket_id)
+{
+    struct pcap_file_header hdr;
+    struct pcap_record_header rec;
+    uint32_t count = 0;
+    int swapped, ret = 0;
+    FILE *f;
+
+    memset(cap, 0, sizeof(*cap));
+    f = fopen(path, "rb");
+    if (f == NULL) {
+        printf("Bench: cannot open %s: %s\n", path, strerror(errno));
+        return -errno;
+    }
+    if (read_header(f, &hdr, &swapped) != 0) {
+        fclose(f);
+        return -EINVAL;
+    }
+    while (read_record(f, &rec, swapped) && fseek(f, rec.caplen, SEEK_CUR) == 0)
+        count++;
+    if (count == 0) {
+        printf("Bench: %s contains no packets\n", path);
+        fclose(f);
+        return -EINVAL;
+    }
+
+    cap->pool = rte_pktmbuf_pool_create("BENCH_POOL", count, 0, 0, RTE_MBUF_DEFAULT_BUF_SIZE, socket_id);
+    cap->pkts = rte_zmalloc_socket("bench_pkts", (size_t)count * sizeof(struct rte_mbuf *), 0, socket_id);
+    if (cap->pool == NULL || cap->pkts == NULL) {
+        printf("Bench: cannot allocate %u mbufs\n", count);
+        fclose(f);
+        return -ENOMEM;
+    }
+
+    fseek(f, sizeof(hdr), SEEK_SET);
+    while (read_record(f, &rec, swapped)) {
+        struct rte_mbuf *m;
+
+        if (rec.caplen > RTE_MBUF_DEFAULT_DATAROOM) {
+            cap->skipped++;
+            fseek(f, rec.caplen, SEEK_CUR);
+            continue;
+        }
+        m = rte_pktmbuf_alloc(cap->pool);
+        if (m == NULL || fread(rte_pktmbuf_mtod(m, void *), rec.caplen, 1, f) != 1) {
+            rte_pktmbuf_free(m);
+            ret = -EIO;
+            break;
+        }
+        m->data_len = rec.caplen;
+        m->pkt_len = rec.caplen;
+        cap->pkts[cap->nb_pkts++] = m;
+        cap->bytes += rec.caplen;
+    }
+    fclose(f);
+    return ret;
+}
+
+static void free_capture(struct bench_capture *cap)
+{
+    if (cap->pkts != NULL)
+        rte_pktmbuf_free_bulk(cap->pkts, cap->nb_pkts);
+    rte_free(cap->pkts);
+    rte_mempool_free(cap->pool);
+}
+
+// 输出JSON字符串: 转义引号、反斜杠和控制字符
+static void write_json_string(FILE *out, const char *str)
+{
+    const unsigned char *c;
+
+    fputc('"', out);
+    for (c = (const unsigned char *)str; *c; c++) {
+        if (*c == '"' || *c == '\\')
+            fprintf(out, "\\%c", *c);
+        else if (*c < 0x20)
+            fprintf(out, "\\u%04x", *c);
+        else
+            fputc(*c, out);
+    }
+    fputc('"', out);
+}
+
+static void write_hist(FILE *out, const char *name, const struct bench_hist *h)
+{
+    unsigned k, last = 0;
+
+    // 省略末尾的空桶
+    for (k = 0; k < BENCH_HIST_BUCKETS; k++)
+        if (h->counts[k])
+            last = k + 1;
+    fprintf(out, "  \"%s\": {\"bucket_cycles\": %d, \"samples\": %" PRIu64 ", \"p50\": %" PRIu64
+            ", \"p90\": %" PRIu64 ", \"p99\": %" PRIu64 ", \"counts\": [",
+            name, BENCH_HIST_WIDTH, h->total, hist_percentile(h, 0.5), hist_percentile(h, 0.9),
+            hist_percentile(h, 0.99));
+    for (k = 0; k < last; k++)
+        fprintf(out, "%s%" PRIu64, k ? ", " : "", h->counts[k]);
+    fprintf(out, "]}");
+}
+
+static double per_pkt(uint64_t cycles, uint64_t pkts)
+{
+    return pkts ? (double)cycles / pkts : 0.0;
+}
+
+int bench_run(struct worker_conf *conf, const char *pcap_path, uint32_t passes, const char *json_path)
+{
+    struct bench_capture cap;
+    struct dispatch_cycles cycles;
+    struct bench_hist *burst_hist, *roce_hist;
+    int roce = 0, s;
+    uint64_t total_cycles = 0, bursts = 0, start_tsc = 0, packets;
+    const uint64_t hz = rte_get_tsc_hz();
+    double seconds;
+    uint32_t pass, i;
+    FILE *out = stdout;
+    int ret;
+
+    RTE_PER_LCORE(worker_ctx) = conf;
+    roce_apply_params(conf);
+    for (s = 1; s < protocol_handler_count(); s++)
+        if (strcmp(protocol_handler_name(s), "roce") == 0)
+            roce = s;
+
+    ret = load_capture(pcap_path, &cap, rte_socket_id());
+    burst_hist = rte_zmalloc("bench_hist", sizeof(*burst_hist), 0);
+    roce_hist = rte_zmalloc("bench_hist", sizeof(*roce_hist), 0);
+    if (ret != 0 || burst_hist == NULL || roce_hist == NULL) {
+        ret = ret ? ret : -ENOMEM;
+        goto out;
+    }
+    printf("Bench: %u packets (%u skipped) from %s, %u passes\n", cap.nb_pkts, cap.skipped, pcap_path, passes);
+
+    // pass 0 为预热: 填充流表和缓存, 不计入结果
+    for (pass = 0; pass <= passes; pass++) {
+        if (pass == 1) {
+            memset(&conf->stats, 0, sizeof(conf->stats));
+            memset(&cycles, 0, sizeof(cycles));
+            start_tsc = rte_rdtsc();
+        }
+        for (i = 0; i < cap.nb_pkts; i += BURST_SIZE) {
+            uint16_t n = RTE_MIN((uint32_t)BURST_SIZE, cap.nb_pkts - i);
+            uint64_t roce_cycles = cycles.cycles[roce], roce_pkts = cycles.pkts[roce];
+            uint64_t tsc = rte_rdtsc();
+
+            conf->stats.rx_bursts++;
+            conf->stats.rx_pkts += n;
+            process_burst(conf, &cap.pkts[i], n, &cycles);
+            rte_eth_tx_buffer_flush(conf->port_id, conf->queue_id, conf->tx_buffer);
+            tsc = rte_rdtsc() - tsc;
+            if (pass == 0)
+                continue;
+
+            total_cycles += tsc;
+            bursts++;
+            hist_add(burst_hist, tsc / n);
+            if (roce && cycles.pkts[roce] > roce_pkts)
+                hist_add(roce_hist, (cycles.cycles[roce] - roce_cycles) / (cycles.pkts[roce] - roce_pkts));
+        }
+    }
+    seconds = (double)(rte_rdtsc() - start_tsc) / hz;
+    packets = (uint64_t)cap.nb_pkts * passes;
+
+    if (json_path != NULL) {
+        out = fopen(json_path, "w");
+        if (out == NULL) {
+            printf("Bench: cannot write %s: %s\n", json_path, strerror(errno));
+            ret = -errno;
+            goto out;
+        }
+    }
+    fprintf(out, "{\n");
+    fprintf(out, "  \"pcap\": ");
+    write_json_string(out, pcap_path);
+    fprintf(out, ",\n");
+    fprintf(out, "  \"packets\": %" PRIu64 ",\n  \"passes\": %u,\n  \"bursts\": %" PRIu64 ",\n",
+            packets, passes, bursts);
+    fprintf(out, "  \"seconds\": %.6f,\n  \"mpps\": %.4f,\n  \"tsc_hz\": %" PRIu64 ",\n",
+            seconds, seconds > 0 ? packets / seconds / 1e6 : 0.0, hz);
+    fprintf(out, "  \"cycles_per_pkt\": %.2f,\n", per_pkt(total_cycles, packets));
+    fprintf(out, "  \"classify_cycles_per_pkt\": %.2f,\n", per_pkt(cycles.classify_cycles, packets));
+    // 每个处理器的周期按交给它的包数平均; unhandled为没有处理器的包
+    fprintf(out, "  \"handlers\": {");
+    for (s = 0; s < protocol_handler_count(); s++)
+        fprintf(out, "%s\"%s\": {\"packets\": %" PRIu64 ", \"cycles_per_pkt\": %.2f}",
+                s ? ", " : "", protocol_handler_name(s), cycles.pkts[s], per_pkt(cycles.cycles[s], cycles.pkts[s]));
+    fprintf(out, "},\n");
+    fprintf(out, "  \"roce_pkts\": %" PRIu64 ",\n  \"pfc_sent\": %" PRIu64 ",\n  \"tx_failed\": %" PRIu64 ",\n",
+            conf->stats.roce_pkts, conf->stats.pfc_sent, conf->stats.tx_failed);
+    write_hist(out, "burst_cycles_per_pkt", burst_hist);
+    fprintf(out, ",\n");
+    write_hist(out, "roce_cycles_per_pkt", roce_hist);
+    fprintf(out, "\n}\n");
+    if (out != stdout)
+        fclose(out);
+
+out:
+    rte_free(burst_hist);
+    rte_free(roce_hist);
+    free_capture(&cap);
+    return ret;
+}
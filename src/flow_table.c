@@ -0,0 +1,101 @@
+#include <errno.h>
+#include <string.h>
+#include <rte_hash_crc.h>
+#include <rte_malloc.h>
+#include "flow_table.h"
+
+struct flow_table *flow_table_create(const char *name, uint32_t entries, uint64_t idle_ns, int socket_id)
+{
+    struct flow_table *ft;
+    struct rte_hash_parameters params = {
+        .name = name,
+        .entries = entries,
+        .key_len = sizeof(struct flow_key),
+        .hash_func = rte_hash_crc,
+        .hash_func_init_val = 0,
+        .socket_id = socket_id,
+    };
+
+    ft = rte_zmalloc_socket(name, sizeof(*ft), RTE_CACHE_LINE_SIZE, socket_id);
+    if (ft == NULL)
+        return NULL;
+
+    // 单写者的rte_hash返回的位置在 [0, entries) 内, 可直接作为状态数组下标
+    ft->hash = rte_hash_create(&params);
+    ft->states = rte_zmalloc_socket(name, (size_t)entries * sizeof(struct flow_state),
+                                    RTE_CACHE_LINE_SIZE, socket_id);
+    if (ft->hash == NULL || ft->states == NULL) {
+        flow_table_free(ft);
+        return NULL;
+    }
+    ft->entries = entries;
+    ft->idle_ns = idle_ns;
+    return ft;
+}
+
+void flow_table_free(struct flow_table *ft)
+{
+    if (ft == NULL)
+        return;
+    rte_hash_free(ft->hash);
+    rte_free(ft->states);
+    rte_free(ft);
+}
+
+int flow_table_lookup_bulk(struct flow_table *ft, const struct flow_key *keys, uint32_t n,
+                           struct flow_state **states)
+{
+    const void *key_ptrs[RTE_HASH_LOOKUP_BULK_MAX];
+    int32_t positions[RTE_HASH_LOOKUP_BULK_MAX];
+    uint32_t i;
+    int added = 0;
+
+    if (n > RTE_HASH_LOOKUP_BULK_MAX)
+        return -EINVAL;
+    for (i = 0; i < n; i++)
+        key_ptrs[i] = &keys[i];
+    if (rte_hash_lookup_bulk(ft->hash, key_ptrs, n, positions) < 0)
+        return -EINVAL;
+
+    for (i = 0; i < n; i++) {
+        int32_t pos = positions[i];
+
+        if (pos < 0) {
+            // 同一burst中的新流可能出现多次, 重复插入返回已有位置
+            pos = rte_hash_add_key(ft->hash, &keys[i]);
+            if (pos < 0) {
+                states[i] = NULL;
+                continue;
+            }
+            if (!ft->states[pos].in_use) {
+                memset(&ft->states[pos], 0, sizeof(struct flow_state));
+                ft->states[pos].key = keys[i];
+                ft->states[pos].in_use = 1;
+                ft->active++;
+                added++;
+            }
+        }
+        states[i] = &ft->states[pos];
+    }
+    return added;
+}
+
+uint32_t flow_table_expire(struct flow_table *ft, uint32_t budget)
+{
+    uint32_t removed = 0;
+
+    while (budget-- > 0) {
+        struct flow_state *s = &ft->states[ft->expire_cursor];
+
+        // 用加法比较, 其他发送端的时间戳略落后时不会误判为空闲
+        if (s->in_use && s->last_timestamp + ft->idle_ns < ft->now) {
+            rte_hash_del_key(ft->hash, &s->key);
+            s->in_use = 0;
+            ft->active--;
+            removed++;
+        }
+        if (++ft->expire_cursor == ft->entries)
+            ft->expire_cursor = 0;
+    }
+    return removed;
+}
@@ -0,0 +1,173 @@
+#include <arpa/inet.h>
+#include <errno.h>
+#include <inttypes.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <rte_seqlock.h>
+#include <rte_spinlock.h>
+#include "flowlet_params.h"
+#include "roce_handler.h"
+
+#define MAX_ASSIGNMENTS_LEN 256
+
+// 控制线程写, worker读; 写者之间由seqlock内部的自旋锁互斥, 读者不加锁, 读到写入中的数据时重试
+static rte_seqlock_t params_lock = RTE_SEQLOCK_INITIALIZER;
+static struct flowlet_params params;
+static uint32_t params_gen;
+static uint64_t params_idle_ns;
+// 遥测为每个连接起一个线程, 读-改-写整个过程需要互斥
+static rte_spinlock_t update_lock = RTE_SPINLOCK_INITIALIZER;
+
+void flowlet_params_defaults(struct flowlet_params *p)
+{
+    memset(p, 0, sizeof(*p));
+    p->flowlet_timeout = FLOWLET_TIMEOUT;
+    p->time_gap = TIME_GAP;
+    p->stop_time = 0;
+    p->quanta_ns = QUANTA_DURATION_NS;
+    inet_pton(AF_INET, DEFAULT_LOCAL_IP, &p->local_ip);
+    rte_ether_unformat_addr(PFC_DST_MAC, &p->pfc_dst);
+}
+
+static int parse_u64(const char *value, uint64_t *out)
+{
+    char *end;
+    unsigned long long v;
+
+    errno = 0;
+    v = strtoull(value, &end, 10);
+    if (errno != 0 || end == value || *end != '\0' || value[0] == '-')
+        return -EINVAL;
+    *out = v;
+    return 0;
+}
+
+int flowlet_params_set(struct flowlet_params *p, const char *name, const char *value)
+{
+    if (strcmp(name, "flowlet_timeout") == 0)
+        return parse_u64(value, &p->flowlet_timeout);
+    if (strcmp(name, "time_gap") == 0)
+        return parse_u64(value, &p->time_gap);
+    if (strcmp(name, "stop_time") == 0)
+        return parse_u64(value, &p->stop_time);
+    if (strcmp(name, "quanta_ns") == 0) {
+        char *end;
+        double v = strtod(value, &end);
+
+        if (end == value || *end != '\0' || !(v > 0))
+            return -EINVAL;
+        p->quanta_ns = v;
+        return 0;
+    }
+    if (strcmp(name, "local_ip") == 0)
+        return inet_pton(AF_INET, value, &p->local_ip) == 1 ? 0 : -EINVAL;
+    if (strcmp(name, "pfc_dst") == 0)
+        return rte_ether_unformat_addr(value, &p->pfc_dst) == 0 ? 0 : -EINVAL;
+    return -ENOENT;
+}
+
+int flowlet_params_check(const struct flowlet_params *p, uint64_t idle_ns, char *err, size_t err_len)
+{
+    // 动态暂停时间最大为 1+flowlet_timeout-time_gap
+    uint64_t max_pause = p->stop_time ? p->stop_time : 1 + p->flowlet_timeout - p->time_gap;
+
+    if (p->time_gap > p->flowlet_timeout) {
+        snprintf(err, err_len, "time_gap %" PRIu64 " exceeds flowlet_timeout %" PRIu64,
+                 p->time_gap, p->flowlet_timeout);
+        return -EINVAL;
+    }
+    // 空闲超时不小于flowlet_timeout, 被老化的流下一个包不会落入触发区间
+    if (p->flowlet_timeout > idle_ns) {
+        snprintf(err, err_len, "flowlet_timeout %" PRIu64 " exceeds flow idle timeout %" PRIu64,
+                 p->flowlet_timeout, idle_ns);
+        return -EINVAL;
+    }
+    if (max_pause / p->quanta_ns > UINT16_MAX) {
+        snprintf(err, err_len, "pause of %" PRIu64 " ns does not fit in 16-bit quanta of %.2f ns",
+                 max_pause, p->quanta_ns);
+        return -EINVAL;
+    }
+    return 0;
+}
+
+static void publish(const struct flowlet_params *p)
+{
+    rte_seqlock_write_lock(&params_lock);
+    params = *p;
+    __atomic_store_n(&params_gen, params_gen + 1, __ATOMIC_RELEASE);
+    rte_seqlock_write_unlock(&params_lock);
+}
+
+int flowlet_params_init(const struct flowlet_params *p, uint64_t idle_ns)
+{
+    char err[128];
+
+    if (flowlet_params_check(p, idle_ns, err, sizeof(err)) != 0) {
+        printf("Invalid flowlet parameters: %s\n", err);
+        return -EINVAL;
+    }
+    params_idle_ns = idle_ns;
+    publish(p);
+    return 0;
+}
+
+static int apply_assignments(struct flowlet_params *next, char *buf, char *err, size_t err_len)
+{
+    char *saveptr, *item;
+    int ret;
+
+    for (item = strtok_r(buf, ",", &saveptr); item != NULL; item = strtok_r(NULL, ",", &saveptr)) {
+        char *value = strchr(item, '=');
+
+        if (value == NULL) {
+            snprintf(err, err_len, "expected name=value, got '%s'", item);
+            return -EINVAL;
+        }
+        *value++ = '\0';
+        ret = flowlet_params_set(next, item, value);
+        if (ret != 0) {
+            snprintf(err, err_len, ret == -ENOENT ? "unknown parameter '%s'" : "invalid value for '%s'", item);
+            return ret;
+        }
+    }
+    return flowlet_params_check(next, params_idle_ns, err, err_len);
+}
+
+int flowlet_params_update(const char *assignments, char *err, size_t err_len)
+{
+    struct flowlet_params next;
+    char buf[MAX_ASSIGNMENTS_LEN];
+    int ret;
+
+    if (strlen(assignments) >= sizeof(buf)) {
+        snprintf(err, err_len, "assignment list too long");
+        return -EINVAL;
+    }
+    strcpy(buf, assignments);
+
+    rte_spinlock_lock(&update_lock);
+    flowlet_params_read(&next);
+    ret = apply_assignments(&next, buf, err, err_len);
+    if (ret == 0)
+        publish(&next);
+    rte_spinlock_unlock(&update_lock);
+    return ret;
+}
+
+uint32_t flowlet_params_read(struct flowlet_params *p)
+{
+    uint32_t sn, gen;
+
+    do {
+        sn = rte_seqlock_read_begin(&params_lock);
+        *p = params;
+        gen = params_gen;
+    } while (rte_seqlock_read_retry(&params_lock, sn));
+    return gen;
+}
+
+uint32_t flowlet_params_generation(void)
+{
+    return __atomic_load_n(&params_gen, __ATOMIC_ACQUIRE);
+}
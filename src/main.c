@@ -1,18 +1,31 @@
+#include <errno.h>
+#include <getopt.h>
+#include <signal.h>
+#include <stdbool.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
 #include <rte_eal.h>
 #include <rte_ethdev.h>
 #include <rte_mbuf.h>
+#include <rte_lcore.h>
+#include <rte_cycles.h>
+#include <rte_malloc.h>
 #include "protocol_handler.h"
 #include "arp_handler.h"
 #include "udp_handler.h"
 #include "roce_handler.h"
-
-#define RX_RING_SIZE 128
-#define TX_RING_SIZE 128
-#define NUM_MBUFS 8191
+#include "flow_table.h"
+#include "worker.h"
+#include "flowlet_params.h"
+#include "telemetry.h"
+#include "bench.h"
+
+#define RX_RING_SIZE 1024
+#define TX_RING_SIZE 1024
+#define NUM_MBUFS 8191          // 每个队列的mbuf数
 #define MBUF_CACHE_SIZE 250
-#define BURST_SIZE 32
-
-static const char LOCAL_IP[]="10.10.10.3";
+#define MAX_QUEUES 64
 
 static const struct rte_eth_conf port_conf_default = {
     .rxmode = {
@@ -20,11 +33,136 @@ static const struct rte_eth_conf port_conf_default = {
     },
 };
 
-static struct rte_mempool *mbuf_pool = NULL;
+// RSS按IPv4/UDP元组分流, 同一RoCE流总落在同一队列
+#define RSS_HF (RTE_ETH_RSS_IPV4 | RTE_ETH_RSS_NONFRAG_IPV4_UDP)
+
+RTE_DEFINE_PER_LCORE(struct worker_conf *, worker_ctx);
+
+static struct worker_conf workers[MAX_QUEUES];
+static uint16_t nb_queues = 0;          // 0表示每个worker lcore一个队列
+static unsigned run_seconds = 0;        // 0表示一直运行到Ctrl+C
+static uint32_t flow_table_size = FLOW_TABLE_SIZE;
+static uint64_t flow_idle_ns = FLOW_IDLE_TIMEOUT_NS;
+static struct flowlet_params initial_params;     // 启动参数, 运行时由 /prototype/set_params 修改
+static const char *bench_pcap = NULL;   // 非空时进入基准测试模式
+static const char *bench_json = NULL;
+static unsigned bench_passes = 100;
+static volatile bool force_quit = false;
+
+static void signal_handler(int signum) {
+    if (signum == SIGINT || signum == SIGTERM || signum == SIGALRM)
+        force_quit = true;
+}
+
+enum {
+    OPT_BENCH = 256,
+    OPT_BENCH_PASSES,
+    OPT_BENCH_JSON,
+};
+
+// 前几项对应flowlet_params的字段名, 可在运行时修改
+static const struct option long_options[] = {
+    {"flowlet-timeout", required_argument, NULL, 0},
+    {"time-gap", required_argument, NULL, 0},
+    {"stop-time", required_argument, NULL, 0},
+    {"quanta-ns", required_argument, NULL, 0},
+    {"local-ip", required_argument, NULL, 0},
+    {"pfc-dst", required_argument, NULL, 0},
+    {"bench", required_argument, NULL, OPT_BENCH},
+    {"bench-passes", required_argument, NULL, OPT_BENCH_PASSES},
+    {"bench-json", required_argument, NULL, OPT_BENCH_JSON},
+    {NULL, 0, NULL, 0},
+};
+static const char *const long_option_params[] = {
+    "flowlet_timeout", "time_gap", "stop_time", "quanta_ns", "local_ip", "pfc_dst",
+};
+
+static void usage(const char *prgname) {
+    printf("%s [EAL options] -- [-q NQUEUES] [-t SECONDS] [-f FLOWS] [-e IDLE_US] [flowlet options]\n"
+           "  -q NQUEUES: number of RX/TX queues, one worker lcore each (default: all worker lcores)\n"
+           "  -t SECONDS: stop after SECONDS (default: run until Ctrl+C)\n"
+           "  -f FLOWS: flow table entries per queue (default: %u)\n"
+           "  -e IDLE_US: expire flows idle for IDLE_US microseconds of packet time (default: %llu)\n"
+           "Flowlet options, also settable at runtime with /prototype/set_params:\n"
+           "  --flowlet-timeout NS (default: %d)\n"
+           "  --time-gap NS (default: %d)\n"
+           "  --stop-time NS: fixed pause, 0 pauses until the flowlet timeout (default: 0)\n"
+           "  --quanta-ns NS: duration of one pause quanta (default: %.2f)\n"
+           "  --local-ip ADDR: address answered for ARP (default: %s)\n"
+           "  --pfc-dst MAC: destination MAC of PFC frames (default: %s)\n"
+           "Benchmark mode, replays a capture from memory on the main lcore instead of receiving:\n"
+           "  --bench PCAP: classic pcap file to replay\n"
+           "  --bench-passes N: timed passes over the capture after one warm-up pass (default: %u)\n"
+           "  --bench-json PATH: write the JSON result here instead of stdout\n",
+           prgname, FLOW_TABLE_SIZE, FLOW_IDLE_TIMEOUT_NS / 1000,
+           FLOWLET_TIMEOUT, TIME_GAP, QUANTA_DURATION_NS, DEFAULT_LOCAL_IP, PFC_DST_MAC, bench_passes);
+}
+
+static int parse_args(int argc, char **argv) {
+    int opt, option_index;
+    char *end;
+    unsigned long value;
+
+    flowlet_params_defaults(&initial_params);
+    while ((opt = getopt_long(argc, argv, "q:t:f:e:", long_options, &option_index)) != -1) {
+        if (opt == 0) {
+            if (flowlet_params_set(&initial_params, long_option_params[option_index], optarg) != 0) {
+                printf("Invalid value for --%s: %s\n", long_options[option_index].name, optarg);
+                return -1;
+            }
+            continue;
+        }
+        // 路径参数, 其余选项均为数字
+        if (opt == OPT_BENCH || opt == OPT_BENCH_JSON) {
+            *(opt == OPT_BENCH ? &bench_pcap : &bench_json) = optarg;
+            continue;
+        }
+        errno = 0;
+        value = optarg ? strtoul(optarg, &end, 10) : 0;
+        if (optarg && (errno != 0 || *end != '\0')) {
+            usage(argv[0]);
+            return -1;
+        }
+        switch (opt) {
+        case OPT_BENCH_PASSES:
+            if (value == 0 || value > UINT32_MAX) {
+                printf("Invalid pass count: %s\n", optarg);
+                return -1;
+            }
+            bench_passes = value;
+            break;
+        case 'q':
+            if (value == 0 || value > MAX_QUEUES) {
+                printf("Invalid queue count: %s (1..%d)\n", optarg, MAX_QUEUES);
+                return -1;
+            }
+            nb_queues = value;
+            break;
+        case 't':
+            run_seconds = value;
+            break;
+        case 'f':
+            if (value < 8 || value > UINT32_MAX) {
+                printf("Invalid flow table size: %s\n", optarg);
+                return -1;
+            }
+            flow_table_size = value;
+            break;
+        case 'e':
+            // 与flowlet_timeout的关系在flowlet_params_init中检查
+            flow_idle_ns = value * 1000;
+            break;
+        default:
+            usage(argv[0]);
+            return -1;
+        }
+    }
+    return 0;
+}
 
 static int port_init(uint16_t port) {
     struct rte_eth_conf port_conf = port_conf_default;
-    const uint16_t rx_rings = 1, tx_rings = 1;
+    const uint16_t rx_rings = nb_queues, tx_rings = nb_queues;
     uint16_t nb_rxd = RX_RING_SIZE;
     uint16_t nb_txd = TX_RING_SIZE;
     int retval;
@@ -48,6 +186,22 @@ static int port_init(uint16_t port) {
     // if (dev_info.tx_offload_capa & RTE_ETH_TX_OFFLOAD_MBUF_FAST_FREE)
     //     port_conf.txmode.offloads |= RTE_ETH_TX_OFFLOAD_MBUF_FAST_FREE;
 
+    if (rx_rings > dev_info.max_rx_queues || tx_rings > dev_info.max_tx_queues) {
+        printf("Port %u supports at most %u RX / %u TX queues, %u requested\n",
+                port, dev_info.max_rx_queues, dev_info.max_tx_queues, rx_rings);
+        return -EINVAL;
+    }
+
+    // 多队列时启用RSS, 只请求网卡支持的哈希类型
+    if (rx_rings > 1) {
+        port_conf.rxmode.mq_mode = RTE_ETH_MQ_RX_RSS;
+        port_conf.rx_adv_conf.rss_conf.rss_key = NULL;
+        port_conf.rx_adv_conf.rss_conf.rss_hf = RSS_HF & dev_info.flow_type_rss_offloads;
+        if (port_conf.rx_adv_conf.rss_conf.rss_hf != RSS_HF)
+            printf("Port %u: RSS hash types limited to 0x%" PRIx64 " (requested 0x%" PRIx64 ")\n",
+                    port, port_conf.rx_adv_conf.rss_conf.rss_hf, (uint64_t)RSS_HF);
+    }
+
     /* Configure the Ethernet device */
     retval = rte_eth_dev_configure(port, rx_rings, tx_rings, &port_conf);
     if (retval != 0)
@@ -61,10 +215,10 @@ static int port_init(uint16_t port) {
     rxconf = dev_info.default_rxconf;
     rxconf.offloads = port_conf.rxmode.offloads;
 
-    /* Allocate and set up 1 RX queue per Ethernet port */
+    /* 每个RX队列使用所属worker的mbuf池 */
     for (q = 0; q < rx_rings; q++) {
         retval = rte_eth_rx_queue_setup(port, q, nb_rxd,
-                rte_eth_dev_socket_id(port), &rxconf, mbuf_pool);
+                rte_eth_dev_socket_id(port), &rxconf, workers[q].pool);
         if (retval < 0)
             return retval;
     }
@@ -73,7 +227,7 @@ static int port_init(uint16_t port) {
     fflush(stdout);    
     txconf = dev_info.default_txconf;
     txconf.offloads = port_conf.txmode.offloads;
-    /* Allocate and set up 1 TX queue per Ethernet port */
+    /* 每个worker独占一个TX队列, 发包无需加锁 */
     for (q = 0; q < tx_rings; q++) {
         retval = rte_eth_tx_queue_setup(port, q, nb_txd,
                 rte_eth_dev_socket_id(port), &txconf);
@@ -102,75 +256,184 @@ static int port_init(uint16_t port) {
                "full-duplex" : "half-duplex");  
     } else {  
         printf("Port %d Link Down\n", port);  
-    }  
+    }
     printf("  Promiscuous mode: %s\n", rte_eth_promiscuous_get(port) ? "enabled" : "disabled");  
     printf("  Allmulticast mode: %s\n", rte_eth_allmulticast_get(port) ? "enabled" : "disabled");  
+    printf("  RX/TX queues: %u/%u\n", rx_rings, tx_rings);
     printf("  RX descriptors: %u\n", nb_rxd);  
     printf("  TX descriptors: %u\n", nb_txd);  
     printf("  RX offload flags: 0x%lx\n", port_conf.rxmode.offloads);  
     printf("  TX offload flags: 0x%lx\n", port_conf.txmode.offloads);  
-    
+    printf("  RSS hash functions: 0x%lx\n", port_conf.rx_adv_conf.rss_conf.rss_hf);
+
     printf("  Driver name: %s\n", dev_info.driver_name);  
     printf("  Max rx queues: %u\n", dev_info.max_rx_queues);  
     printf("  Max tx queues: %u\n", dev_info.max_tx_queues);  
     return 0;
 }
 
-static void packet_processing_loop(void) {
+static int packet_processing_loop(void *arg) {
+    struct worker_conf *conf = arg;
     struct rte_mbuf *pkts_burst[BURST_SIZE];
-    uint16_t port = 0;  // 使用第一个端口
     uint16_t nb_rx;
-    uint32_t i;
-    struct rte_ether_hdr *eth_hdr;
-    char src_mac[RTE_ETHER_ADDR_FMT_SIZE];
-    char dst_mac[RTE_ETHER_ADDR_FMT_SIZE];
-    char src_ip[16];
-    char dst_ip[16];
+    uint64_t rx_tsc;
 
-    printf("\nCore %u processing packets. [Ctrl+C to quit]\n", rte_lcore_id());
+    RTE_PER_LCORE(worker_ctx) = conf;
+    printf("Core %u processing port %u queue %u.\n", rte_lcore_id(), conf->port_id, conf->queue_id);
+
+    while (!force_quit) {
+        // 参数有新版本时重新读取, 空闲时也检查以便控制端确认所有worker已应用
+        if (unlikely(flowlet_params_generation() != conf->params_gen))
+            roce_apply_params(conf);
 
-    int pkg_counter=0;
-    while (1) {
         // 接收数据包
-        nb_rx = rte_eth_rx_burst(port, 0, pkts_burst, BURST_SIZE);
+        nb_rx = rte_eth_rx_burst(conf->port_id, conf->queue_id, pkts_burst, BURST_SIZE);
         if (nb_rx == 0)
             continue;
+        rx_tsc = rte_rdtsc();
+        conf->stats.rx_bursts++;
+        conf->stats.rx_pkts += nb_rx;
+
+        process_burst(conf, pkts_burst, nb_rx, NULL);
 
-        // 处理接收到的每个数据包
-        for (i = 0; i < nb_rx; i++) {
-            // eth_hdr = rte_pktmbuf_mtod(pkts_burst[i], struct rte_ether_hdr *);
-            // /* Format MAC addresses */
-            // rte_ether_format_addr(src_mac, RTE_ETHER_ADDR_FMT_SIZE, &eth_hdr->src_addr);
-            // rte_ether_format_addr(dst_mac, RTE_ETHER_ADDR_FMT_SIZE, &eth_hdr->dst_addr);
-            // printf("\nPacket %d:\n", pkg_counter++);
-            // printf("  MAC: %s -> %s\n", src_mac, dst_mac);
-            // printf("  Ether Type: 0x%04x\n", rte_be_to_cpu_16(eth_hdr->ether_type));
-
-            process_packet(mbuf_pool,pkts_burst[i], port);
-            rte_pktmbuf_free(pkts_burst[i]);
+        // 本burst产生的PFC/应答一次发出, 记录从收包到发出的周期数
+        if (rte_eth_tx_buffer_flush(conf->port_id, conf->queue_id, conf->tx_buffer) > 0) {
+            conf->stats.reaction_bursts++;
+            conf->stats.reaction_cycles += rte_rdtsc() - rx_tsc;
         }
+
+        // 处理函数不持有收到的mbuf, 整个burst处理完后统一释放
+        rte_pktmbuf_free_bulk(pkts_burst, nb_rx);
+        conf->stats.cycle_hist[log2_bucket(rte_rdtsc() - rx_tsc, CYCLE_HIST_BUCKETS)]++;
     }
+    rte_eth_tx_buffer_flush(conf->port_id, conf->queue_id, conf->tx_buffer);
+    return 0;
+}
+
+// 汇总各worker的计数器, 仅用于报告
+static void sum_stats(struct worker_stats *total) {
+    uint16_t q;
+
+    memset(total, 0, sizeof(*total));
+    for (q = 0; q < nb_queues; q++)
+        worker_stats_add(total, &workers[q].stats);
+}
+
+// 发出响应的burst从收包到发送的平均耗时 (ns)
+static double reaction_ns(const struct worker_stats *prev, const struct worker_stats *cur) {
+    uint64_t bursts = cur->reaction_bursts - prev->reaction_bursts;
+
+    if (bursts == 0)
+        return 0.0;
+    return (double)(cur->reaction_cycles - prev->reaction_cycles) / bursts * 1e9 / rte_get_tsc_hz();
+}
+
+// 主lcore每秒打印一次汇总速率
+static void report_loop(void) {
+    const uint64_t hz = rte_get_timer_hz();
+    uint64_t prev_tsc = rte_get_timer_cycles();
+    struct worker_stats prev, cur;
+
+    sum_stats(&prev);
+    while (!force_quit) {
+        rte_delay_us_sleep(100 * 1000);
+        uint64_t now = rte_get_timer_cycles();
+        if (now - prev_tsc < hz)
+            continue;
+        sum_stats(&cur);
+        double secs = (double)(now - prev_tsc) / hz;
+        printf("RX %.3f Mpps, RoCE %.3f Mpps, PFC %.0f/s, reaction %.0f ns, tx failed %" PRIu64
+               ", alloc failed %" PRIu64 "\n",
+               (cur.rx_pkts - prev.rx_pkts) / secs / 1e6,
+               (cur.roce_pkts - prev.roce_pkts) / secs / 1e6,
+               (cur.pfc_sent - prev.pfc_sent) / secs,
+               reaction_ns(&prev, &cur), cur.tx_failed, cur.alloc_failed);
+        prev = cur;
+        prev_tsc = now;
+    }
+}
+
+static void cleanup(uint16_t port) {
+    uint16_t q;
+
+    rte_eth_dev_stop(port);
+    rte_eth_dev_close(port);
+    for (q = 0; q < nb_queues; q++) {
+        rte_pktmbuf_free_bulk(workers[q].pfc_stash, workers[q].pfc_stash_len);
+        rte_free(workers[q].tx_buffer);
+        flow_table_free(workers[q].flows);
+    }
+    rte_eal_cleanup();
 }
 
 int main(int argc, char *argv[]) {
     uint16_t port = 0;
+    uint16_t q;
+    unsigned lcore_id;
+    unsigned nb_workers;
     int ret;
 
     /* Initialize the Environment Abstraction Layer (EAL) */
     ret = rte_eal_init(argc, argv);
     if (ret < 0)
         rte_exit(EXIT_FAILURE, "Error with EAL initialization\n");
+    argc -= ret;
+    argv += ret;
+
+    if (parse_args(argc, argv) != 0)
+        rte_exit(EXIT_FAILURE, "Invalid application arguments\n");
+    if (flowlet_params_init(&initial_params, flow_idle_ns) != 0)
+        rte_exit(EXIT_FAILURE, "Invalid flowlet parameters\n");
+
+    signal(SIGINT, signal_handler);
+    signal(SIGTERM, signal_handler);
+    signal(SIGALRM, signal_handler);
 
     /* Check that there is an available port */
     if (rte_eth_dev_count_avail() == 0)
         rte_exit(EXIT_FAILURE, "Error: no available ports\n");
 
-    /* Creates a new mempool in memory to hold the mbufs */
-    mbuf_pool = rte_pktmbuf_pool_create("MBUF_POOL", NUM_MBUFS,
-        MBUF_CACHE_SIZE, 0, RTE_MBUF_DEFAULT_BUF_SIZE + RTE_PKTMBUF_HEADROOM, rte_socket_id());
-
-    if (mbuf_pool == NULL)
-        rte_exit(EXIT_FAILURE, "Cannot create mbuf pool\n");
+    // 有worker lcore时每个队列一个worker, 主lcore负责汇总报告; 否则主lcore单队列处理
+    // 基准测试只在主lcore上跑单队列
+    nb_workers = bench_pcap != NULL ? 0 : rte_lcore_count() - 1;
+    if (nb_queues == 0)
+        nb_queues = nb_workers > 0 ? RTE_MIN(nb_workers, (unsigned)MAX_QUEUES) : 1;
+    if (nb_workers > 0 ? nb_queues > nb_workers : nb_queues > 1)
+        rte_exit(EXIT_FAILURE, "%u queues requested but only %u worker lcores available\n",
+                 nb_queues, nb_workers);
+
+    /* 每个队列一个mbuf池, 建在处理该队列的lcore所在的NUMA节点 */
+    lcore_id = rte_get_main_lcore();
+    if (nb_workers > 0)
+        lcore_id = rte_get_next_lcore(-1, 1, 0);
+    for (q = 0; q < nb_queues; q++) {
+        char name[RTE_MEMPOOL_NAMESIZE];
+
+        workers[q].lcore_id = lcore_id;
+        workers[q].port_id = port;
+        workers[q].queue_id = q;
+        snprintf(name, sizeof(name), "MBUF_POOL_%u", q);
+        workers[q].pool = rte_pktmbuf_pool_create(name, NUM_MBUFS,
+            MBUF_CACHE_SIZE, 0, RTE_MBUF_DEFAULT_BUF_SIZE + RTE_PKTMBUF_HEADROOM,
+            rte_lcore_to_socket_id(lcore_id));
+        if (workers[q].pool == NULL)
+            rte_exit(EXIT_FAILURE, "Cannot create mbuf pool for queue %u\n", q);
+        snprintf(name, sizeof(name), "FLOWS_%u", q);
+        workers[q].flows = flow_table_create(name, flow_table_size, flow_idle_ns,
+                                             rte_lcore_to_socket_id(lcore_id));
+        if (workers[q].flows == NULL)
+            rte_exit(EXIT_FAILURE, "Cannot create flow table for queue %u\n", q);
+        // 发送缓冲: 处理函数只入队, 收包循环每个burst刷新一次; 发送失败的帧计入tx_failed
+        workers[q].tx_buffer = rte_zmalloc_socket("tx_buffer", RTE_ETH_TX_BUFFER_SIZE(BURST_SIZE), 0,
+                                                  rte_lcore_to_socket_id(lcore_id));
+        if (workers[q].tx_buffer == NULL)
+            rte_exit(EXIT_FAILURE, "Cannot allocate TX buffer for queue %u\n", q);
+        rte_eth_tx_buffer_init(workers[q].tx_buffer, BURST_SIZE);
+        rte_eth_tx_buffer_set_err_callback(workers[q].tx_buffer, rte_eth_tx_buffer_count_callback,
+                                           &workers[q].stats.tx_failed);
+        if (nb_workers > 0)
+            lcore_id = rte_get_next_lcore(lcore_id, 1, 0);
+    }
 
     /* Initialize port */
     if (port_init(port) != 0)
@@ -178,32 +441,63 @@ int main(int argc, char *argv[]) {
 
     /* Initialize protocol handlers */
     init_protocol_handlers();
-    
+
     /* Initialize ARP handler */
-    if (init_arp_handler(LOCAL_IP) != 0)  // 设置本机IP地址
+    if (init_arp_handler() != 0)  // 本机IP见flowlet_params
         rte_exit(EXIT_FAILURE, "Cannot initialize ARP handler\n");
 
     /* Initialize UDP handler */
-    // if (init_udp_handler(LOCAL_IP) != 0)  // 设置本机IP地址
+    // if (init_udp_handler() != 0)  // 本机IP见flowlet_params
     //     rte_exit(EXIT_FAILURE, "Cannot initialize UDP handler\n");
-    
+
     /* Initialize ROCE handler */
-    if (init_roce_handler(LOCAL_IP) != 0)  // 设置本机IP地址
+    if (init_roce_handler() != 0)
         rte_exit(EXIT_FAILURE, "Cannot initialize UDP handler\n");
 
 
     /* Register protocol handlers */
-    register_protocol_handler(RTE_ETHER_TYPE_ARP, handle_arp_packet);
-    // register_protocol_handler(RTE_ETHER_TYPE_IPV4, handle_udp_packet);
-    register_protocol_handler(RTE_ETHER_TYPE_IPV4, handle_roce_packet);
+    register_protocol_handler(RTE_ETHER_TYPE_ARP, "arp", handle_arp_burst);
+    // register_protocol_handler(RTE_ETHER_TYPE_IPV4, "udp", handle_udp_burst);
+    register_roce_handler("roce", handle_roce_burst);
 
-    printf("Starting packet processing...\n");
+    if (telemetry_init(workers, nb_queues) != 0)
+        printf("Telemetry commands not registered, continuing without them\n");
 
-    /* Call packet processing loop */
-    packet_processing_loop();
+    if (bench_pcap != NULL) {
+        ret = bench_run(&workers[0], bench_pcap, bench_passes, bench_json);
+        cleanup(port);
+        return ret == 0 ? 0 : EXIT_FAILURE;
+    }
 
-    /* Clean up */
-    rte_eal_cleanup();
+    printf("Starting packet processing on %u queue(s)... [Ctrl+C to quit]\n", nb_queues);
+    if (run_seconds > 0)
+        alarm(run_seconds);
 
+    uint64_t start_tsc = rte_get_timer_cycles();
+    if (nb_workers > 0) {
+        for (q = 0; q < nb_queues; q++)
+            rte_eal_remote_launch(packet_processing_loop, &workers[q], workers[q].lcore_id);
+        report_loop();
+        rte_eal_mp_wait_lcore();
+    } else {  
+        packet_processing_loop(&workers[0]);
+    }
+    double elapsed = (double)(rte_get_timer_cycles() - start_tsc) / rte_get_timer_hz();
+
+    struct worker_stats total;
+    sum_stats(&total);
+    for (q = 0; q < nb_queues; q++)
+        printf("Queue %u (core %u): RX %" PRIu64 " packets, RoCE %" PRIu64 ", PFC %" PRIu64
+               ", flows %u active / %" PRIu64 " expired / %" PRIu64 " untracked packets\n",
+               q, workers[q].lcore_id, workers[q].stats.rx_pkts,
+               workers[q].stats.roce_pkts, workers[q].stats.pfc_sent, workers[q].flows->active,
+               workers[q].stats.flows_expired, workers[q].stats.flow_table_full);
+    struct worker_stats zero = {0};
+    printf("Total: %" PRIu64 " packets in %.3f s, %.3f Mpps, %" PRIu64 " PFC sent, queues %u, "
+           "reaction %.0f ns, tx failed %" PRIu64 "\n",
+           total.rx_pkts, elapsed, total.rx_pkts / elapsed / 1e6, total.pfc_sent, nb_queues,
+           reaction_ns(&zero, &total), total.tx_failed);
+
+    cleanup(port);
     return 0;
 }
@@ -1,44 +1,147 @@
+#include <string.h>
 #include <rte_common.h>
 #include <rte_mbuf.h>
 #include <rte_ether.h>
+#include <rte_cycles.h>
+#include <rte_prefetch.h>
 #include "protocol_handler.h"
+#include "worker.h"
 
-#define MAX_HANDLERS 32
+// 提前预取之后第几个包的头部
+#define PREFETCH_OFFSET 3
 
+// 下标0表示未注册, 对应的包不处理
 static struct protocol_handler handlers[MAX_HANDLERS];
-static int num_handlers = 0;
+static int num_handlers = 1;
+// 以太网类型 (网络字节序, 直接用报文中的值作下标) 到处理器编号的直接映射表
+static uint8_t ether_slot[1 << 16];
+static uint8_t roce_slot;
 
-int register_protocol_handler(uint16_t type, protocol_handler_fn handler) {
+// 同名处理器共用一个编号
+static int handler_slot(const char *name, protocol_handler_fn handler) {
+    int i;
+
+    for (i = 1; i < num_handlers; i++) {
+        if (handlers[i].handler == handler && strcmp(handlers[i].name, name) == 0)
+            return i;
+    }
     if (num_handlers >= MAX_HANDLERS) {
         return -1;
     }
 
-    handlers[num_handlers].type = type;
+    handlers[num_handlers].name = name;
     handlers[num_handlers].handler = handler;
-    num_handlers++;
+    return num_handlers++;
+}
+
+int register_protocol_handler(uint16_t type, const char *name, protocol_handler_fn handler) {
+    int slot = handler_slot(name, handler);
+
+    if (slot < 0)
+        return -1;
+    ether_slot[rte_cpu_to_be_16(type)] = slot;
+    return 0;
+}
 
+int register_roce_handler(const char *name, protocol_handler_fn handler) {
+    int slot = handler_slot(name, handler);
+
+    if (slot < 0)
+        return -1;
+    roce_slot = slot;
     return 0;
 }
 
+int protocol_handler_count(void) {
+    return num_handlers;
+}
+
+const char *protocol_handler_name(int slot) {
+    return slot > 0 && slot < num_handlers ? handlers[slot].name : "unhandled";
+}
+
+// 按以太网类型查表; IPv4中UDP源端口为4791的包归RoCE处理器
+static inline uint8_t classify(const struct rte_mbuf *pkt) {
+    const struct rte_ether_hdr *eth_hdr = rte_pktmbuf_mtod(pkt, const struct rte_ether_hdr *);
+
+    if (roce_slot && eth_hdr->ether_type == rte_cpu_to_be_16(RTE_ETHER_TYPE_IPV4) &&
+        rte_pktmbuf_data_len(pkt) >= sizeof(struct rte_ether_hdr) + sizeof(struct rte_ipv4_hdr) +
+                                      sizeof(struct rte_udp_hdr)) {
+        const struct rte_ipv4_hdr *ip_hdr = (const struct rte_ipv4_hdr *)(eth_hdr + 1);
+        const struct rte_udp_hdr *udp_hdr = (const struct rte_udp_hdr *)(ip_hdr + 1);
+
+        if (ip_hdr->next_proto_id == IPPROTO_UDP &&
+            udp_hdr->src_port == rte_cpu_to_be_16(ROCE_UDP_PORT))
+            return roce_slot;
+    }
+    return ether_slot[eth_hdr->ether_type];
+}
+
 int process_packet(struct rte_mempool *endsys_pktmbuf_pool, struct rte_mbuf *pkt, uint16_t port_id) {
-    struct rte_ether_hdr *eth_hdr;
-    int i;
+    uint8_t slot = classify(pkt);
 
-    eth_hdr = rte_pktmbuf_mtod(pkt, struct rte_ether_hdr *);
-    
-    // 遍历所有注册的处理器
-    for (i = 0; i < num_handlers; i++) {
-        if (handlers[i].type == rte_be_to_cpu_16(eth_hdr->ether_type)) {
-            return handlers[i].handler(endsys_pktmbuf_pool,pkt, port_id);
-        }
+    // 未找到对应的处理器，数据包由收包循环统一释放
+    if (slot == 0)
+        return 0;
+    return handlers[slot].handler(endsys_pktmbuf_pool, &pkt, 1, port_id);
+}
+
+void process_burst(struct worker_conf *conf, struct rte_mbuf **pkts, uint16_t nb_pkts,
+                   struct dispatch_cycles *cycles) {
+    struct rte_mbuf *grouped[BURST_SIZE];
+    uint8_t slots[BURST_SIZE];
+    uint16_t count[MAX_HANDLERS] = {0};
+    uint16_t next[MAX_HANDLERS];
+    uint16_t i, offset;
+    uint64_t tsc = cycles ? rte_rdtsc() : 0;
+    int s;
+
+    for (i = 0; i < RTE_MIN(nb_pkts, (uint16_t)PREFETCH_OFFSET); i++)
+        rte_prefetch0(rte_pktmbuf_mtod(pkts[i], void *));
+    for (i = 0; i < nb_pkts; i++) {
+        const struct rte_ether_hdr *eth_hdr = rte_pktmbuf_mtod(pkts[i], const struct rte_ether_hdr *);
+
+        if (i + PREFETCH_OFFSET < nb_pkts)
+            rte_prefetch0(rte_pktmbuf_mtod(pkts[i + PREFETCH_OFFSET], void *));
+        conf->stats.ether_pkts[ether_class_of(eth_hdr->ether_type)]++;
+        slots[i] = classify(pkts[i]);
+        count[slots[i]]++;
     }
 
-    // 未找到对应的处理器，释放数据包
-    rte_pktmbuf_free(pkt);
-    return 0;
+    // 按处理器编号分组, 组内保持到达顺序
+    for (s = 0, offset = 0; s < num_handlers; s++) {
+        next[s] = offset;
+        offset += count[s];
+    }
+    for (i = 0; i < nb_pkts; i++)
+        grouped[next[slots[i]]++] = pkts[i];
+
+    if (cycles) {
+        uint64_t now = rte_rdtsc();
+
+        cycles->classify_cycles += now - tsc;
+        cycles->pkts[0] += count[0];
+        tsc = now;
+    }
+
+    // 分组后next[s]为第s组的结束位置; 编号0的包没有处理器
+    for (s = 1; s < num_handlers; s++) {
+        if (count[s] == 0)
+            continue;
+        handlers[s].handler(conf->pool, &grouped[next[s] - count[s]], count[s], conf->port_id);
+        if (cycles) {
+            uint64_t now = rte_rdtsc();
+
+            cycles->cycles[s] += now - tsc;
+            cycles->pkts[s] += count[s];
+            tsc = now;
+        }
+    }
 }
 
 int init_protocol_handlers(void) {
-    num_handlers = 0;
+    num_handlers = 1;
+    roce_slot = 0;
+    memset(ether_slot, 0, sizeof(ether_slot));
     return 0;
-}
\ No newline at end of file
+}
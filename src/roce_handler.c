@@ -3,35 +3,58 @@
 #include <rte_ip.h>
 #include <rte_ethdev.h>
 #include <rte_udp.h>
-static int64_t _count=0;
+#include <rte_memcpy.h>
+#include "flow_table.h"
+#include "worker.h"
 
+static struct rte_ether_addr local_mac;
 
-/* pfc packet header within eth hdr */
-int init_roce_handler(const char *ip_addr)
+// 以太网 + IPv4 + UDP + BTH
+#define ROCE_HDR_LEN (sizeof(struct rte_ether_hdr) + sizeof(struct rte_ipv4_hdr) + \
+                      sizeof(struct rte_udp_hdr) + 12)
+
+
+// 发送时整体拷贝的PFC帧模板, 只需填入quanta
+static void build_pfc_template(struct pfc_frame *frame, const struct flowlet_params *p)
 {
-    last_timestamp=0;
-    if (inet_pton(AF_INET, ip_addr, &local_ip) != 1) {  
-        return -1;  
-    }  
+    memset(frame, 0, sizeof(*frame));
+    rte_ether_addr_copy(&p->pfc_dst, &frame->eth.dst_addr);
+    rte_ether_addr_copy(&local_mac, &frame->eth.src_addr);
+    frame->eth.ether_type = htons(RTE_ETHER_TYPE_CTL);
+    frame->pfc.opcode = htons(0x0101);
+#ifndef USE_DSCP_VALUE
+    frame->pfc.pev = htons(0x00ff);
+#endif
+}
 
+void roce_apply_params(struct worker_conf *conf)
+{
+    conf->params_gen = flowlet_params_read(&conf->params);
+    build_pfc_template(&conf->pfc_template, &conf->params);
+}
+
+/* pfc packet header within eth hdr */
+int init_roce_handler(void)
+{
     // 获取本地MAC地址  
     rte_eth_macaddr_get(0, &local_mac);  
     return 0; 
 }
 
-int handle_roce_packet(struct rte_mempool *endsys_pktmbuf_pool, struct rte_mbuf *pkt, uint16_t port_id)
+// 解析RoCE包的流键和MAC时间戳; 不是RoCE包时返回0
+static inline int roce_parse(struct rte_mbuf *pkt, struct flow_key *key, uint64_t *timestamp, uint8_t *prio)
 {
     struct rte_ether_hdr *eth_hdr;  
-    struct rte_mbuf *roce_response;
-    struct rte_ether_hdr *response_eth_hdr;
     struct rte_ipv4_hdr *ipv4_hdr;
     struct rte_udp_hdr *udp_hdr;
+    struct roce_header *bth;
 
-    struct pfc_header *pfc_hdr;
+    if (rte_pktmbuf_data_len(pkt) < ROCE_HDR_LEN)
+        return 0;
 
     // 获取以太网头部  
     eth_hdr = rte_pktmbuf_mtod(pkt, struct rte_ether_hdr *);  
-    
+
     // 获取ipv4头部  
     ipv4_hdr = rte_pktmbuf_mtod_offset(pkt, struct rte_ipv4_hdr *,   
                                       sizeof(struct rte_ether_hdr));  
@@ -40,21 +63,22 @@ int handle_roce_packet(struct rte_mempool *endsys_pktmbuf_pool, struct rte_mbuf
     uint8_t dscp = (ipv4_hdr->type_of_service >> 2) & 0x3F;
 
     // 根据DSCP值获取优先级队列  
-    uint8_t prio;  
-    if (dscp <= 7) prio = 0;  
-    else if (dscp <= 15) prio = 1;  
-    else if (dscp <= 23) prio = 2;  
-    else if (dscp <= 31) prio = 3;  
-    else if (dscp <= 39) prio = 4;  
-    else if (dscp <= 47) prio = 5;  
-    else if (dscp <= 55) prio = 6;  
-    else prio = 7;  
+    if (dscp <= 7) *prio = 0;
+    else if (dscp <= 15) *prio = 1;
+    else if (dscp <= 23) *prio = 2;
+    else if (dscp <= 31) *prio = 3;
+    else if (dscp <= 39) *prio = 4;
+    else if (dscp <= 47) *prio = 5;
+    else if (dscp <= 55) *prio = 6;
+    else *prio = 7;
+#else
+    *prio = 0;
 #endif
 
     // 跳过TCP包
     if (ipv4_hdr->next_proto_id==IPPROTO_TCP){
-        return -1;
-    }
+        return 0;
+    }  
 
     udp_hdr = rte_pktmbuf_mtod_offset(pkt, struct rte_udp_hdr *,
                                       sizeof(struct rte_ether_hdr) +
@@ -62,87 +86,125 @@ int handle_roce_packet(struct rte_mempool *endsys_pktmbuf_pool, struct rte_mbuf
 
     // 跳过非RoCE包
     if (rte_be_to_cpu_16(udp_hdr->src_port) != 4791) {  
-        return -1;    // 是4791端口  
+        return 0;    // 是4791端口
     }  
+    bth = (struct roce_header *)(udp_hdr + 1);
+    key->src_ip = ipv4_hdr->src_addr;
+    // qp_num字段包含1字节保留位和24位QP号
+    key->dst_qp = rte_be_to_cpu_32(bth->qp_num) & 0xFFFFFF;
+
     const uint8_t *addr = eth_hdr->src_addr.addr_bytes;  
 
     // 将6字节MAC地址转换为uint64_t  
-    uint64_t cur_timestamp = ((uint64_t)addr[0] << 40) |  
+    *timestamp = ((uint64_t)addr[0] << 40) |
                     ((uint64_t)addr[1] << 32) |  
                     ((uint64_t)addr[2] << 24) |  
                     ((uint64_t)addr[3] << 16) |  
                     ((uint64_t)addr[4] << 8)  |  
                     ((uint64_t)addr[5]);  
+    return 1;
+}
 
-    //printf("Before Test\n");
-    if(cur_timestamp-last_timestamp<TIME_GAP || cur_timestamp-last_timestamp>FLOWLET_TIMEOUT){
-        last_timestamp=cur_timestamp;
-        return 0;
+// 把PFC帧放入本lcore的发送缓冲, burst结束时统一发出; 热路径上不分配单个mbuf, 也不输出
+static inline int send_pfc(struct rte_mempool *pool, struct worker_conf *conf, uint16_t port_id,
+                           uint64_t stop_time, uint8_t prio)
+{
+    struct rte_mbuf *m;
+    struct pfc_frame *frame;
+    uint16_t quanta;
+
+    if (conf->pfc_stash_len == 0) {
+        if (rte_pktmbuf_alloc_bulk(pool, conf->pfc_stash, PFC_STASH_SIZE) != 0) {
+            conf->stats.alloc_failed++;
+            return -1;
+        }
+        conf->pfc_stash_len = PFC_STASH_SIZE;
     }
-    // printf("Pass the Test");
-    uint16_t stop_time = 1+FLOWLET_TIMEOUT-(cur_timestamp-last_timestamp);
-    last_timestamp=cur_timestamp;
-
-    // 分配新的mbuf用于RoCE响应  
-    roce_response = rte_pktmbuf_alloc(endsys_pktmbuf_pool);  
-    if (roce_response == NULL) {  
-        rte_pktmbuf_free(pkt);  
-        return -1;  
-    }  
-
-    // 计算总长度  
-    uint16_t total_length = sizeof(struct rte_ether_hdr) + sizeof(struct pfc_header);  
-    roce_response->data_len = total_length;  
-    roce_response->pkt_len = total_length;  
-
-    response_eth_hdr = rte_pktmbuf_mtod(roce_response, struct rte_ether_hdr *);  
-
-    // 设置目标MAC地址为 01-80-C2-00-00-01  
-    struct rte_ether_addr dst_mac;  
-    //e8ebd358a02c
-    // rte_ether_unformat_addr("01:80:c2:00:00:01", &dst_mac);  
-    rte_ether_unformat_addr("e8:eb:d3:58:a0:2c", &dst_mac);  
-    rte_ether_addr_copy(&dst_mac, &response_eth_hdr->dst_addr);  
-
-
-    // 设置源MAC地址  
-    rte_ether_addr_copy(&local_mac, &response_eth_hdr->src_addr);  
-    response_eth_hdr->ether_type = htons(RTE_ETHER_TYPE_CTL);  
-
-    // 构建PFC响应头部  
-    pfc_hdr = (struct pfc_header *)(response_eth_hdr + 1);
-    pfc_hdr->opcode = htons(0x0101);
+    m = conf->pfc_stash[--conf->pfc_stash_len];
+    m->data_len = sizeof(struct pfc_frame);
+    m->pkt_len = sizeof(struct pfc_frame);
+    frame = rte_pktmbuf_mtod(m, struct pfc_frame *);
+    rte_memcpy(frame, &conf->pfc_template, sizeof(struct pfc_frame));
 
+    quanta = htons((uint16_t)(stop_time/conf->params.quanta_ns));
 #ifdef USE_DSCP_VALUE
-    pfc_hdr->pev = htons(1<<prio)
+    frame->pfc.pev = htons(1<<prio);
+    frame->pfc.time[prio] = quanta;
 #else
-    pfc_hdr->pev = htons(0x00ff);
-#endif
-
+    RTE_SET_USED(prio);
     for(int i=0;i<8;i++)
-#ifdef USE_DSCP_VALUE
-        if (i == prio) {  
-            pfc_hdr->time[i] = htons((uint16_t)(stop_time/QUANTA_DURATION_NS));  
-        } else {  
-            pfc_hdr->time[i] = 0;  
-        }  
-#else
-            pfc_hdr->time[i] = htons((uint16_t)(stop_time/QUANTA_DURATION_NS));  
+        frame->pfc.time[i] = quanta;
 #endif
 
+    // 发送失败由发送缓冲的回调计入tx_failed
+    rte_eth_tx_buffer(port_id, conf->queue_id, conf->tx_buffer, m);
+    conf->stats.pfc_sent++;
+    return 0;
+}
 
-    // pfc_hdr->time[0] = 1;
-    for(int i=0;i<16;i++)
-        pfc_hdr->pad[i] = (char) 0;
-
-    // 发送响应  
-    if(rte_eth_tx_burst(port_id, 0, &roce_response, 1) < 1) {  
-        rte_pktmbuf_free(roce_response);  
-        printf("RoCE Response Send Failed.\n");  
+int handle_roce_burst(struct rte_mempool *endsys_pktmbuf_pool, struct rte_mbuf **pkts, uint16_t nb_pkts,
+                      uint16_t port_id)
+{
+    struct worker_conf *conf = RTE_PER_LCORE(worker_ctx);
+    struct flow_table *ft = conf->flows;
+    const struct flowlet_params *p = &conf->params;
+    struct flow_key keys[RTE_HASH_LOOKUP_BULK_MAX];
+    struct flow_state *states[RTE_HASH_LOOKUP_BULK_MAX];
+    uint64_t timestamps[RTE_HASH_LOOKUP_BULK_MAX];
+    uint8_t prios[RTE_HASH_LOOKUP_BULK_MAX];
+    uint16_t start, i, n;
+
+    for (start = 0; start < nb_pkts; start += RTE_HASH_LOOKUP_BULK_MAX) {
+        uint16_t end = RTE_MIN(nb_pkts, start + RTE_HASH_LOOKUP_BULK_MAX);
+
+        // 先解析整个burst, 再一次批量查找所有流
+        n = 0;
+        for (i = start; i < end; i++)
+            n += roce_parse(pkts[i], &keys[n], &timestamps[n], &prios[n]);
+        if (n == 0)
+            continue;
+        conf->stats.roce_pkts += n;
+        if (flow_table_lookup_bulk(ft, keys, n, states) < 0)
+            continue;
+
+        // 按包到达顺序逐个判定, 与offline重放 (flowlet_replay.replay_flows) 一致
+        for (i = 0; i < n; i++) {
+            struct flow_state *s = states[i];
+            uint64_t cur_timestamp = timestamps[i];
+
+            if (s == NULL) {
+                conf->stats.flow_table_full++;
+                continue;
+            }
+            if (cur_timestamp > ft->now)
+                ft->now = cur_timestamp;
+
+            uint64_t gap = cur_timestamp - s->last_timestamp;
+            s->last_timestamp = cur_timestamp;
+            conf->stats.gap_hist[log2_bucket(gap, GAP_HIST_BUCKETS)]++;
+            if (gap < p->time_gap) {
+                conf->stats.gaps_below++;
+                continue;
+            }
+            if (gap > p->flowlet_timeout) {
+                conf->stats.gaps_above++;
+                continue;
+            }
+
+            uint64_t stop_time = p->stop_time ? p->stop_time : 1+p->flowlet_timeout-gap;
+            if (send_pfc(endsys_pktmbuf_pool, conf, port_id, stop_time, prios[i]) == 0) {
+                s->pause_until = cur_timestamp + stop_time;
+                s->pfc_sent++;
+            }
+        }
     }  
-    rte_pktmbuf_free(pkt);  
-    _count++;
-    if(_count%100==0)
-        printf("%ld PFC Send\n",_count);
-    return 0;  
+
+    // 每个burst只老化固定数量的表项
+    conf->stats.flows_expired += flow_table_expire(ft, FLOW_EXPIRE_BATCH);
+    return 0; 
+}
+
+int handle_roce_packet(struct rte_mempool *endsys_pktmbuf_pool, struct rte_mbuf *pkt, uint16_t port_id)
+{
+    return handle_roce_burst(endsys_pktmbuf_pool, &pkt, 1, port_id);
 }
@@ -0,0 +1,185 @@
+#include <arpa/inet.h>
+#include <errno.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <rte_cycles.h>
+#include <rte_telemetry.h>
+#include <rte_version.h>
+#include "telemetry.h"
+#include "flowlet_params.h"
+
+// 23.03起u64接口改名为uint
+#if RTE_VERSION >= RTE_VERSION_NUM(23, 3, 0, 0)
+#define tel_dict_add(d, name, val) rte_tel_data_add_dict_uint(d, name, val)
+#define tel_array_add(d, val) rte_tel_data_add_array_uint(d, val)
+#define TEL_ARRAY_TYPE RTE_TEL_UINT_VAL
+#else
+#define tel_dict_add(d, name, val) rte_tel_data_add_dict_u64(d, name, val)
+#define tel_array_add(d, val) rte_tel_data_add_array_u64(d, val)
+#define TEL_ARRAY_TYPE RTE_TEL_U64_VAL
+#endif
+
+static struct worker_conf *tel_workers;
+static uint16_t tel_nb_queues;
+
+static const char *const ether_class_names[ETHER_CLASS_MAX] = {
+    [ETHER_CLASS_IPV4] = "ipv4_pkts",
+    [ETHER_CLASS_ARP] = "arp_pkts",
+    [ETHER_CLASS_CTL] = "ctl_pkts",
+    [ETHER_CLASS_OTHER] = "other_pkts",
+};
+
+// 按参数取单个队列或所有队列之和, 返回统计的活跃流数; 参数无效返回负值
+static int64_t collect(const char *params, struct worker_stats *total)
+{
+    uint16_t q, first = 0, last = tel_nb_queues;
+    int64_t active = 0;
+
+    if (params != NULL && *params != '\0') {
+        char *end;
+        unsigned long queue = strtoul(params, &end, 10);
+
+        if (*end != '\0' || queue >= tel_nb_queues)
+            return -EINVAL;
+        first = queue;
+        last = queue + 1;
+    }
+
+    memset(total, 0, sizeof(*total));
+    for (q = first; q < last; q++) {
+        worker_stats_add(total, &tel_workers[q].stats);
+        active += tel_workers[q].flows->active;
+    }
+    return active;
+}
+
+static int handle_stats(const char *cmd __rte_unused, const char *params, struct rte_tel_data *d)
+{
+    struct worker_stats s;
+    int64_t active = collect(params, &s);
+    int k;
+
+    if (active < 0)
+        return active;
+
+    rte_tel_data_start_dict(d);
+    tel_dict_add(d, "tsc_hz", rte_get_tsc_hz());
+    tel_dict_add(d, "queues", tel_nb_queues);
+    tel_dict_add(d, "rx_pkts", s.rx_pkts);
+    tel_dict_add(d, "rx_bursts", s.rx_bursts);
+    for (k = 0; k < ETHER_CLASS_MAX; k++)
+        tel_dict_add(d, ether_class_names[k], s.ether_pkts[k]);
+    tel_dict_add(d, "roce_pkts", s.roce_pkts);
+    tel_dict_add(d, "gaps_below", s.gaps_below);
+    tel_dict_add(d, "gaps_above", s.gaps_above);
+    tel_dict_add(d, "pfc_sent", s.pfc_sent);
+    tel_dict_add(d, "tx_failed", s.tx_failed);
+    tel_dict_add(d, "alloc_failed", s.alloc_failed);
+    tel_dict_add(d, "flow_table_full", s.flow_table_full);
+    tel_dict_add(d, "flows_active", active);
+    tel_dict_add(d, "flows_expired", s.flows_expired);
+    tel_dict_add(d, "reaction_bursts", s.reaction_bursts);
+    tel_dict_add(d, "reaction_cycles", s.reaction_cycles);
+    return 0;
+}
+
+static int add_hist(struct rte_tel_data *d, const uint64_t *hist, unsigned nb_buckets)
+{
+    unsigned k;
+
+    rte_tel_data_start_array(d, TEL_ARRAY_TYPE);
+    for (k = 0; k < nb_buckets; k++)
+        tel_array_add(d, hist[k]);
+    return 0;
+}
+
+static int handle_gap_hist(const char *cmd __rte_unused, const char *params, struct rte_tel_data *d)
+{
+    struct worker_stats s;
+    int64_t ret = collect(params, &s);
+
+    if (ret < 0)
+        return ret;
+    return add_hist(d, s.gap_hist, GAP_HIST_BUCKETS);
+}
+
+static int handle_cycle_hist(const char *cmd __rte_unused, const char *params, struct rte_tel_data *d)
+{
+    struct worker_stats s;
+    int64_t ret = collect(params, &s);
+
+    if (ret < 0)
+        return ret;
+    return add_hist(d, s.cycle_hist, CYCLE_HIST_BUCKETS);
+}
+
+// 当前参数及其版本; applied为所有worker都已应用的最小版本, 等于generation时新参数已全部生效
+static int handle_params(const char *cmd __rte_unused, const char *params __rte_unused, struct rte_tel_data *d)
+{
+    struct flowlet_params p;
+    char ip[INET_ADDRSTRLEN], mac[RTE_ETHER_ADDR_FMT_SIZE], quanta[32];
+    uint32_t gen = flowlet_params_read(&p);
+    uint32_t applied = gen;
+    uint16_t q;
+
+    for (q = 0; q < tel_nb_queues; q++) {
+        uint32_t worker_gen = __atomic_load_n(&tel_workers[q].params_gen, __ATOMIC_RELAXED);
+
+        if ((int32_t)(worker_gen - applied) < 0)
+            applied = worker_gen;
+    }
+    inet_ntop(AF_INET, &p.local_ip, ip, sizeof(ip));
+    rte_ether_format_addr(mac, sizeof(mac), &p.pfc_dst);
+    // 遥测字典没有浮点类型, quanta按字符串返回
+    snprintf(quanta, sizeof(quanta), "%g", p.quanta_ns);
+
+    rte_tel_data_start_dict(d);
+    tel_dict_add(d, "generation", gen);
+    tel_dict_add(d, "applied", applied);
+    tel_dict_add(d, "flowlet_timeout", p.flowlet_timeout);
+    tel_dict_add(d, "time_gap", p.time_gap);
+    tel_dict_add(d, "stop_time", p.stop_time);
+    rte_tel_data_add_dict_string(d, "quanta_ns", quanta);
+    rte_tel_data_add_dict_string(d, "local_ip", ip);
+    rte_tel_data_add_dict_string(d, "pfc_dst", mac);
+    return 0;
+}
+
+// /prototype/set_params,flowlet_timeout=6000,time_gap=4000
+static int handle_set_params(const char *cmd, const char *params, struct rte_tel_data *d)
+{
+    char err[128];
+
+    if (params == NULL || *params == '\0')
+        return -EINVAL;
+    if (flowlet_params_update(params, err, sizeof(err)) != 0) {
+        rte_tel_data_start_dict(d);
+        rte_tel_data_add_dict_string(d, "error", err);
+        return 0;
+    }
+    return handle_params(cmd, NULL, d);
+}
+
+int telemetry_init(struct worker_conf *workers, uint16_t nb_queues)
+{
+    tel_workers = workers;
+    tel_nb_queues = nb_queues;
+
+    if (rte_telemetry_register_cmd("/prototype/stats", handle_stats,
+            "Dataplane counters. Parameters: int queue (optional, default all)") != 0)
+        return -1;
+    if (rte_telemetry_register_cmd("/prototype/gap_hist", handle_gap_hist,
+            "log2 histogram of per-flow RoCE gaps in ns. Parameters: int queue (optional)") != 0)
+        return -1;
+    if (rte_telemetry_register_cmd("/prototype/cycle_hist", handle_cycle_hist,
+            "log2 histogram of TSC cycles per RX burst. Parameters: int queue (optional)") != 0)
+        return -1;
+    if (rte_telemetry_register_cmd("/prototype/params", handle_params,
+            "Current flowlet parameters and the generation applied by all workers. Takes no parameters") != 0)
+        return -1;
+    if (rte_telemetry_register_cmd("/prototype/set_params", handle_set_params,
+            "Change flowlet parameters. Parameters: name=value[,name=value...]") != 0)
+        return -1;
+    return 0;
+}
@@ -3,26 +3,21 @@
 #include <rte_ethdev.h>
 #include <rte_udp.h>
 #include "udp_handler.h"
+#include "worker.h"
 
-static uint32_t local_ip;
 static struct rte_ether_addr local_mac;
 
-int init_udp_handler(const char *ip_addr) {
-    // 转换IP地址字符串为网络字节序的32位整数
-    if (inet_pton(AF_INET, ip_addr, &local_ip) != 1) {
-        return -1;
-    }
-
+int init_udp_handler(void) {
     // 获取本地MAC地址
     rte_eth_macaddr_get(0, &local_mac);
     return 0;
 }
 
-int handle_udp_packet(struct rte_mempool *endsys_pktmbuf_pool,struct rte_mbuf *pkt, uint16_t port_id) {
+// 按请求构建UDP响应
+static inline void build_udp_reply(struct rte_mbuf *udp_reply, struct rte_mbuf *pkt, uint32_t local_ip) {
     struct rte_ether_hdr *eth_hdr;
     struct rte_ipv4_hdr *ip_hdr;
     struct rte_udp_hdr *udp_hdr;
-    struct rte_mbuf *udp_reply;
     struct rte_ether_hdr *reply_eth_hdr;
     struct rte_ipv4_hdr *reply_ip_hdr;
     struct rte_udp_hdr *reply_udp_hdr;
@@ -34,18 +29,6 @@ int handle_udp_packet(struct rte_mempool *endsys_pktmbuf_pool,struct rte_mbuf *p
                                      sizeof(struct rte_ether_hdr) + 
                                      sizeof(struct rte_ipv4_hdr));
 
-    // 检查目标IP是否匹配
-    if (ip_hdr->dst_addr != local_ip) {
-        rte_pktmbuf_free(pkt);
-        return 0;
-    }
-
-    // 分配新的mbuf用于UDP响应
-    udp_reply = rte_pktmbuf_alloc(endsys_pktmbuf_pool);
-    if (udp_reply == NULL) {
-        rte_pktmbuf_free(pkt);
-        return -1;
-    }
     // 计算总长度
     uint16_t total_length = sizeof(struct rte_ether_hdr) + sizeof(struct rte_ipv4_hdr) + sizeof(struct rte_udp_hdr);
     udp_reply->data_len = total_length;
@@ -79,10 +62,43 @@ int handle_udp_packet(struct rte_mempool *endsys_pktmbuf_pool,struct rte_mbuf *p
     reply_udp_hdr->dgram_len = htons(sizeof(struct rte_udp_hdr));
     reply_udp_hdr->dgram_cksum = 0;
     reply_udp_hdr->dgram_cksum = rte_ipv4_udptcp_cksum(reply_ip_hdr, reply_udp_hdr);
+}
 
-    // 发送响应
-    rte_eth_tx_burst(port_id, 0, &udp_reply, 1);
-    rte_pktmbuf_free(pkt);
+int handle_udp_burst(struct rte_mempool *endsys_pktmbuf_pool, struct rte_mbuf **pkts, uint16_t nb_pkts,
+                     uint16_t port_id) {
+    struct worker_conf *conf = RTE_PER_LCORE(worker_ctx);
+    struct rte_mbuf *requests[BURST_SIZE];
+    struct rte_mbuf *replies[BURST_SIZE];
+    struct rte_ipv4_hdr *ip_hdr;
+    // 本机IP随运行时参数变化, 取本worker的参数快照
+    uint32_t local_ip = conf->params.local_ip;
+    uint16_t i, n = 0;
 
+    for (i = 0; i < nb_pkts && n < BURST_SIZE; i++) {
+        ip_hdr = rte_pktmbuf_mtod_offset(pkts[i], struct rte_ipv4_hdr *, 
+                                        sizeof(struct rte_ether_hdr));
+
+        // 检查目标IP是否匹配
+        if (ip_hdr->dst_addr != local_ip)
+            continue;
+        requests[n++] = pkts[i];
+    }
+    if (n == 0)
+        return 0;
+
+    // 一次分配所有UDP响应的mbuf
+    if (rte_pktmbuf_alloc_bulk(endsys_pktmbuf_pool, replies, n) != 0) {
+        conf->stats.alloc_failed += n;
+        return -1;
+    }
+    for (i = 0; i < n; i++) {
+        build_udp_reply(replies[i], requests[i], local_ip);
+        // 发送响应, 放入本lcore的发送缓冲, 失败由缓冲回调计数
+        rte_eth_tx_buffer(port_id, conf->queue_id, conf->tx_buffer, replies[i]);
+    }
     return 0;
+}
+
+int handle_udp_packet(struct rte_mempool *endsys_pktmbuf_pool,struct rte_mbuf *pkt, uint16_t port_id) {
+    return handle_udp_burst(endsys_pktmbuf_pool, &pkt, 1, port_id);
 }
\ No newline at end of file
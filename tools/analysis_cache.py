@@ -0,0 +1,145 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Callable, Dict, Optional, Sequence, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = './cache'
+# 缓存目录的磁盘预算, 超出后按最近最少使用淘汰
+DEFAULT_MAX_BYTES = 20 << 30
+# 内容指纹: 文件首尾各取一段, 中间均匀采样若干块
+FINGERPRINT_EDGE = 1 << 20
+FINGERPRINT_SAMPLES = 16
+FINGERPRINT_BLOCK = 64 << 10
+
+CacheData = Union[np.ndarray, Dict[str, np.ndarray]]
+Sources = Union[str, Sequence[str]]
+
+# 进程内记忆已计算过的指纹, 键包含inode/大小/mtime
+_fingerprints: Dict[tuple, str] = {}
+
+
+def capture_fingerprint(file_name: str) -> str:
+    """由文件大小、mtime和采样内容计算的快速指纹"""
+    st = os.stat(file_name)
+    memo_key = (os.path.abspath(file_name), st.st_ino, st.st_size, st.st_mtime_ns)
+    if memo_key in _fingerprints:
+        return _fingerprints[memo_key]
+
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f'{st.st_size}:{st.st_mtime_ns}'.encode())
+    with open(file_name, 'rb') as f:
+        h.update(f.read(FINGERPRINT_EDGE))
+        if st.st_size > 2 * FINGERPRINT_EDGE:
+            step = (st.st_size - 2 * FINGERPRINT_EDGE) // (FINGERPRINT_SAMPLES + 1)
+            for i in range(1, FINGERPRINT_SAMPLES + 1):
+                f.seek(FINGERPRINT_EDGE + i * step)
+                h.update(f.read(FINGERPRINT_BLOCK))
+            f.seek(st.st_size - FINGERPRINT_EDGE)
+            h.update(f.read(FINGERPRINT_EDGE))
+    digest = h.hexdigest()
+    _fingerprints[memo_key] = digest
+    return digest
+
+
+class AnalysisCache:
+    """各工具共用的分析结果缓存: 按抓包内容和过滤参数寻址, 原子写入, LRU淘汰"""
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+    def key(self, sources: Sources, product: str, **params) -> str:
+        """缓存键: 源文件指纹 + 产物名 + 过滤参数"""
+        if isinstance(sources, (str, os.PathLike)):
+            sources = [sources]
+        desc = {
+            'sources': [capture_fingerprint(str(s)) for s in sources],
+            'product': product,
+            'params': params,
+        }
+        return hashlib.blake2b(json.dumps(desc, sort_keys=True, default=str).encode(),
+                               digest_size=16).hexdigest()
+
+    def path(self, sources: Sources, product: str, **params) -> Path:
+        first = sources if isinstance(sources, (str, os.PathLike)) else sources[0]
+        stem = Path(first).stem
+        return self.cache_dir / f'{stem}_{product}_{self.key(sources, product, **params)}.npz'
+
+    def load(self, sources: Sources, product: str, **params) -> Optional[CacheData]:
+        """命中时返回缓存数据并刷新其LRU时间, 未命中返回None"""
+        path = self.path(sources, product, **params)
+        try:
+            with np.load(path) as npz:
+                data = {name: npz[name] for name in npz.files}
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Error loading cache file {path}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        logger.info(f"Loaded {product} from cache: {path}")
+        return data['data'] if set(data) == {'data'} else data
+
+    def save(self, sources: Sources, product: str, data: CacheData, **params) -> Path:
+        """原子写入缓存文件, 随后按磁盘预算淘汰旧文件"""
+        path = self.path(sources, product, **params)
+        arrays = data if isinstance(data, dict) else {'data': data}
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, prefix='.tmp_', suffix='.npz')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        logger.info(f"Saved {product} to cache: {path}")
+        self.evict(keep=path)
+        return path
+
+    def get_or_compute(self, sources: Sources, product: str,
+                       compute: Callable[[], CacheData], **params) -> CacheData:
+        data = self.load(sources, product, **params)
+        if data is None:
+            data = compute()
+            self.save(sources, product, data, **params)
+        return data
+
+    def evict(self, keep: Optional[Path] = None):
+        """按最近访问时间淘汰, 直到缓存目录总大小不超过预算
+
+        列式存储 (*.store目录) 按目录内文件总大小计入, 按目录的修改时间排序
+        """
+        entries = []
+        for path in [*self.cache_dir.glob('*.np[yz]'), *self.cache_dir.glob('*.store')]:
+            try:
+                st = path.stat()
+                size = sum(f.stat().st_size for f in path.rglob('*') if f.is_file()) if path.is_dir() \
+                    else st.st_size
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime_ns, size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            if path.is_dir():
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                path.unlink(missing_ok=True)
+            total -= size
+            logger.info(f"Evicted cache file: {path}")
@@ -1,21 +1,18 @@
 import os  
-import re  
 import numpy as np  
-import matplotlib.pyplot as plt  
-import seaborn as sns  
 from typing import Dict, Tuple  
+from perftest_log import LogIngestor, ingest_tree, table_len
 
 class BandwidthAnalyzer:  
-    def __init__(self, ft_value: int, thre_value: int, version: str):  
+    def __init__(self, ft_value: int, thre_value: int, version: str, msg_size: int = 65536):  
         self.ft_value = ft_value
         self.thre_value = thre_value
         self.version = version  
+        self.msg_size = msg_size  
         self.resources_dir = "./resources/prototype/"+version  
         self.base_filename = f"prototype_ft_{ft_value}_thre_{thre_value}_{version}"  
-        self.pattern = r'65536\s+\d+\s+\d+\.\d+\s+(\d+\.\d+)'  
-
-        if version == 'v3':  
-            self.pattern = r'65536\s+\d+\s+\d+\.\d+\s+\d+\.\d+\s+\d+\.\d+\s+(\d+\.\d+)\s+\d+\.\d+\s+(\d+\.\d+)\s+(\d+\.\d+)'  
+        # 日志按字节偏移增量解析, 列名取自perftest表头  
+        self.ingestor = LogIngestor()  
         
         os.makedirs(self.resources_dir, exist_ok=True)  
         
@@ -25,22 +22,10 @@ class BandwidthAnalyzer:
 
     def extract_bandwidth_data(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:  
         """从日志文件中提取带宽数据"""  
-        average_bw = []  
-        fct_99 = []  
-        fct_999 = []       
-        with open(self.log_file, 'r') as f:  
-            content = f.read()  
-            matches = re.finditer(self.pattern, content)  
-            
-            for match in matches:  
-                average_bw.append(float(match.group(1)))  
-                if self.version == 'v3':  
-                    fct_99.append(float(match.group(2)))  
-                    fct_999.append(float(match.group(3)))  
-        
-        return np.array(average_bw), np.array(fct_99), np.array(fct_999)  
+        return select_metrics(self.ingestor.ingest(self.log_file), self.msg_size)  
 
-    def get_statistics(self, data: np.ndarray) -> Dict:  
+    @staticmethod  
+    def get_statistics(data: np.ndarray) -> Dict:  
         """计算统计数据"""  
         if len(data) == 0:  
             return {}  
@@ -57,6 +42,7 @@ class BandwidthAnalyzer:
 
     def create_single_boxplot(self, ax, data: np.ndarray, stats: Dict, title: str, ylabel: str):  
         """创建单个箱线图"""  
+        import seaborn as sns  
         sns.boxplot(data=data,   
                    ax=ax,  
                    width=0.5,  
@@ -111,6 +97,9 @@ class BandwidthAnalyzer:
     def create_boxplot(self, avg_data: np.ndarray, fct_99: np.ndarray, fct_999: np.ndarray,   
                       avg_stats: Dict, fct_99_stats: Dict, fct_999_stats: Dict):  
         """创建箱线图"""  
+        # 绘图库只在出图时导入  
+        import matplotlib.pyplot as plt  
+        import seaborn as sns  
         sns.set_style("whitegrid")  
         sns.set_palette("husl")  
 
@@ -173,6 +162,42 @@ class BandwidthAnalyzer:
             for key, value in fct_999_stats.items():  
                 print(f"{key}: {value:.2f}")  
 
+def select_metrics(table: Dict[str, np.ndarray], msg_size: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:  
+    """按消息大小筛选行, 返回 (平均带宽或平均延迟, 99% FCT, 99.9% FCT)"""  
+    if table_len(table) == 0:  
+        return np.array([]), np.array([]), np.array([])  
+    rows = table['bytes'] == msg_size  
+    # ib_send_bw 输出 BW average, ib_send_lat 输出 t_avg 及尾延迟; 两类日志合并后缺失的列为nan, 按行选取  
+    n = table_len(table)  
+    bw_average = table.get('bw_average', np.full(n, np.nan))  
+    average = np.where(np.isnan(bw_average), table.get('t_avg', np.full(n, np.nan)), bw_average)  
+    empty = np.array([])  
+    # 尾延迟只来自延迟测试的行  
+    fct_99 = table['p99'][rows & ~np.isnan(table['p99'])] if 'p99' in table else empty  
+    fct_999 = table['p99.9'][rows & ~np.isnan(table['p99.9'])] if 'p99.9' in table else empty  
+    return average[rows & ~np.isnan(average)], fct_99, fct_999  
+
+
+def compare_configurations(version: str, msg_size: int = 65536, workers: int = None,  
+                           root: str = "./resources/prototype/") -> Dict[Tuple[float, float], Dict]:  
+    """一次并行增量导入某版本下所有 prototype_ft_*_thre_* 日志, 返回每组 (ft, thre) 的统计"""  
+    table = ingest_tree(os.path.join(root, version), workers=workers)  
+    if table_len(table) == 0:  
+        return {}  
+    keys = np.stack([table['ft'], table['thre']], axis=1)  
+    configs, inverse = np.unique(keys, axis=0, return_inverse=True)  
+    results = {}  
+    for i, (ft, thre) in enumerate(configs):  
+        sub = {name: col[inverse.ravel() == i] for name, col in table.items()}  
+        avg_data, fct_99, fct_999 = select_metrics(sub, msg_size)  
+        results[(ft, thre)] = {  
+            'average': BandwidthAnalyzer.get_statistics(avg_data),  
+            'fct_99': BandwidthAnalyzer.get_statistics(fct_99),  
+            'fct_999': BandwidthAnalyzer.get_statistics(fct_999),  
+        }  
+    return results  
+
+
 # 使用示例  
 if __name__ == "__main__":  
     ft_value = 0  
@@ -0,0 +1,111 @@
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Optional
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+BINARY = './build/Prototype'
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'roce_flowlets.pcap')
+RESULTS_DIR = './resources/bench/'
+# 越小越好的指标, 比较时超过阈值即视为回退
+METRICS = [
+    ('cycles_per_pkt', lambda r: r['cycles_per_pkt']),
+    ('classify cycles/pkt', lambda r: r['classify_cycles_per_pkt']),
+    ('roce cycles/pkt', lambda r: r['handlers']['roce']['cycles_per_pkt']),
+    ('arp cycles/pkt', lambda r: r['handlers'].get('arp', {}).get('cycles_per_pkt', 0.0)),
+    ('roce p50', lambda r: r['roce_cycles_per_pkt']['p50']),
+    ('roce p99', lambda r: r['roce_cycles_per_pkt']['p99']),
+]
+
+
+def git_commit() -> str:
+    proc = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True)
+    return proc.stdout.strip() or 'unknown'
+
+
+def run_bench(binary: str, pcap: str, passes: int, lcore: int = 0, extra_args=()) -> Dict:
+    """在单个lcore上以基准测试模式运行数据面; 发出的PFC帧丢给net_null"""
+    with tempfile.TemporaryDirectory() as tmp:
+        out_file = os.path.join(tmp, 'bench.json')
+        cmd = [binary, '-l', str(lcore), '--no-pci', '--file-prefix=dataplane_bench', '--vdev=net_null0',
+               '--', '--bench', os.path.abspath(pcap), '--bench-passes', str(passes),
+               '--bench-json', out_file, *extra_args]
+        logger.info(' '.join(cmd))
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"Benchmark exited with {proc.returncode}:\n{proc.stdout}{proc.stderr}")
+        with open(out_file) as f:
+            result = json.load(f)
+    result['commit'] = git_commit()
+    return result
+
+
+def compare(base: Dict, new: Dict, threshold: float) -> List[str]:
+    """逐项比较两次结果, 返回超过阈值的回退项"""
+    regressions = []
+    print(f"{'metric':<20} {base.get('commit', 'base'):>12} {new.get('commit', 'new'):>12} {'change':>9}")
+    for name, get in METRICS:
+        b, n = get(base), get(new)
+        change = (n - b) / b if b else 0.0
+        flag = ' <-- regression' if change > threshold else ''
+        print(f"{name:<20} {b:>12.2f} {n:>12.2f} {change:>+9.1%}{flag}")
+        if flag:
+            regressions.append(name)
+    print(f"{'Mpps':<20} {base['mpps']:>12.3f} {new['mpps']:>12.3f}")
+    return regressions
+
+
+def load(path: str) -> Dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the dataplane pcap-replay benchmark and track regressions')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run = sub.add_parser('run', help='run the benchmark and store the JSON result under the current commit')
+    run.add_argument('--binary', default=BINARY)
+    run.add_argument('--pcap', default=FIXTURE)
+    run.add_argument('--passes', type=int, default=100)
+    run.add_argument('--lcore', type=int, default=0)
+    run.add_argument('--output', help=f'result file (default: {RESULTS_DIR}<commit>.json)')
+    run.add_argument('--baseline', help='compare against this result and fail on regression')
+    run.add_argument('--threshold', type=float, default=0.05, help='allowed relative increase in cycles')
+
+    cmp = sub.add_parser('compare', help='compare two stored results')
+    cmp.add_argument('base')
+    cmp.add_argument('new')
+    cmp.add_argument('--threshold', type=float, default=0.05)
+    args = parser.parse_args()
+
+    baseline: Optional[str] = None
+    if args.command == 'run':
+        result = run_bench(args.binary, args.pcap, args.passes, args.lcore)
+        output = args.output or os.path.join(RESULTS_DIR, f"{result['commit']}.json")
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"{result['packets']} packets, {result['mpps']:.3f} Mpps, {result['cycles_per_pkt']:.1f} cycles/pkt "
+              f"(RoCE {result['handlers']['roce']['cycles_per_pkt']:.1f}, p99 {result['roce_cycles_per_pkt']['p99']}), "
+              f"saved to {output}")
+        baseline, new = args.baseline, result
+    else:
+        baseline, new = args.base, load(args.new)
+
+    if baseline:
+        regressions = compare(load(baseline), new, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,15 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+import io
 import numpy as np
 import os
 import sys
 import argparse
-import matplotlib.pyplot as plt  
 
 file_size=143
 
 def plot_cdf(data):  
+    import matplotlib.pyplot as plt
     # 将二维列表转换为两个列表：时间和CDF值  
     time = data[0]  
     cdf =  data[1]   
@@ -33,75 +34,196 @@ def plot_cdf(data):
     plt.show() 
     plt.savefig('fig.png',dpi=300)
 
-def get_cdf(v: list):        
+# 批量读取时每块的字节数
+CHUNK_BYTES = 64 << 20
+
+
+def iter_log_chunks(filename, ncols=3, chunk_bytes=CHUNK_BYTES):
+    """分块读取逗号分隔的数值日志, 每块按完整行切分后整体解析为 (n, ncols) 数组"""
+    with open(filename, 'rb') as f:
+        rest = b''
+        while True:
+            block = f.read(chunk_bytes)
+            if not block:
+                break
+            block = rest + block
+            end = block.rfind(b'\n') + 1
+            if end == 0:
+                rest = block
+                continue
+            rest = block[end:]
+            yield _parse_block(block[:end], ncols)
+        if rest.strip():
+            yield _parse_block(rest + b'\n', ncols)
+
+
+def _parse_block(block, ncols):
+    # 换行统一替换为逗号, 由numpy在C层一次解析整块文本
+    text = block.replace(b'\r', b'').replace(b'\n', b',').decode()
+    return np.fromstring(text, sep=',').reshape(-1, ncols)
+
+
+def load_log(filename, ncols=3):
+    """读取整个日志为 (n, ncols) 数组"""
+    chunks = list(iter_log_chunks(filename, ncols))
+    return np.concatenate(chunks) if chunks else np.empty((0, ncols))
+
+
+def cdf_table(values, weighting='flow'):
+    """按取值分组计算CDF; weighting为'flow'时每条流权重为1, 为'byte'时权重为流大小"""
+    v = np.sort(np.asarray(values, dtype=np.float64))
+    if len(v) == 0:
+        return {name: np.empty(0) for name in ('value', 'count', 'weight', 'cdf')}
+    starts = np.flatnonzero(np.r_[True, v[1:] != v[:-1]])
+    value = v[starts]
+    count = np.diff(np.r_[starts, len(v)])
+    weight = count * value if weighting == 'byte' else count.astype(np.float64)
+    cum = np.cumsum(weight)
+    return {'value': value, 'count': count, 'weight': cum, 'cdf': cum / cum[-1]}
+
+
+def get_cdfs(datasets: dict, weighting='flow'):
+    """一次计算多组数据(不同trace或不同列)的CDF"""
+    return {name: cdf_table(values, weighting) for name, values in datasets.items()}
+
+
+def write_cdf(table, out):
+    """以 'value count cum_weight cdf' 格式一次性写出CDF表"""
+    np.savetxt(out, np.column_stack([table['value'], table['count'], table['weight'], table['cdf']]),
+               fmt=['%.15g', '%d', '%.15g', '%.15g'])
+
+
+def get_cdf(v):
     # calculate cdf
-    v_sorted = sorted(v,key=lambda x:x[0])
-    p = 1. * np.arange(len(v)) / (len(v) - 1)
-    od = []
-    bkt = [0,0,0,0]
-    len_accum = 0
-    time=[]
-    cdf=[]
-    for i in range(len(v_sorted)):
-        key = v_sorted[i][1]/1000.0 
-        len_accum = v_sorted[i][0]
-        if bkt[0] == key:
-            bkt[1] += 1
-            bkt[2] = len_accum
-            bkt[3] = p[i]
-        else:
-            od.append(bkt)
-            bkt = [0,0,0,0]
-            bkt[0] = key
-            bkt[1] = 1
-            bkt[2] = len_accum
-            bkt[3] = p[i]
-    if od[-1][0] != bkt[0]:
-        od.append(bkt)
-    od.pop(0)
-
-    ret = ""
-    for bkt in od:
-        var = str(bkt[0]) + " " + str(bkt[1]) + " " + str(bkt[2]) + " " + str(bkt[3]) + "\n"
-        ret += var
-        # time.append(bkt[1]*file_size+time[-1] if len(time)!=0 else 0)
-        time.append(bkt[2])
-        cdf.append(bkt[3])
-        
-    return ret,[time,cdf]
+    # 按第0列排序后, 第1列(/1000)连续相同的行归为一个桶, 每桶记录 [key, 行数, 最后一行的第0列, 最后一行的p]
+    data = np.asarray(v, dtype=np.float64)
+    n = len(data)
+    order = np.argsort(data[:, 0], kind='stable')
+    len_accum = data[order, 0]
+    key = data[order, 1] / 1000.0
+    p = 1. * np.arange(n) / (n - 1)
+
+    starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+    ends = np.r_[starts[1:], n] - 1
+    # 原实现以 key=0 的空桶起始并在最后丢弃, key为0的首桶会随之被丢弃
+    if key[0] == 0:
+        starts, ends = starts[1:], ends[1:]
+    od = np.column_stack([key[starts], ends - starts + 1, len_accum[ends], p[ends]])
+
+    out = io.StringIO()
+    np.savetxt(out, od, fmt=['%.15g', '%d', '%.15g', '%.15g'])
+    time = od[:, 2]
+    cdf = od[:, 3]
+    return out.getvalue(), [time, cdf]
 
-def get_bandwidth_utilization(data:list):
+# 链路带宽, 与 QUANTA_DURATION_NS 假设的 100Gbps 网卡一致
+LINK_CAPACITY_BPS = 100 * (10**9)
+
+
+def get_bandwidth_utilization(data, capacity_bps=LINK_CAPACITY_BPS):
     """  
     Calculate network bandwidth utilization.  
 
     Parameters:  
-    data (list of lists): n*3 list, where:  
+    data (n*3 array or list of lists), where:  
         - First column is the packet size in bytes.  
+        - Second column is the packet time in nanoseconds.  
         - Third column is the time of sending in seconds.  
+    capacity_bps: link capacity in bits per second.
         
     Returns:  
     float: Bandwidth utilization as a percentage.  
     """  
-    
+    data = np.asarray(data, dtype=np.float64)
+
     # Calculate the total data sent in bits  
-    total_data_sent_bits = sum(row[0] * 8 for row in data)  
+    total_data_sent_bits = data[:, 0].sum() * 8  
     
-    print(sum(row[1] for row in data))
+    print(data[:, 1].sum())
     # Calculate the total time in seconds 
-    total_time =  sum(row[1] for row in data) /1_000_000_000
-    
-    max_network_capacity_bps = 40 * (10**9)  # 40 Gbps  
+    total_time = data[:, 1].sum() / 1_000_000_000
     
     # Calculate the actual bandwidth used  
     actual_bandwidth_bps = total_data_sent_bits / total_time  
     print(actual_bandwidth_bps)
     
     # Calculate the utilization percentage  
-    utilization_percentage = (actual_bandwidth_bps / max_network_capacity_bps) * 100  
+    utilization_percentage = (actual_bandwidth_bps / capacity_bps) * 100  
     
     return utilization_percentage  
 
 
+class WindowAccumulator:
+    """按固定宽度时间桶累加字节数; 桶数组可向两端扩展, 内存只与时间跨度/桶宽有关"""
+
+    def __init__(self, bin_ns):
+        self.bin_ns = int(bin_ns)
+        self.base = None            # 第一个桶的绝对编号
+        self.bytes = np.zeros(0)
+        self.packets = np.zeros(0, dtype=np.int64)
+
+    def add(self, times_ns, sizes):
+        if len(times_ns) == 0:
+            return
+        idx = np.floor_divide(np.asarray(times_ns, dtype=np.float64), self.bin_ns).astype(np.int64)
+        lo, hi = int(idx.min()), int(idx.max())
+        if self.base is None:
+            self.base = lo
+        if lo < self.base:
+            pad = self.base - lo
+            self.bytes = np.r_[np.zeros(pad), self.bytes]
+            self.packets = np.r_[np.zeros(pad, dtype=np.int64), self.packets]
+            self.base = lo
+        length = max(hi - self.base + 1, len(self.bytes))
+        self.bytes = np.r_[self.bytes, np.zeros(length - len(self.bytes))]
+        self.packets = np.r_[self.packets, np.zeros(length - len(self.packets), dtype=np.int64)]
+        self.bytes += np.bincount(idx - self.base, weights=sizes, minlength=length)
+        self.packets += np.bincount(idx - self.base, minlength=length)
+
+    def series(self, window_ns=None, capacity_bps=LINK_CAPACITY_BPS):
+        """返回时间序列; window_ns为空时为翻转窗口, 否则为步长bin_ns的滑动窗口"""
+        window_ns = self.bin_ns if window_ns is None else int(window_ns)
+        if window_ns % self.bin_ns:
+            raise ValueError("window_ns must be a multiple of the bin width")
+        k = window_ns // self.bin_ns
+        # 滑动窗口由前缀和相减得到, 代价与桶数成线性
+        cum_bytes = np.r_[0.0, np.cumsum(self.bytes)]
+        cum_packets = np.r_[0, np.cumsum(self.packets)]
+        n = max(len(self.bytes) - k + 1, 0)
+        window_bytes = cum_bytes[k:k + n] - cum_bytes[:n]
+        throughput = window_bytes * 8 / (window_ns * 1e-9)
+        return {
+            'start_ns': (self.base or 0) * self.bin_ns + np.arange(n, dtype=np.int64) * self.bin_ns,
+            'bytes': window_bytes,
+            'packets': cum_packets[k:k + n] - cum_packets[:n],
+            'throughput_bps': throughput,
+            'utilization': throughput / capacity_bps,
+        }
+
+
+def windowed_utilization(data, window_ns, step_ns=None, capacity_bps=LINK_CAPACITY_BPS,
+                         size_col=0, time_col=2, time_scale=1e9):
+    """
+    Throughput and link utilization over time.
+
+    window_ns: window width; step_ns: sliding step (None for tumbling windows).
+    time_scale converts the time column to nanoseconds (log.dat stores seconds).
+    """
+    data = np.asarray(data, dtype=np.float64)
+    acc = WindowAccumulator(step_ns or window_ns)
+    acc.add(data[:, time_col] * time_scale, data[:, size_col])
+    return acc.series(window_ns, capacity_bps)
+
+
+def windowed_utilization_file(filename, window_ns, step_ns=None, capacity_bps=LINK_CAPACITY_BPS,
+                              size_col=0, time_col=2, time_scale=1e9, ncols=3):
+    """分块读取log.dat计算窗口利用率, 内存不随行数增长"""
+    acc = WindowAccumulator(step_ns or window_ns)
+    for chunk in iter_log_chunks(filename, ncols):
+        acc.add(chunk[:, time_col] * time_scale, chunk[:, size_col])
+    return acc.series(window_ns, capacity_bps)
+
+
 def main():
     parser = argparse.ArgumentParser(description='get CDF of FCTs')
     parser.add_argument('-name', dest='name', action='store', required=True, help="Output filename in /log folder")
@@ -116,12 +238,7 @@ def main():
         print("ERROR - Cannot find the file!!")
         exit(1)
 
-    pkg_data=[]
-    with open(filename, "r") as f:
-        for line in f.readlines():
-            parsed_line = line.replace("\n","").split(",")
-            pkg_data.append([float(parsed_line[0]),float(parsed_line[1]),float(parsed_line[2])])
-    
+    pkg_data = load_log(filename)
 
     _,data=get_cdf(pkg_data)
     plot_cdf(data)
@@ -129,6 +246,12 @@ def main():
     utilization = get_bandwidth_utilization(pkg_data)  
     print(f"Bandwidth utilization: {utilization:.2f}%") 
 
+    # 1us翻转窗口的利用率序列, 用于定位拥塞时段
+    series = windowed_utilization(pkg_data, window_ns=1000)
+    if len(series['utilization']):
+        peak = series['utilization'].argmax()
+        print(f"Peak 1us utilization: {series['utilization'][peak] * 100:.2f}% at {series['start_ns'][peak]} ns")
+
 
 
 if __name__ == "__main__":
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""本地替身程序: 按perftest (ib_send_lat / ib_send_bw) 的格式输出结果, 用于在无RDMA网卡时测试运行器"""
+import argparse
+import random
+import sys
+import time
+
+SEPARATOR = '-' * 87
+LAT_HEADER = (' #bytes #iterations    t_min[usec]    t_max[usec]  t_typical[usec]    t_avg[usec]'
+              '    t_stdev[usec]   99% percentile[usec]   99.9% percentile[usec] ')
+BW_HEADER = ' #bytes     #iterations    BW peak[MB/sec]    BW average[MB/sec]   MsgRate[Mpps]'
+
+
+def lat_row(size: int, iters: int) -> str:
+    base = 1.5 + size / 12500.0
+    t_min = base * random.uniform(0.95, 1.0)
+    t_avg = base * random.uniform(1.0, 1.05)
+    return (f' {size:<10d} {iters:<10d}     {t_min:<14.2f} {base * 2.5:<12.2f} {base:<18.2f} '
+            f'{t_avg:<16.2f} {base * 0.02:<15.2f} {base * 1.1:<23.2f} {base * 2.0:<8.2f}')
+
+
+def bw_row(size: int, iters: int) -> str:
+    bw = min(11000.0, size / 4.0) * random.uniform(0.9, 1.0)
+    return f' {size:<10d} {iters:<16d} {bw * 1.01:<18.2f} {bw:<20.2f} {bw / size:.6f}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='perftest stand-in')
+    parser.add_argument('server', nargs='?', help='server address (client mode)')
+    parser.add_argument('-d', dest='device', default='mlx5_0')
+    parser.add_argument('-n', dest='iters', type=int, default=1000)
+    parser.add_argument('-s', dest='size', type=int, default=65536)
+    parser.add_argument('-a', dest='all_sizes', action='store_true')
+    parser.add_argument('--mode', choices=['lat', 'bw'], default='lat')
+    parser.add_argument('--delay', type=float, default=0.2, help='simulated run time (s)')
+    parser.add_argument('--exit-code', type=int, default=0)
+    args = parser.parse_args()
+
+    title = 'Send Latency Test' if args.mode == 'lat' else 'Send BW Test'
+    print(SEPARATOR)
+    print(f'                    {title}')
+    print(f' Dual-port       : OFF\t\tDevice         : {args.device}')
+    print(SEPARATOR, flush=True)
+    if args.server is None:
+        print('\n************************************')
+        print('* Waiting for client to connect... *')
+        print('************************************', flush=True)
+
+    sizes = [2 ** i for i in range(1, 24)] if args.all_sizes else [args.size]
+    print(LAT_HEADER if args.mode == 'lat' else BW_HEADER, flush=True)
+    for size in sizes:
+        time.sleep(args.delay / len(sizes))
+        print(lat_row(size, args.iters) if args.mode == 'lat' else bw_row(size, args.iters), flush=True)
+    print(SEPARATOR, flush=True)
+    sys.exit(args.exit_code)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+from flowlet_replay import FLOWLET_TIMEOUT, TIME_GAP, flow_keys, replay_flows
+from pcap_reader import ROCE_PORT, extract_packets, extract_pfc_frames
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+BINARY = './build/Prototype'
+
+
+def read_pfc_quanta(pcap_file: str) -> np.ndarray:
+    """按发送顺序读取PFC帧time[0]中的quanta"""
+    return extract_pfc_frames(pcap_file)['quanta'][:, 0]
+
+
+def run_dataplane(binary: str, pcap_file: str, out_file: str, duration: int, extra_args=()):
+    # 单lcore单队列, 发出的PFC顺序与抓包中触发包的顺序一致
+    cmd = [binary, '-l', '0', '--no-pci', '--file-prefix=flow_table_check',
+           f'--vdev=net_pcap0,rx_pcap={pcap_file},tx_pcap={out_file}',
+           '--', '-q', '1', '-t', str(duration), *extra_args]
+    logger.info(' '.join(cmd))
+    proc = subprocess.run(cmd, capture_output=True, text=True, timeout=duration + 60)
+    if proc.returncode != 0:
+        raise RuntimeError(f"Dataplane exited with {proc.returncode}:\n{proc.stdout}{proc.stderr}")
+    return proc.stdout
+
+
+def check(pcap_file: str, pfc_quanta: np.ndarray, time_gap: int = TIME_GAP,
+          flowlet_timeout: int = FLOWLET_TIMEOUT, stop_time: int = 0) -> bool:
+    """数据面发出的PFC序列与每流离线重放的结果逐个比较"""
+    cols = extract_packets(pcap_file, sport=ROCE_PORT, fields=('mac_ts', 'ip_src', 'dest_qp'))
+    ref = replay_flows(cols['mac_ts'], flow_keys(cols['ip_src'], cols['dest_qp']), time_gap, flowlet_timeout, stop_time)
+    expected = ref.quanta[ref.fire]
+    print(f"RoCE packets: {len(ref.fire)}, flows: {len(np.unique(flow_keys(cols['ip_src'], cols['dest_qp'])))}")
+    print(f"PFC expected: {len(expected)}, sent: {len(pfc_quanta)}")
+
+    n = min(len(expected), len(pfc_quanta))
+    mismatch = np.flatnonzero(expected[:n] != pfc_quanta[:n])
+    if len(mismatch):
+        i = mismatch[0]
+        trigger = np.flatnonzero(ref.fire)[i]
+        print(f"First mismatch at PFC #{i} (RoCE packet #{trigger}): "
+              f"expected {expected[i]} quanta, got {pfc_quanta[i]}")
+    ok = len(mismatch) == 0 and len(expected) == len(pfc_quanta)
+    print('OK' if ok else 'MISMATCH')
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a capture through the dataplane and check per-flow PFC decisions')
+    parser.add_argument('pcap', help='untagged capture of RoCE packets with MAC-encoded timestamps')
+    parser.add_argument('--binary', default=BINARY)
+    parser.add_argument('--duration', type=int, default=5, help='seconds to let the dataplane run')
+    parser.add_argument('--tx-pcap', help='keep the dataplane output here instead of a temporary file')
+    parser.add_argument('--time-gap', type=int, default=TIME_GAP)
+    parser.add_argument('--flowlet-timeout', type=int, default=FLOWLET_TIMEOUT)
+    parser.add_argument('--stop-time', type=int, default=0, help='fixed pause in ns, 0 pauses until the timeout')
+    args = parser.parse_args()
+
+    # 同一组参数同时传给数据面和离线重放
+    flowlet_args = ['--time-gap', str(args.time_gap), '--flowlet-timeout', str(args.flowlet_timeout),
+                    '--stop-time', str(args.stop_time)]
+    with tempfile.TemporaryDirectory() as tmp:
+        out_file = args.tx_pcap or os.path.join(tmp, 'tx.pcap')
+        print(run_dataplane(args.binary, os.path.abspath(args.pcap), out_file, args.duration, flowlet_args))
+        ok = check(args.pcap, read_pfc_quanta(out_file), args.time_gap, args.flowlet_timeout, args.stop_time)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
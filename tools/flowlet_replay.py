@@ -0,0 +1,187 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from analysis_cache import AnalysisCache
+from pcap_reader import ROCE_PORT, extract_packets
+
+# 与 include/roce_handler.h 中的默认值保持一致, 数据面可用 --flowlet-timeout 等参数修改
+QUANTA_DURATION_NS = 5.12
+FLOWLET_TIMEOUT = 5000
+TIME_GAP = 3500
+
+
+class ReplayResult(NamedTuple):
+    """逐包重放结果"""
+    gap: np.ndarray         # 与上一个RoCE包的时间差 (uint64, 与C代码一致按模2^64计算)
+    fire: np.ndarray        # 是否发送PFC
+    stop_time: np.ndarray   # 暂停时间 (ns), 未触发处为0
+    quanta: np.ndarray      # 写入PFC time[]字段的quanta数, 未触发处为0
+
+
+def pause_quanta(stop_time: np.ndarray) -> np.ndarray:
+    """(uint16_t)(stop_time / QUANTA_DURATION_NS)"""
+    return (stop_time.astype(np.float64) / QUANTA_DURATION_NS).astype(np.uint16)
+
+
+def _decide(gap: np.ndarray, time_gap: int, flowlet_timeout: int, stop_time: int = 0) -> ReplayResult:
+    fire = (gap >= np.uint64(time_gap)) & (gap <= np.uint64(flowlet_timeout))
+    # stop_time为0时暂停到flowlet超时: 1 + flowlet_timeout - gap; 数据面保证quanta不超过16位
+    pause = np.uint64(stop_time) if stop_time else np.uint64(1 + flowlet_timeout) - gap
+    stop_time = np.where(fire, pause, 0).astype(np.uint64)
+    quanta = np.where(fire, pause_quanta(stop_time), 0).astype(np.uint16)
+    return ReplayResult(gap, fire, stop_time, quanta)
+
+
+def replay(timestamps: np.ndarray, time_gap: int = TIME_GAP, flowlet_timeout: int = FLOWLET_TIMEOUT,
+           last_timestamp: int = 0) -> ReplayResult:
+    """按抓包顺序对MAC时间戳重放handle_roce_packet的判定逻辑"""
+    ts = np.asarray(timestamps).astype(np.uint64, copy=False)
+    # last_timestamp 每个包都会更新, 因此间隔与是否触发无关, 可直接差分
+    gap = np.diff(ts, prepend=np.uint64(last_timestamp))
+    return _decide(gap, time_gap, flowlet_timeout)
+
+
+def flow_keys(ip_src: np.ndarray, dest_qp: np.ndarray) -> np.ndarray:
+    """数据面流表的键 (源IP, 目的QP) 合并为一个uint64"""
+    return (ip_src.astype(np.uint64) << np.uint64(24)) | dest_qp.astype(np.uint64)
+
+
+class FlowReplay:
+    """逐块重放每流判定, 块之间延续每个流的last_timestamp; 对整段数据调用一次与replay_flows结果相同"""
+
+    def __init__(self, time_gap: int = TIME_GAP, flowlet_timeout: int = FLOWLET_TIMEOUT, stop_time: int = 0):
+        self.time_gap = time_gap
+        self.flowlet_timeout = flowlet_timeout
+        self.stop_time = stop_time
+        # 已见过的流, 按键排序
+        self.keys = np.empty(0, dtype=np.uint64)
+        self.last = np.empty(0, dtype=np.uint64)
+
+    def __call__(self, timestamps: np.ndarray, keys: np.ndarray) -> ReplayResult:
+        ts = np.asarray(timestamps).astype(np.uint64, copy=False)
+        keys = np.asarray(keys).astype(np.uint64, copy=False)
+        order = np.argsort(keys, kind='stable')
+        sorted_keys, sorted_ts = keys[order], ts[order]
+        # 组内前一个包的时间戳; 每个流在本块的第一个包与上一块留下的时间戳比较, 新流与0比较
+        same_flow = sorted_keys[1:] == sorted_keys[:-1]
+        first = np.flatnonzero(np.r_[True, ~same_flow]) if len(ts) else np.empty(0, dtype=np.int64)
+        prev = np.empty(len(ts), dtype=np.uint64)
+        prev[1:] = sorted_ts[:-1]
+        carried = np.zeros(len(first), dtype=np.uint64)
+        if len(self.keys):
+            pos = np.minimum(np.searchsorted(self.keys, sorted_keys[first]), len(self.keys) - 1)
+            hit = self.keys[pos] == sorted_keys[first]
+            carried[hit] = self.last[pos[hit]]
+        prev[first] = carried
+        gap = np.empty(len(ts), dtype=np.uint64)
+        gap[order] = sorted_ts - prev
+
+        # 每个流在本块的最后一个时间戳并入状态
+        last_idx = np.r_[first[1:] - 1, len(ts) - 1] if len(ts) else first
+        merged_keys = np.concatenate([self.keys, sorted_keys[last_idx]])
+        merged_last = np.concatenate([self.last, sorted_ts[last_idx]])
+        by_key = np.argsort(merged_keys, kind='stable')
+        merged_keys, merged_last = merged_keys[by_key], merged_last[by_key]
+        keep = np.r_[merged_keys[1:] != merged_keys[:-1], True] if len(merged_keys) else np.empty(0, dtype=bool)
+        self.keys, self.last = merged_keys[keep], merged_last[keep]
+        return _decide(gap, self.time_gap, self.flowlet_timeout, self.stop_time)
+
+
+def replay_flows(timestamps: np.ndarray, keys: np.ndarray, time_gap: int = TIME_GAP,
+                 flowlet_timeout: int = FLOWLET_TIMEOUT, stop_time: int = 0) -> ReplayResult:
+    """每流独立的last_timestamp (新流为0) 下重放判定, 与数据面流表一致; 结果按抓包顺序返回"""
+    return FlowReplay(time_gap, flowlet_timeout, stop_time)(timestamps, keys)
+
+
+def summarize(result: ReplayResult) -> Dict[str, float]:
+    """一次重放的汇总: PFC数量、比例和总暂停时长"""
+    packets = len(result.fire)
+    pfc_count = int(np.count_nonzero(result.fire))
+    total_quanta = int(result.quanta.sum(dtype=np.uint64))
+    return {
+        'packets': packets,
+        'pfc_count': pfc_count,
+        'pfc_ratio': pfc_count / packets if packets else 0.0,
+        'total_quanta': total_quanta,
+        'total_pause_ns': total_quanta * QUANTA_DURATION_NS,
+    }
+
+
+def _sweep_timeout(gap_counts: np.ndarray, flowlet_timeout: int, time_gaps: np.ndarray):
+    """固定FLOWLET_TIMEOUT, 利用间隔直方图的前缀和一次求出所有TIME_GAP的结果"""
+    g = np.arange(flowlet_timeout + 1, dtype=np.uint64)
+    counts = gap_counts[:flowlet_timeout + 1]
+    quanta = pause_quanta(np.uint64(1 + flowlet_timeout) - g).astype(np.int64)
+    # 从右向左的后缀和: 区间 [time_gap, flowlet_timeout] 内的累计
+    count_suffix = np.cumsum(counts[::-1])[::-1]
+    quanta_suffix = np.cumsum((counts * quanta)[::-1])[::-1]
+    tg = np.asarray(time_gaps, dtype=np.int64)
+    valid = tg <= flowlet_timeout
+    idx = np.clip(tg, 0, flowlet_timeout)
+    pfc_count = np.where(valid, count_suffix[idx], 0)
+    total_quanta = np.where(valid, quanta_suffix[idx], 0)
+    return pfc_count, total_quanta
+
+
+def sweep(timestamps: np.ndarray, time_gaps: Sequence[int], flowlet_timeouts: Sequence[int],
+          workers: Optional[int] = None, last_timestamp: int = 0) -> Dict[str, np.ndarray]:
+    """并行评估 (TIME_GAP, FLOWLET_TIMEOUT) 参数网格; 结果数组形状为 (len(time_gaps), len(flowlet_timeouts))"""
+    time_gaps = np.asarray(time_gaps, dtype=np.int64)
+    flowlet_timeouts = np.asarray(flowlet_timeouts, dtype=np.int64)
+    gap = replay(timestamps, 0, 0, last_timestamp).gap
+    max_ft = int(flowlet_timeouts.max())
+    # 只有不超过最大超时的间隔可能触发PFC
+    gap_counts = np.bincount(gap[gap <= np.uint64(max_ft)].astype(np.int64), minlength=max_ft + 1)
+
+    pfc_count = np.zeros((len(time_gaps), len(flowlet_timeouts)), dtype=np.int64)
+    total_quanta = np.zeros_like(pfc_count)
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = [pool.submit(_sweep_timeout, gap_counts, int(ft), time_gaps) for ft in flowlet_timeouts]
+        for j, future in enumerate(futures):
+            pfc_count[:, j], total_quanta[:, j] = future.result()
+
+    packets = len(gap)
+    return {
+        'time_gap': time_gaps,
+        'flowlet_timeout': flowlet_timeouts,
+        'packets': np.int64(packets),
+        'pfc_count': pfc_count,
+        'pfc_ratio': pfc_count / packets if packets else pfc_count.astype(np.float64),
+        'total_quanta': total_quanta,
+        'total_pause_ns': total_quanta * QUANTA_DURATION_NS,
+    }
+
+
+def load_roce_timestamps(pcap_file: str, cache: Optional[AnalysisCache] = None) -> np.ndarray:
+    """按抓包顺序提取数据面会处理的RoCE包(UDP源端口4791)的原始48位MAC时间戳"""
+    cache = cache or AnalysisCache()
+    # 数据面按到达顺序处理, 直接对48位原始值做uint64减法, 因此这里既不做乱序归位也不展开回绕:
+    # 回绕处的间隔与C代码一样变成很大的值, 该包不会触发PFC
+    return cache.get_or_compute(pcap_file, 'roce_ts',
+                                lambda: extract_packets(pcap_file, sport=ROCE_PORT, fields=('mac_ts',))['mac_ts'],
+                                sport=ROCE_PORT, raw_mac_ts=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline flowlet/PFC replay of handle_roce_packet')
+    parser.add_argument('pcap', help='capture containing RoCE packets with MAC-encoded timestamps')
+    parser.add_argument('--time-gap', type=int, nargs='+', default=[TIME_GAP])
+    parser.add_argument('--flowlet-timeout', type=int, nargs='+', default=[FLOWLET_TIMEOUT])
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    timestamps = load_roce_timestamps(args.pcap)
+    result = sweep(timestamps, args.time_gap, args.flowlet_timeout, args.workers)
+    print(f"{'TIME_GAP':>10} {'TIMEOUT':>10} {'PFC':>12} {'ratio':>10} {'pause(us)':>12}")
+    for i, tg in enumerate(result['time_gap']):
+        for j, ft in enumerate(result['flowlet_timeout']):
+            print(f"{tg:>10} {ft:>10} {result['pfc_count'][i, j]:>12} "
+                  f"{result['pfc_ratio'][i, j]:>10.4f} {result['total_pause_ns'][i, j] / 1000:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
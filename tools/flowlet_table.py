@@ -0,0 +1,187 @@
+import argparse
+import glob
+import os
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from analysis_cache import AnalysisCache
+from flowlet_replay import FLOWLET_TIMEOUT
+from pcap_reader import MacTimestampUnwrapper, ROCE_PORT
+from perftest_log import LOG_NAME_RE
+from qp_analysis import QPAnalyzer, group_start_mask, qp_gaps
+
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99)
+TABLE_COLUMNS = ('key', 'start', 'end', 'packets', 'bytes', 'start_ts', 'duration', 'gap_before')
+
+
+def segment(ts: np.ndarray, timeout: int, sizes: Optional[np.ndarray] = None,
+            keys: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """按超时把时间戳流切分为flowlet, 返回每个flowlet一行的表
+
+    keys给出时每个键 (如目的QP) 独立切分. start/end为首尾包在输入中的下标,
+    gap_before为与同一流上一个flowlet末包的间隔, 流的第一个flowlet记为-1.
+    结果按 (key, start_ts) 排序.
+    """
+    ts = np.asarray(ts).astype(np.int64)
+    n = len(ts)
+    sizes = np.zeros(n, dtype=np.int64) if sizes is None else np.asarray(sizes).astype(np.int64)
+    keys = np.zeros(n, dtype=np.int64) if keys is None else np.asarray(keys).astype(np.int64)
+    if n == 0:
+        return {name: np.empty(0, dtype=np.int64) for name in TABLE_COLUMNS}
+    # 按键稳定排序, 组内保持输入顺序
+    order = np.argsort(keys, kind='stable')
+    ts, sizes, keys = ts[order], sizes[order], keys[order]
+    group_start = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    gaps = qp_gaps(ts, group_start)
+    starts = np.flatnonzero(group_start_mask(n, group_start) | (gaps > timeout))
+    ends = np.r_[starts[1:], n] - 1
+    return {
+        'key': keys[starts],
+        'start': order[starts],
+        'end': order[ends],
+        'packets': np.diff(np.r_[starts, n]),
+        'bytes': np.add.reduceat(sizes, starts),
+        'start_ts': ts[starts],
+        'duration': ts[ends] - ts[starts],
+        'gap_before': gaps[starts],
+    }
+
+
+def coarsen(table: Dict[str, np.ndarray], timeout: int) -> Dict[str, np.ndarray]:
+    """由较小超时的表直接得到较大超时的表, 无需回到逐包数据
+
+    超时增大只会去掉边界: 前一间隔不超过新超时的flowlet并入前一个, 因此只需对表本身做reduceat.
+    """
+    gap = table['gap_before']
+    starts = np.flatnonzero((gap < 0) | (gap > timeout))
+    if len(starts) == len(gap):
+        return dict(table)
+    ends = np.r_[starts[1:], len(gap)] - 1
+    return {
+        'key': table['key'][starts],
+        'start': table['start'][starts],
+        'end': table['end'][ends],
+        'packets': np.add.reduceat(table['packets'], starts),
+        'bytes': np.add.reduceat(table['bytes'], starts),
+        'start_ts': table['start_ts'][starts],
+        'duration': table['start_ts'][ends] + table['duration'][ends] - table['start_ts'][starts],
+        'gap_before': gap[starts],
+    }
+
+
+def size_cdf(values: np.ndarray, points: np.ndarray, weighting: str = 'flowlet') -> np.ndarray:
+    """取值不超过各点的比例; weighting为'byte'时按flowlet自身大小加权"""
+    v = np.sort(np.asarray(values, dtype=np.float64))
+    if len(v) == 0:
+        return np.zeros(len(points))
+    idx = np.searchsorted(v, np.asarray(points, dtype=np.float64), side='right')
+    if weighting == 'byte':
+        cum = np.r_[0.0, np.cumsum(v)]
+        return cum[idx] / cum[-1] if cum[-1] else np.zeros(len(idx))
+    return idx / len(v)
+
+
+def timeout_sweep(table: Dict[str, np.ndarray], timeouts: Sequence[int], points: Sequence[float],
+                  field: str = 'packets', weighting: str = 'flowlet',
+                  quantiles: Sequence[float] = DEFAULT_QUANTILES) -> Dict[str, np.ndarray]:
+    """在一张表上评估多个超时下flowlet大小的CDF; 超时不得小于建表时的超时"""
+    timeouts = np.sort(np.asarray(timeouts, dtype=np.int64))
+    points = np.asarray(points, dtype=np.float64)
+    cdf = np.zeros((len(timeouts), len(points)))
+    count = np.zeros(len(timeouts), dtype=np.int64)
+    mean = np.zeros(len(timeouts))
+    q = np.zeros((len(timeouts), len(quantiles)))
+    # 超时递增时逐级合并, 每一级只处理上一级的表
+    current = table
+    for i, timeout in enumerate(timeouts):
+        current = coarsen(current, int(timeout))
+        values = current[field]
+        count[i] = len(values)
+        cdf[i] = size_cdf(values, points, weighting)
+        if len(values):
+            mean[i] = values.mean()
+            q[i] = np.quantile(values, quantiles)
+    return {'timeout': timeouts, 'points': points, 'cdf': cdf, 'count': count, 'mean': mean,
+            'quantiles': np.asarray(quantiles, dtype=np.float64), 'quantile_values': q}
+
+
+def log_timeouts(root: str) -> np.ndarray:
+    """目录树下 prototype_ft_*_thre_*.log 中出现过的正的flowlet超时"""
+    values = set()
+    for path in glob.glob(os.path.join(root, '**', 'prototype_ft_*_thre_*.log'), recursive=True):
+        m = LOG_NAME_RE.search(os.path.basename(path))
+        if m and int(m['ft']) > 0:
+            values.add(int(m['ft']))
+    return np.array(sorted(values), dtype=np.int64)
+
+
+class FlowletTable:
+    """抓包中RoCE流的flowlet表, 按QP或整体切分, 随抓包指纹缓存"""
+
+    def __init__(self, file_name: str, source_ip: Optional[str] = '10.10.10.2', source_port=ROCE_PORT,
+                 per_qp: bool = True, workers: int = 1, cache: Optional[AnalysisCache] = None):
+        self.file_name = file_name
+        self.per_qp = per_qp
+        self.cache = cache or AnalysisCache()
+        self.qp = QPAnalyzer(file_name, source_ip, source_port, workers=workers, cache=self.cache)
+        self.cache_params = dict(self.qp.cache_params, per_qp=per_qp)
+
+    def table(self, timeout: int = FLOWLET_TIMEOUT) -> Dict[str, np.ndarray]:
+        def compute():
+            packets = self.qp.load_packets()
+            # 按抓包顺序展开48位回绕后再分组
+            ts = MacTimestampUnwrapper()(packets['mac_ts']).astype(np.int64)
+            keys = packets['dest_qp'] if self.per_qp else None
+            return segment(ts, timeout, packets['frame_len'], keys)
+        return self.cache.get_or_compute(self.file_name, 'flowlet_table', compute,
+                                         flowlet_timeout=int(timeout), **self.cache_params)
+
+    def sweep(self, timeouts: Sequence[int], points: Sequence[float], **kwargs) -> Dict[str, np.ndarray]:
+        """以最小超时建表一次, 其余超时由表合并得到"""
+        return timeout_sweep(self.table(int(min(timeouts))), timeouts, points, **kwargs)
+
+
+def print_sweep(result: Dict[str, np.ndarray], field: str, weighting: str):
+    print(f"{'timeout':>10} {'flowlets':>10} {'mean':>12} " +
+          ' '.join(f"{'p' + format(q * 100, 'g'):>10}" for q in result['quantiles']))
+    for i, timeout in enumerate(result['timeout']):
+        print(f"{timeout:>10} {result['count'][i]:>10} {result['mean'][i]:>12.1f} " +
+              ' '.join(f"{v:>10.0f}" for v in result['quantile_values'][i]))
+    print(f"\nCDF of flowlet {field} ({weighting}-weighted)")
+    print(f"{'timeout':>10} " + ' '.join(f"{p:>10.0f}" for p in result['points']))
+    for i, timeout in enumerate(result['timeout']):
+        print(f"{timeout:>10} " + ' '.join(f"{v:>10.3f}" for v in result['cdf'][i]))
+
+
+def default_points(values: np.ndarray) -> np.ndarray:
+    """CDF的查询点: 取值的九分位点"""
+    return np.unique(np.quantile(values, np.linspace(0, 1, 9))) if len(values) else np.zeros(0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Split RoCE flows into flowlets and compare size CDFs across timeouts')
+    parser.add_argument('pcap')
+    parser.add_argument('--source-ip', default='10.10.10.2')
+    parser.add_argument('--timeout', type=int, nargs='+', default=[FLOWLET_TIMEOUT], help='flowlet timeouts (ns)')
+    parser.add_argument('--logs', help='also sweep every ft value found in prototype_ft_*_thre_*.log under this directory')
+    parser.add_argument('--field', choices=('packets', 'bytes', 'duration'), default='bytes')
+    parser.add_argument('--weighting', choices=('flowlet', 'byte'), default='flowlet')
+    parser.add_argument('--whole', action='store_true', help='segment the whole stream instead of each QP')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--output', help='save the flowlet table at the smallest timeout to this .npz file')
+    args = parser.parse_args()
+
+    timeouts = np.array(args.timeout, dtype=np.int64)
+    if args.logs:
+        timeouts = np.union1d(timeouts, log_timeouts(args.logs))
+    flowlets = FlowletTable(args.pcap, args.source_ip, per_qp=not args.whole, workers=args.workers)
+    table = flowlets.table(int(timeouts.min()))
+    result = timeout_sweep(table, timeouts, default_points(table[args.field]), args.field, args.weighting)
+    print_sweep(result, args.field, args.weighting)
+    if args.output:
+        np.savez(args.output, **table)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from pcap_reader import (DEFAULT_CHUNK_BYTES, DEFAULT_REORDER_WINDOW, LINKTYPE_ETHERNET, MAC_TS_BITS,
+                         MAC_TS_HALF, PcapFile, ReorderWindow, iter_mac_timestamps)
+
+# 对数-线性直方图 (HDR风格): 小于 2^SUB_BITS 的间隔精确计数,
+# 其上每个2的幂区间再等分为 2^(SUB_BITS-1) 个桶, 相对误差不超过 2^-(SUB_BITS-1)
+SUB_BITS = 10
+HALF_BUCKETS = 1 << (SUB_BITS - 1)
+# 交换机时间戳为48位, 间隔不会超过该范围
+MAX_BITS = MAC_TS_BITS
+MAX_VALUE = (1 << MAX_BITS) - 1
+DEFAULT_QUANTILES = (0.5, 0.99, 0.999)
+
+
+def bucket_index(values: np.ndarray) -> np.ndarray:
+    """非负整数间隔 -> 桶下标"""
+    v = np.minimum(np.asarray(values, dtype=np.int64), MAX_VALUE)
+    # 48位以内的整数可由float64精确表示, frexp的指数即二进制位数
+    bits = np.frexp(v.astype(np.float64))[1].astype(np.int64)
+    shift = np.maximum(bits - SUB_BITS, 0)
+    return (shift << (SUB_BITS - 1)) + (v >> shift)
+
+
+NUM_BUCKETS = int(bucket_index(np.array([MAX_VALUE]))[0]) + 1
+
+
+def bucket_bounds(idx: np.ndarray):
+    """桶下标 -> (下界, 宽度), 桶覆盖 [下界, 下界+宽度)"""
+    idx = np.asarray(idx, dtype=np.int64)
+    shift = np.maximum((idx >> (SUB_BITS - 1)) - 1, 0)
+    return (idx - (shift << (SUB_BITS - 1))) << shift, np.int64(1) << shift
+
+
+class GapStats:
+    """包间隔的常数内存统计: 精确的计数/均值/方差/极值, 加对数-线性直方图
+
+    分位数和任意截断窗口都由直方图给出, 无需重新扫描.
+    exact_below > 0 时另对小于它的间隔按值精确计数, 截断窗口内的直方图和极值可精确给出.
+    不同块、文件或进程的结果可用merge()合并; 时间上相邻的片段用extend()拼接,
+    会补上两段之间的那个间隔.
+    """
+
+    def __init__(self, exact_below: int = 0):
+        self.counts = np.zeros(NUM_BUCKETS, dtype=np.int64)
+        self.exact_below = exact_below
+        self.exact = np.zeros(exact_below, dtype=np.int64)
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        # 已消费时间戳序列的首尾, 用于跨块/跨段计算边界间隔
+        self.first_ts = None
+        self.last_ts = None
+        # 时间戳倒退或超出乱序窗口而被丢弃的样本数 (不计入统计)
+        self.reordered = 0
+        # 在乱序窗口内被归位的样本数
+        self.out_of_order = 0
+
+    def update(self, gaps: np.ndarray) -> 'GapStats':
+        """加入一批非负整数间隔 (ns)"""
+        gaps = np.asarray(gaps, dtype=np.int64)
+        n = len(gaps)
+        if n == 0:
+            return self
+        self.counts += np.bincount(bucket_index(gaps), minlength=NUM_BUCKETS)
+        if self.exact_below:
+            self.exact += np.bincount(gaps[gaps < self.exact_below], minlength=self.exact_below)
+        x = gaps.astype(np.float64)
+        mean = x.mean()
+        self._combine(n, mean, float(((x - mean) ** 2).sum()), int(gaps.min()), int(gaps.max()))
+        return self
+
+    def update_timestamps(self, ts: np.ndarray) -> 'GapStats':
+        """加入按时间顺序的一块时间戳, 与上一块的最后一个时间戳衔接"""
+        ts = np.asarray(ts, dtype=np.int64)
+        if len(ts) == 0:
+            return self
+        if self.last_ts is None:
+            self.first_ts = int(ts[0])
+            diff = np.diff(ts)
+        else:
+            diff = np.diff(ts, prepend=self.last_ts)
+        self.last_ts = int(ts[-1])
+        late = diff < 0
+        if late.any():
+            self.reordered += int(late.sum())
+            diff = diff[~late]
+        return self.update(diff)
+
+    def _combine(self, n: int, mean: float, m2: float, lo: int, hi: int):
+        # Chan等人的并行方差合并公式
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.count * n / total
+        self.count = total
+        self.min = lo if self.min is None else min(self.min, lo)
+        self.max = hi if self.max is None else max(self.max, hi)
+
+    def merge(self, other: 'GapStats') -> 'GapStats':
+        """合并相互独立的另一份统计 (不同文件/流)"""
+        if other.exact_below != self.exact_below:
+            raise ValueError(f"Cannot merge gap statistics with exact_below {self.exact_below} and {other.exact_below}")
+        self.counts += other.counts
+        self.exact += other.exact
+        self.reordered += other.reordered
+        self.out_of_order += other.out_of_order
+        if other.count:
+            self._combine(other.count, other.mean, other.m2, other.min, other.max)
+        if self.first_ts is None:
+            self.first_ts = other.first_ts
+        if other.last_ts is not None:
+            self.last_ts = other.last_ts if self.last_ts is None else max(self.last_ts, other.last_ts)
+        return self
+
+    def extend(self, other: 'GapStats') -> 'GapStats':
+        """拼接时间上紧随其后的片段, 补上两段衔接处的间隔"""
+        if self.last_ts is not None and other.first_ts is not None:
+            gap = other.first_ts - self.last_ts
+            if gap < 0:
+                self.reordered += 1
+            else:
+                self.update(np.array([gap]))
+        last_ts = other.last_ts if other.last_ts is not None else self.last_ts
+        self.merge(other)
+        self.last_ts = last_ts
+        return self
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / self.count if self.count else 0.0
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self.variance))
+
+    def quantile(self, q):
+        """直方图估计的分位数 (与np.quantile的inverted_cdf定义一致); 精确区间内无误差"""
+        qs = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        if self.count == 0:
+            out = np.full(len(qs), np.nan)
+            return out if np.ndim(q) else float(out[0])
+        cum = np.cumsum(self.counts)
+        rank = np.clip(np.ceil(qs * self.count), 1, self.count).astype(np.int64)
+        idx = np.searchsorted(cum, rank)
+        lower, width = bucket_bounds(idx)
+        # 在桶内按秩线性插值, 宽度为1的桶直接取下界
+        before = cum[idx] - self.counts[idx]
+        frac = (rank - before - 0.5) / self.counts[idx]
+        out = np.where(width > 1, lower + width * frac, lower).astype(np.float64)
+        out = np.clip(out, self.min, self.max)
+        return out if np.ndim(q) else float(out[0])
+
+    def count_below(self, x) -> np.ndarray:
+        """间隔 < x 的估计个数; 落在桶内部的截断点按均匀分布插值"""
+        x = np.ceil(np.atleast_1d(np.asarray(x, dtype=np.float64)))
+        cum = np.concatenate([[0], np.cumsum(self.counts)])
+        inside = np.clip(x, 0, MAX_VALUE + 1).astype(np.int64)
+        idx = np.minimum(bucket_index(inside), NUM_BUCKETS - 1)
+        lower, width = bucket_bounds(idx)
+        part = self.counts[idx] * np.clip((inside - lower) / width, 0, 1)
+        return np.where(x > MAX_VALUE, cum[-1], cum[idx] + part)
+
+    def count_between(self, lo=None, hi=None) -> float:
+        """lo <= 间隔 < hi 的估计个数, 用于事后套用任意截断窗口"""
+        upper = self.count_below(hi)[0] if hi is not None else self.count
+        lower = self.count_below(lo)[0] if lo is not None else 0
+        return float(upper - lower)
+
+    def histogram(self, edges) -> np.ndarray:
+        """按给定分桶边界重新分桶, 每个桶为 [edges[i], edges[i+1])"""
+        return np.diff(self.count_below(edges))
+
+    def exact_values(self):
+        """小于exact_below的间隔: (出现过的值, 各值的个数), 按值升序"""
+        values = np.flatnonzero(self.exact)
+        return values, self.exact[values]
+
+    def exact_histogram(self, bins=10):
+        """小于exact_below的间隔的精确直方图, 分桶与np.histogram相同 (默认范围为这些间隔的最小到最大值)"""
+        values, counts = self.exact_values()
+        hist, edges = np.histogram(values, bins=bins, weights=counts)
+        return hist.astype(np.int64), edges
+
+    def summary(self, quantiles: Sequence[float] = DEFAULT_QUANTILES) -> Dict[str, float]:
+        stats = {'count': self.count, 'mean': self.mean, 'std': self.std,
+                 'min': self.min, 'max': self.max, 'reordered': self.reordered,
+                 'out_of_order': self.out_of_order}
+        for q, v in zip(quantiles, self.quantile(np.asarray(quantiles))):
+            stats[f'p{q * 100:g}'] = float(v)
+        return stats
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """序列化为数组字典, 可直接存入AnalysisCache"""
+        nonzero = np.flatnonzero(self.counts)
+        none = -1
+        exact = {}
+        if self.exact_below:
+            values, counts = self.exact_values()
+            exact = {'exact_below': np.array([self.exact_below], dtype=np.int64),
+                     'exact_values': values, 'exact_counts': counts}
+        return {
+            **exact,
+            'buckets': nonzero, 'counts': self.counts[nonzero],
+            'moments': np.array([self.mean, self.m2]),
+            'scalars': np.array([self.count, self.reordered, self.out_of_order,
+                                 none if self.min is None else self.min,
+                                 none if self.max is None else self.max,
+                                 none if self.first_ts is None else self.first_ts,
+                                 none if self.last_ts is None else self.last_ts], dtype=np.int64),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> 'GapStats':
+        stats = cls(int(arrays['exact_below'][0]) if 'exact_below' in arrays else 0)
+        if stats.exact_below:
+            stats.exact[arrays['exact_values']] = arrays['exact_counts']
+        stats.counts[arrays['buckets']] = arrays['counts']
+        stats.mean, stats.m2 = (float(v) for v in arrays['moments'])
+        count, reordered, out_of_order, lo, hi, first_ts, last_ts = (int(v) for v in arrays['scalars'])
+        stats.count, stats.reordered, stats.out_of_order = count, reordered, out_of_order
+        stats.min, stats.max = (None if v < 0 else v for v in (lo, hi))
+        stats.first_ts, stats.last_ts = (None if v < 0 else v for v in (first_ts, last_ts))
+        return stats
+
+    @classmethod
+    def from_timestamps(cls, ts: np.ndarray, chunk: int = 1 << 20) -> 'GapStats':
+        """对已在内存中的时间戳逐块统计, 不生成完整的差分数组"""
+        stats = cls()
+        for i in range(0, len(ts), chunk):
+            stats.update_timestamps(ts[i:i + chunk])
+        return stats
+
+
+def _scan_range(file_name: str, src_ip: Optional[str], sport: Optional[int], reorder_window: int,
+                exact_below: int = 0, start: Optional[int] = None, stop: Optional[int] = None) -> GapStats:
+    stats = GapStats(exact_below)
+    reorder = ReorderWindow(reorder_window)
+    for ts in iter_mac_timestamps(file_name, src_ip, sport, reorder, start, stop):
+        stats.update_timestamps(ts)
+    stats.reordered += reorder.dropped
+    stats.out_of_order += reorder.out_of_order
+    return stats
+
+
+def scan_gap_stats(file_name: str, src_ip: Optional[str] = None, sport: Optional[int] = None,
+                   reorder_window: int = DEFAULT_REORDER_WINDOW, workers: int = 1,
+                   chunk_bytes: int = DEFAULT_CHUNK_BYTES, exact_below: int = 0) -> GapStats:
+    """流式统计一个抓包中匹配包的时间间隔; workers > 1 时按记录边界分段并行后拼接"""
+    if workers <= 1:
+        return _scan_range(file_name, src_ip, sport, reorder_window, exact_below)
+    with PcapFile(file_name) as pcap:
+        if pcap.format != 'pcap' or pcap.linktype != LINKTYPE_ETHERNET:
+            return _scan_range(file_name, src_ip, sport, reorder_window, exact_below)
+        chunk_bytes = max(1 << 20, min(chunk_bytes, pcap.file_size // (workers * 4) + 1))
+        bounds = pcap.split(chunk_bytes)
+
+    stats = GapStats(exact_below)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # 各段结果按文件顺序拼接, 段内乱序由乱序窗口吸收
+        for part in pool.map(_scan_range, *zip(*[(file_name, src_ip, sport, reorder_window, exact_below,
+                                                   bounds[i], bounds[i + 1])
+                                                  for i in range(len(bounds) - 1)])):
+            if stats.last_ts is not None and part.first_ts is not None:
+                # 各段独立展开回绕, 把后一段平移整数个回绕周期, 使衔接处的间隔落在有符号48位范围内
+                shift = ((stats.last_ts - part.first_ts + MAC_TS_HALF) >> MAC_TS_BITS) << MAC_TS_BITS
+                part.first_ts += shift
+                part.last_ts += shift
+            stats.extend(part)
+    return stats
@@ -0,0 +1,248 @@
+import argparse
+import logging
+import os
+import struct
+from typing import Optional
+
+import numpy as np
+
+from pcap_reader import (BTH_LEN, ETH_HLEN, ETHERTYPE_IPV4, ETHERTYPE_MAC_CONTROL, IPPROTO_UDP, MAC_TS_MASK,
+                         PCAP_MAGIC_NSEC, PCAP_RECORD_HDR_LEN, PFC_OPCODE, PFC_PRIORITIES, ROCE_PORT, UDP_HLEN,
+                         LINKTYPE_ETHERNET, extract_mac_timestamps, ip_to_int)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+SRC_IP = '10.10.10.2'
+DST_IP = '10.10.10.1'
+IPV4_HLEN = 20
+ICRC_LEN = 4
+# 抓包中只保留到ICRC为止的头部, 负载只体现在原始帧长里
+ROCE_CAPLEN = ETH_HLEN + IPV4_HLEN + UDP_HLEN + BTH_LEN + ICRC_LEN
+# PFC帧补齐到以太网最短帧 (不含FCS)
+PFC_CAPLEN = 60
+BTH_OPCODE_SEND_ONLY = 0x04
+PSN_MASK = (1 << 24) - 1
+PFC_DST_MAC = bytes.fromhex('0180c2000001')
+SWITCH_MAC = bytes.fromhex('020000000001')
+DST_MAC = bytes.fromhex('020000000002')
+# 生成时每块的包数
+BLOCK_PACKETS = 1 << 20
+GAP_MODES = ('constant', 'bursty', 'trace')
+
+
+def ipv4_checksum(header: bytes) -> int:
+    total = sum(struct.unpack(f'>{len(header) // 2}H', header))
+    while total >> 16:
+        total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
+
+
+def roce_template(payload: int, src_ip: str = SRC_IP, dst_ip: str = DST_IP) -> bytes:
+    """RoCEv2 帧头模板: 源MAC (时间戳)、目的QP和PSN之后逐包填入"""
+    eth = DST_MAC + b'\0' * 6 + struct.pack('>H', ETHERTYPE_IPV4)
+    ip_len = IPV4_HLEN + UDP_HLEN + BTH_LEN + payload + ICRC_LEN
+    ip = struct.pack('>BBHHHBBH4s4s', 0x45, 0, ip_len, 0, 0x4000, 64, IPPROTO_UDP, 0,
+                     ip_to_int(src_ip).to_bytes(4, 'big'), ip_to_int(dst_ip).to_bytes(4, 'big'))
+    ip = ip[:10] + struct.pack('>H', ipv4_checksum(ip)) + ip[12:]
+    # RoCEv2 的UDP校验和置0
+    udp = struct.pack('>HHHH', ROCE_PORT, ROCE_PORT, ip_len - IPV4_HLEN, 0)
+    bth = struct.pack('>BBHII', BTH_OPCODE_SEND_ONLY, 0, 0xFFFF, 0, 0)
+    return eth + ip + udp + bth + b'\0' * ICRC_LEN
+
+
+def pfc_template(pev: int, quanta: int) -> bytes:
+    """交换机发出的PFC帧: 使能的优先级使用相同的quanta"""
+    times = [quanta if (pev >> p) & 1 else 0 for p in range(PFC_PRIORITIES)]
+    frame = PFC_DST_MAC + SWITCH_MAC + struct.pack('>HHH', ETHERTYPE_MAC_CONTROL, PFC_OPCODE, pev) + \
+        struct.pack(f'>{PFC_PRIORITIES}H', *times)
+    return frame.ljust(PFC_CAPLEN, b'\0')
+
+
+class GapSource:
+    """按块产出包间隔 (ns)
+
+    constant: 固定间隔; bursty: 突发内间隔固定, 突发长度服从几何分布,
+    突发之间插入指数分布的空闲; trace: 循环回放给定的间隔序列.
+    """
+
+    def __init__(self, mode: str = 'constant', gap: int = 1000, burst: float = 32, idle: int = 20000,
+                 trace: Optional[np.ndarray] = None, seed: int = 0):
+        if mode not in GAP_MODES:
+            raise ValueError(f"Unknown gap mode: {mode}")
+        if mode == 'trace' and (trace is None or len(trace) == 0):
+            raise ValueError("trace mode needs a non-empty gap sequence")
+        self.mode = mode
+        self.gap = gap
+        self.burst = burst
+        self.idle = idle
+        self.trace = None if trace is None else np.asarray(trace, dtype=np.int64)
+        self.rng = np.random.default_rng(seed)
+        self.pos = 0
+
+    def __call__(self, n: int) -> np.ndarray:
+        if self.mode == 'constant':
+            return np.full(n, self.gap, dtype=np.int64)
+        if self.mode == 'bursty':
+            starts = self.rng.random(n) < 1.0 / self.burst
+            idle = self.rng.exponential(self.idle, n).astype(np.int64)
+            return np.where(starts, self.gap + idle, self.gap)
+        idx = (self.pos + np.arange(n)) % len(self.trace)
+        self.pos = int(idx[-1]) + 1 if n else self.pos
+        return self.trace[idx]
+
+
+def load_trace(path: str, src_ip: Optional[str] = None) -> np.ndarray:
+    """间隔序列: .npy/.txt 直接给出间隔 (ns), 抓包文件则取其MAC时间戳的差分"""
+    if path.endswith('.npy'):
+        gaps = np.load(path)
+    elif path.endswith('.txt'):
+        gaps = np.loadtxt(path, dtype=np.int64, ndmin=1)
+    else:
+        gaps = np.diff(extract_mac_timestamps(path, src_ip=src_ip).astype(np.int64))
+    return np.asarray(gaps, dtype=np.int64)[np.asarray(gaps) >= 0]
+
+
+def _records(template: bytes, n: int) -> np.ndarray:
+    """n条相同模板的记录 (记录头 + 帧), 字段由调用者填入"""
+    rec = np.zeros((n, PCAP_RECORD_HDR_LEN + len(template)), dtype=np.uint8)
+    rec[:, PCAP_RECORD_HDR_LEN:] = np.frombuffer(template, dtype=np.uint8)
+    return rec
+
+
+def _put_be(rec: np.ndarray, pos: int, width: int, values: np.ndarray):
+    values = np.asarray(values, dtype=np.uint64)
+    for i in range(width):
+        rec[:, pos + i] = (values >> np.uint64(8 * (width - 1 - i))) & np.uint64(0xFF)
+
+
+def _put_header(rec: np.ndarray, ts_ns: np.ndarray, caplen: int, wirelen: int):
+    hdr = rec[:, :PCAP_RECORD_HDR_LEN].view('<u4')
+    hdr[:, 0] = ts_ns // 1_000_000_000
+    hdr[:, 1] = ts_ns % 1_000_000_000
+    hdr[:, 2] = caplen
+    hdr[:, 3] = wirelen
+
+
+class RoceCaptureWriter:
+    """逐块生成RoCEv2抓包: 源MAC编码48位交换机时间戳, 与 handle_roce_packet 的解析一致"""
+
+    def __init__(self, gaps: GapSource, qps: int = 1, payload: int = 1024, pfc_ratio: float = 0.0,
+                 pfc_pev: int = 1 << 3, pfc_quanta: int = 1000, start_ns: int = 1_700_000_000 * 10**9,
+                 mac_start: int = 0, seed: int = 0):
+        self.gaps = gaps
+        self.qps = qps
+        self.payload = payload
+        self.pfc_ratio = pfc_ratio
+        self.rng = np.random.default_rng(seed + 1)
+        self.roce = roce_template(payload)
+        self.pfc = pfc_template(pfc_pev, pfc_quanta)
+        self.t = 0
+        self.start_ns = start_ns
+        self.mac_start = mac_start
+        self.psn = np.zeros(qps, dtype=np.int64)
+        self.roce_packets = 0
+        self.pfc_frames = 0
+
+    def block(self, n: int) -> bytes:
+        """按抓包顺序生成n条记录 (含PFC帧) 的字节"""
+        t = self.t + np.cumsum(self.gaps(n))
+        self.t = int(t[-1])
+        is_pfc = self.rng.random(n) < self.pfc_ratio if self.pfc_ratio else np.zeros(n, dtype=bool)
+        roce_t = t[~is_pfc]
+        m = len(roce_t)
+
+        # 随机分配QP, 每个QP的PSN按包序递增 (模2^24)
+        qp = self.rng.integers(0, self.qps, m) if self.qps > 1 else np.zeros(m, dtype=np.int64)
+        order = np.argsort(qp, kind='stable')
+        counts = np.bincount(qp, minlength=self.qps)
+        rank = np.empty(m, dtype=np.int64)
+        rank[order] = np.arange(m) - np.repeat(np.cumsum(counts) - counts, counts)
+        psn = (self.psn[qp] + rank) & PSN_MASK
+        self.psn += counts
+
+        roce = _records(self.roce, m)
+        wirelen = len(self.roce) + self.payload
+        _put_header(roce, self.start_ns + roce_t, ROCE_CAPLEN, wirelen)
+        base = PCAP_RECORD_HDR_LEN
+        _put_be(roce, base + 6, 6, (self.mac_start + roce_t) & MAC_TS_MASK)
+        bth = base + ETH_HLEN + IPV4_HLEN + UDP_HLEN
+        _put_be(roce, bth + 5, 3, qp + 1)
+        _put_be(roce, bth + 9, 3, psn)
+
+        pfc_t = t[is_pfc]
+        pfc = _records(self.pfc, len(pfc_t))
+        _put_header(pfc, self.start_ns + pfc_t, PFC_CAPLEN, PFC_CAPLEN)
+
+        self.roce_packets += m
+        self.pfc_frames += len(pfc_t)
+        if not len(pfc_t):
+            return roce.tobytes()
+        # 按时间交错写出两类记录
+        sizes = np.where(is_pfc, pfc.shape[1], roce.shape[1])
+        offsets = np.cumsum(sizes) - sizes
+        out = np.empty(int(sizes.sum()), dtype=np.uint8)
+        out[(offsets[~is_pfc][:, None] + np.arange(roce.shape[1])).ravel()] = roce.ravel()
+        out[(offsets[is_pfc][:, None] + np.arange(pfc.shape[1])).ravel()] = pfc.ravel()
+        return out.tobytes()
+
+    def write(self, path: str, packets: int, block_packets: int = BLOCK_PACKETS, log_file: Optional[str] = None):
+        """写出pcap (纳秒时间戳); log_file给出时同时写 draw_cdf.py 格式的 '帧长,间隔ns,发送时间s' 日志"""
+        log = open(log_file, 'w') if log_file else None
+        try:
+            with open(path, 'wb') as f:
+                f.write(struct.pack('<IHHiIII', PCAP_MAGIC_NSEC, 2, 4, 0, 0, 65535, LINKTYPE_ETHERNET))
+                done = 0
+                while done < packets:
+                    n = min(block_packets, packets - done)
+                    last = self.t
+                    f.write(self.block(n))
+                    if log is not None:
+                        self._write_log(log, last, n)
+                    done += n
+        finally:
+            if log is not None:
+                log.close()
+
+    def _write_log(self, log, last: int, n: int):
+        # 日志只需大致一致的负载: 按本块的时间跨度均匀摊开
+        t = np.linspace(last, self.t, n + 1)[1:]
+        gap = np.diff(t, prepend=last)
+        size = np.full(n, len(self.roce) + self.payload)
+        np.savetxt(log, np.column_stack([size, gap, t / 1e9]), fmt=['%d', '%.0f', '%.9f'], delimiter=',')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a synthetic RoCEv2 capture with MAC-encoded timestamps')
+    parser.add_argument('output')
+    parser.add_argument('--packets', type=int, default=1_000_000, help='records to write, PFC frames included')
+    parser.add_argument('--gap-mode', choices=GAP_MODES, default='constant')
+    parser.add_argument('--gap', type=int, default=1000, help='constant / intra-burst gap (ns)')
+    parser.add_argument('--burst', type=float, default=32, help='mean burst length in packets (bursty)')
+    parser.add_argument('--idle', type=int, default=20000, help='mean idle time between bursts (ns, bursty)')
+    parser.add_argument('--trace', help='gaps to replay: .npy/.txt of ns gaps, or a capture to take MAC-timestamp gaps from')
+    parser.add_argument('--trace-src-ip', help='source IP filter when --trace is a capture')
+    parser.add_argument('--qps', type=int, default=8)
+    parser.add_argument('--payload', type=int, default=1024, help='RoCE payload bytes (only counted in the wire length)')
+    parser.add_argument('--pfc-ratio', type=float, default=0.0, help='fraction of records that are PFC frames')
+    parser.add_argument('--pfc-quanta', type=int, default=1000)
+    parser.add_argument('--mac-start', type=lambda s: int(s, 0), default=0,
+                        help='initial 48-bit MAC timestamp; set near 2^48 to exercise wrap-around')
+    parser.add_argument('--log', help='also write a draw_cdf.py style log for the same packets')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    trace = load_trace(args.trace, args.trace_src_ip) if args.gap_mode == 'trace' else None
+    gaps = GapSource(args.gap_mode, args.gap, args.burst, args.idle, trace, args.seed)
+    writer = RoceCaptureWriter(gaps, args.qps, args.payload, args.pfc_ratio, pfc_quanta=args.pfc_quanta,
+                               mac_start=args.mac_start, seed=args.seed)
+    writer.write(args.output, args.packets, log_file=args.log)
+    logger.info(f"Wrote {writer.roce_packets:,} RoCE packets and {writer.pfc_frames:,} PFC frames "
+                f"to {args.output} ({os.path.getsize(args.output) / 2**20:.1f} MiB)")
+
+
+if __name__ == '__main__':
+    main()
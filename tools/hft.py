@@ -0,0 +1,182 @@
+import argparse
+import json
+import sys
+import time
+
+# 离线分析工具的统一入口. 各子命令只在自身代码路径中导入所需模块: scapy、matplotlib、seaborn、tqdm
+# 只在确实需要时加载, 缓存命中和纯统计输出不导入任何绘图库, 适合被扫参脚本反复调用
+_START = time.perf_counter()
+
+SOURCE_IP = '10.10.10.2'
+ROCE_PORT = 4791
+
+
+def _cache(args):
+    from analysis_cache import AnalysisCache
+    return AnalysisCache(args.cache_dir)
+
+
+def _analyzer(args):
+    from timegap_view import PacketAnalyzer
+    return PacketAnalyzer(args.pcap, args.source_ip, args.sport, workers=args.workers, cache=_cache(args))
+
+
+def _emit(args, result: dict, text: str):
+    """--json 时输出一行JSON, 否则输出文本"""
+    if args.json:
+        print(json.dumps(result, default=lambda v: v.tolist()))
+    else:
+        print(text)
+
+
+def cmd_extract(args):
+    data = _analyzer(args).load_or_extract_mac_addresses()
+    if args.output:
+        import numpy as np
+        np.save(args.output, data)
+    result = {'packets': len(data), 'first': int(data[0]) if len(data) else None,
+              'last': int(data[-1]) if len(data) else None}
+    _emit(args, result, f"{result['packets']:,} packets, MAC timestamps {result['first']} .. {result['last']}")
+
+
+def cmd_gaps(args):
+    stats = _analyzer(args).load_or_calculate_gap_stats()
+    result = stats.summary(args.quantiles)
+    # 与 calculate_time_gaps 相同的开区间 (min_gap, max_gap)
+    result['within'] = stats.count_between(args.min_gap + 1, args.max_gap)
+    quantiles = ', '.join(f"{name} {result[name]:.0f}" for name in result if name.startswith('p'))
+    _emit(args, result, f"{result['count']:,} gaps: mean {result['mean']:.1f} ns, std {result['std']:.1f} ns, "
+                        f"{quantiles} ns; {result['within']:,.0f} within ({args.min_gap}, {args.max_gap}) ns")
+
+
+def cmd_cdf(args):
+    from draw_cdf import cdf_table, load_log, write_cdf
+    table = _cache(args).get_or_compute(args.log, 'cdf', lambda: cdf_table(load_log(args.log)[:, args.column],
+                                                                            args.weighting),
+                                        column=args.column, weighting=args.weighting)
+    if args.output:
+        write_cdf(table, args.output)
+    import numpy as np
+    value, cdf = table['value'], table['cdf']
+    idx = np.minimum(np.searchsorted(cdf, args.quantiles), len(cdf) - 1) if len(cdf) else []
+    result = {'values': len(value), 'flows': int(table['count'].sum()),
+              **{f'p{q * 100:g}': float(value[i]) for q, i in zip(args.quantiles, idx)}}
+    _emit(args, result, f"{result['flows']:,} rows, {result['values']:,} distinct values; " +
+          ', '.join(f"{name} {result[name]:g}" for name in result if name.startswith('p')))
+
+
+def cmd_bandwidth(args):
+    from bandwidth_analyzer import compare_configurations
+    results = compare_configurations(args.version, args.msg_size, args.workers, args.root)
+    rows = [{'ft': float(ft), 'thre': float(thre),
+             **{f'{metric}_{stat}': s[metric].get(stat) for metric in ('average', 'fct_99', 'fct_999')
+                for stat in ('mean', 'median')}}
+            for (ft, thre), s in sorted(results.items())]
+    lines = [f"{'ft':>8} {'thre':>8} {'avg mean':>12} {'avg median':>12} {'fct99 mean':>12} {'fct99.9 mean':>12}"]
+    for r in rows:
+        lines.append(f"{r['ft']:>8g} {r['thre']:>8g} " + ' '.join(
+            f"{r[name]:>12.2f}" if r[name] is not None else f"{'-':>12}"
+            for name in ('average_mean', 'average_median', 'fct_99_mean', 'fct_999_mean')))
+    _emit(args, {'configs': rows}, '\n'.join(lines))
+
+
+def cmd_flowlet(args):
+    import numpy as np
+    from flowlet_table import FlowletTable, default_points, log_timeouts, print_sweep, timeout_sweep
+    timeouts = np.array(args.timeout, dtype=np.int64)
+    if args.logs:
+        timeouts = np.union1d(timeouts, log_timeouts(args.logs))
+    flowlets = FlowletTable(args.pcap, args.source_ip, args.sport, per_qp=not args.whole,
+                            workers=args.workers, cache=_cache(args))
+    table = flowlets.table(int(timeouts.min()))
+    result = timeout_sweep(table, timeouts, default_points(table[args.field]), args.field, args.weighting)
+    if args.json:
+        _emit(args, result, '')
+    else:
+        print_sweep(result, args.field, args.weighting)
+
+
+def cmd_plot(args):
+    if args.kind == 'gaps':
+        analyzer = _analyzer(args)
+        gaps = analyzer.load_gap_window(args.start, args.size, min_gap=args.min_gap, max_gap=args.max_gap)
+        analyzer.plot_time_gaps(gaps, start_idx=args.start, sample_size=args.size, output_file=args.output,
+                                offset=args.start)
+    else:
+        from draw_cdf import get_cdf, load_log, plot_cdf
+        _, data = get_cdf(load_log(args.pcap))
+        plot_cdf(data)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    from analysis_cache import CACHE_DIR
+
+    parser = argparse.ArgumentParser(description='HFTPrototype offline analysis tools')
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--json', action='store_true', help='print one JSON object instead of text')
+    parser.add_argument('--timing', action='store_true', help='report the time spent after interpreter startup, and any heavy modules loaded, on stderr')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    def capture_parser(name, help, metavar='pcap'):
+        p = sub.add_parser(name, help=help)
+        p.add_argument('pcap', metavar=metavar)
+        p.add_argument('--source-ip', default=SOURCE_IP)
+        p.add_argument('--sport', type=int, default=ROCE_PORT)
+        p.add_argument('--workers', type=int, default=1)
+        return p
+
+    p = capture_parser('extract', 'extract (or load cached) MAC timestamps in capture order')
+    p.add_argument('--output', help='also save the timestamps to this .npy file')
+    p.set_defaults(func=cmd_extract)
+
+    p = capture_parser('gaps', 'gap summary and quantiles from the streaming gap statistics')
+    p.add_argument('--min-gap', type=int, default=0)
+    p.add_argument('--max-gap', type=int, default=20000)
+    p.add_argument('--quantiles', type=float, nargs='+', default=[0.5, 0.99, 0.999])
+    p.set_defaults(func=cmd_gaps)
+
+    p = sub.add_parser('cdf', help='CDF of one column of a draw_cdf.py log')
+    p.add_argument('log')
+    p.add_argument('--column', type=int, default=0)
+    p.add_argument('--weighting', choices=('flow', 'byte'), default='flow')
+    p.add_argument('--quantiles', type=float, nargs='+', default=[0.5, 0.99, 0.999])
+    p.add_argument('--output', help="write the full 'value count cum_weight cdf' table here")
+    p.set_defaults(func=cmd_cdf)
+
+    p = sub.add_parser('bandwidth', help='per (ft, thre) bandwidth/FCT statistics of a perftest log version')
+    p.add_argument('version')
+    p.add_argument('--root', default='./resources/prototype/')
+    p.add_argument('--msg-size', type=int, default=65536)
+    p.add_argument('--workers', type=int, default=None)
+    p.set_defaults(func=cmd_bandwidth)
+
+    p = capture_parser('flowlet', 'flowlet size distribution across flowlet timeouts')
+    p.add_argument('--timeout', type=int, nargs='+', default=[5000], help='flowlet timeouts (ns)')
+    p.add_argument('--logs', help='also sweep every ft value found in prototype_ft_*_thre_*.log under this directory')
+    p.add_argument('--field', choices=('packets', 'bytes', 'duration'), default='bytes')
+    p.add_argument('--weighting', choices=('flowlet', 'byte'), default='flowlet')
+    p.add_argument('--whole', action='store_true', help='segment the whole stream instead of each QP')
+    p.set_defaults(func=cmd_flowlet)
+
+    p = capture_parser('plot', 'plot a gap window of a capture, or the CDF of a draw_cdf.py log', metavar='input')
+    p.add_argument('--kind', choices=('gaps', 'cdf'), default='gaps')
+    p.add_argument('--start', type=int, default=10200)
+    p.add_argument('--size', type=int, default=200)
+    p.add_argument('--min-gap', type=int, default=200)
+    p.add_argument('--max-gap', type=int, default=20000)
+    p.add_argument('--output', default='./timegap_analysis')
+    p.set_defaults(func=cmd_plot)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+    if args.timing:
+        heavy = [name for name in ('scapy', 'matplotlib', 'seaborn', 'tqdm') if name in sys.modules]
+        print(f"{args.command}: {(time.perf_counter() - _START) * 1000:.0f} ms"
+              f"{', loaded ' + ', '.join(heavy) if heavy else ''}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
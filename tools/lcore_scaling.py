@@ -0,0 +1,74 @@
+import argparse
+import logging
+import re
+import subprocess
+from typing import Dict, List, Optional
+
+from perftest_runner import write_columns
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+BINARY = './build/Prototype'
+NULL_VDEV = 'net_null0,size=64,copy=0'
+TOTAL_RE = re.compile(r'^Total: (?P<packets>\d+) packets in (?P<seconds>[\d.]+) s, (?P<mpps>[\d.]+) Mpps, '
+                      r'(?P<pfc>\d+) PFC sent, queues (?P<queues>\d+)', re.M)
+
+
+def vdev_args(queues: int, pcap: Optional[str]) -> List[str]:
+    """无网卡时的虚拟端口: net_null不做RSS, 每个队列各自生成空包; net_pcap每个队列回放一份抓包"""
+    if pcap is None:
+        return [f'--vdev={NULL_VDEV}']
+    rx = ','.join(f'rx_pcap={pcap}' for _ in range(queues))
+    return [f'--vdev=net_pcap0,{rx},infinite_rx=1']
+
+
+def run_once(binary: str, queues: int, duration: int, pcap: Optional[str] = None,
+             extra_eal: Optional[List[str]] = None) -> Dict:
+    # lcore 0 负责汇总报告, 1..queues 各处理一个队列
+    cmd = [binary, '-l', f'0-{queues}', '--no-pci', '--file-prefix=lcore_scaling',
+           *vdev_args(queues, pcap), *(extra_eal or []), '--', '-q', str(queues), '-t', str(duration)]
+    logger.info(' '.join(cmd))
+    proc = subprocess.run(cmd, capture_output=True, text=True, timeout=duration + 60)
+    m = TOTAL_RE.search(proc.stdout)
+    if proc.returncode != 0 or m is None:
+        logger.error(f"Run with {queues} queue(s) failed (exit {proc.returncode}):\n{proc.stdout}{proc.stderr}")
+        return {'queues': queues, 'status': f'exit {proc.returncode}'}
+    return {
+        'queues': int(m['queues']),
+        'packets': int(m['packets']),
+        'seconds': float(m['seconds']),
+        'mpps': float(m['mpps']),
+        'pfc': int(m['pfc']),
+        'status': 'ok',
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure dataplane packets-per-second as worker lcores are added')
+    parser.add_argument('--binary', default=BINARY)
+    parser.add_argument('--max-lcores', type=int, default=4, help='largest number of worker lcores to try')
+    parser.add_argument('--duration', type=int, default=10, help='seconds per run')
+    parser.add_argument('--pcap', help='replay this capture through net_pcap instead of net_null')
+    parser.add_argument('--eal', nargs=argparse.REMAINDER, default=[], help='extra EAL arguments, e.g. --no-huge')
+    parser.add_argument('--output', help='write results as columns to this .npz file')
+    args = parser.parse_args()
+
+    rows = [run_once(args.binary, n, args.duration, args.pcap, args.eal) for n in range(1, args.max_lcores + 1)]
+
+    base = next((row['mpps'] for row in rows if row['status'] == 'ok'), None)
+    print(f"{'lcores':>8} {'Mpps':>10} {'speedup':>10} {'PFC':>10}")
+    for row in rows:
+        if row['status'] != 'ok':
+            print(f"{row['queues']:>8} {row['status']:>10}")
+            continue
+        print(f"{row['queues']:>8} {row['mpps']:>10.3f} {row['mpps'] / base:>10.2f} {row['pfc']:>10}")
+    if args.output:
+        write_columns(args.output, rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+import json
+import mmap
+import os
+import shutil
+import tempfile
+import zlib
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+
+from analysis_cache import AnalysisCache
+from pcap_reader import (FIELD_DTYPES, IPPROTO_UDP, LINKTYPE_ETHERNET, PcapFile, UnsupportedLinkType,
+                         decode_chunk, ip_to_int)
+
+STORE_VERSION = 1
+# 每块的行数; 块是解压和时间范围裁剪的最小单位
+CHUNK_ROWS = 1 << 14
+# 存储的列: 每个以太网帧一行, 无效的IP/L4/BTH字段置0
+STORE_COLUMNS = tuple(FIELD_DTYPES)
+# 单调递增的时间戳列先做差分再压缩
+DELTA_COLUMNS = ('ts_ns', 'mac_ts')
+# 各列依赖的有效掩码
+VALID_MASKS = {
+    'ip_src': 'valid_ipv4', 'ip_dst': 'valid_ipv4',
+    'sport': 'valid_l4', 'dport': 'valid_l4',
+    'bth_opcode': 'valid_bth', 'dest_qp': 'valid_bth', 'psn': 'valid_bth',
+}
+ZLIB_LEVEL = 1
+
+
+def _encode(name: str, col: np.ndarray, codec: str) -> bytes:
+    if name in DELTA_COLUMNS and len(col):
+        col = np.diff(col.astype(np.int64), prepend=np.int64(0))
+    raw = col.tobytes()
+    return zlib.compress(raw, ZLIB_LEVEL) if codec == 'zlib' else raw
+
+
+def _decode(name: str, blob, dtype: np.dtype, codec: str) -> np.ndarray:
+    if codec == 'zlib':
+        blob = zlib.decompress(blob)
+    if name in DELTA_COLUMNS:
+        return np.cumsum(np.frombuffer(blob, dtype=np.int64)).astype(dtype)
+    # 未压缩时直接返回mmap上的只读视图
+    return np.frombuffer(blob, dtype=dtype)
+
+
+class PacketStore:
+    """抓包元数据的分块列式存储
+
+    目录内每列一个文件, 由各块独立压缩的数据段首尾相接组成, 以mmap方式打开后按需解压;
+    index.npz记录每块的行偏移、各列的字节偏移, 以及每块的时间戳和QP范围,
+    读取时先按这些统计裁剪块, 只解压需要的列和块. bytes_read累计实际读取的压缩字节数.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / 'meta.json') as f:
+            self.meta = json.load(f)
+        if self.meta['version'] != STORE_VERSION:
+            raise ValueError(f"Unsupported packet store version {self.meta['version']}: {self.path}")
+        with np.load(self.path / 'index.npz') as npz:
+            self.index = {name: npz[name] for name in npz.files}
+        self.columns = {name: np.dtype(dtype) for name, dtype in self.meta['columns'].items()}
+        self.codec = self.meta['codec']
+        self.n_rows = self.meta['n_rows']
+        self.row_start = self.index['row_start']
+        self.n_chunks = len(self.row_start) - 1
+        self._files = {}
+        self.bytes_read = 0
+
+    def close(self):
+        for fd, mm in self._files.values():
+            if mm is not None:
+                mm.close()
+            fd.close()
+        self._files.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _column_buf(self, name: str):
+        if name not in self._files:
+            if name not in self.columns:
+                raise KeyError(f"Unknown column: {name}")
+            fd = open(self.path / f'{name}.bin', 'rb')
+            # 空文件无法mmap
+            mm = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(fd.fileno()).st_size else None
+            self._files[name] = (fd, mm)
+        return self._files[name][1]
+
+    def read_chunk(self, name: str, i: int) -> np.ndarray:
+        """解压单个块的一列"""
+        offsets = self.index[f'offsets_{name}']
+        start, end = int(offsets[i]), int(offsets[i + 1])
+        if start == end:
+            return np.empty(0, dtype=self.columns[name])
+        self.bytes_read += end - start
+        return _decode(name, memoryview(self._column_buf(name))[start:end], self.columns[name], self.codec)
+
+    def select_chunks(self, ts_range: Optional[Tuple[int, int]] = None, qp: Optional[int] = None,
+                      start_row: int = 0) -> np.ndarray:
+        """按块统计裁剪: 与[ts_lo, ts_hi)相交、可能含有该QP、且不早于start_row的块"""
+        keep = self.row_start[1:] > start_row
+        if ts_range is not None:
+            lo, hi = ts_range
+            keep &= (self.index['ts_max'] >= lo) & (self.index['ts_min'] < hi)
+        if qp is not None:
+            keep &= (self.index['bth_rows'] > 0) & (self.index['qp_min'] <= qp) & (self.index['qp_max'] >= qp)
+        return np.flatnonzero(keep)
+
+    def iter_chunks(self, columns: Sequence[str], ts_range: Optional[Tuple[int, int]] = None,
+                    qp: Optional[int] = None, start_row: int = 0) -> Iterator[Dict[str, np.ndarray]]:
+        """逐块产出所需列; 块内再按时间范围/QP/起始行过滤, '_row'为各行的全局行号"""
+        for i in self.select_chunks(ts_range, qp, start_row):
+            first = int(self.row_start[i])
+            rows = np.arange(first, int(self.row_start[i + 1]))
+            mask = rows >= start_row
+            if ts_range is not None:
+                ts = self.read_chunk('ts_ns', i)
+                mask &= (ts >= ts_range[0]) & (ts < ts_range[1])
+            if qp is not None:
+                # 无BTH的行dest_qp为0, 用ip_proto排除非UDP包
+                mask &= (self.read_chunk('dest_qp', i) == qp) & (self.read_chunk('ip_proto', i) == IPPROTO_UDP)
+            chunk = {name: self.read_chunk(name, i) for name in columns}
+            if not mask.all():
+                chunk = {name: col[mask] for name, col in chunk.items()}
+                rows = rows[mask]
+            chunk['_row'] = rows
+            yield chunk
+
+    def read(self, columns: Sequence[str], ts_range: Optional[Tuple[int, int]] = None,
+             qp: Optional[int] = None, start_row: int = 0) -> Dict[str, np.ndarray]:
+        """读取所需列并合并各块"""
+        parts = list(self.iter_chunks(columns, ts_range, qp, start_row))
+        return {
+            name: np.concatenate([p[name] for p in parts]) if parts
+            else np.empty(0, dtype=self.columns[name] if name != '_row' else np.int64)
+            for name in (*columns, '_row')
+        }
+
+
+def row_filter(cols: Dict[str, np.ndarray], src_ip: Optional[str] = None,
+               sport: Optional[int] = None) -> np.ndarray:
+    """与pcap_reader.filter_mask相同的源IP/UDP源端口过滤, 作用于存储中读出的列"""
+    mask = np.ones(len(cols['_row']), dtype=bool)
+    if src_ip is not None:
+        mask &= cols['ip_src'] == ip_to_int(src_ip)
+    if sport is not None:
+        mask &= (cols['ip_proto'] == IPPROTO_UDP) & (cols['sport'] == sport)
+    return mask
+
+
+def build_store(file_name: str, path, chunk_rows: int = CHUNK_ROWS, codec: str = 'zlib',
+                progress=None) -> PacketStore:
+    """扫描一遍抓包, 把每个以太网帧的头部字段写成分块列式存储; 先写临时目录再原子改名"""
+    path = Path(path)
+    tmp = Path(tempfile.mkdtemp(dir=path.parent, prefix='.tmp_'))
+    try:
+        offsets = {name: [0] for name in STORE_COLUMNS}
+        stats = {name: [] for name in ('ts_min', 'ts_max', 'qp_min', 'qp_max', 'bth_rows')}
+        row_start = [0]
+        files = {name: open(tmp / f'{name}.bin', 'wb') for name in STORE_COLUMNS}
+        try:
+            with PcapFile(file_name) as pcap:
+                for index in pcap.iter_index(chunk_rows):
+                    if not (index.linktype == LINKTYPE_ETHERNET).all():
+                        raise UnsupportedLinkType(int(index.linktype[index.linktype != LINKTYPE_ETHERNET][0]))
+                    cols = decode_chunk(pcap.buf, index, STORE_COLUMNS)
+                    for name in STORE_COLUMNS:
+                        col = cols[name]
+                        if name in VALID_MASKS:
+                            col = np.where(cols[VALID_MASKS[name]], col, 0).astype(col.dtype)
+                        blob = _encode(name, col, codec)
+                        files[name].write(blob)
+                        offsets[name].append(offsets[name][-1] + len(blob))
+                    ts, has_bth = cols['ts_ns'], cols['valid_bth']
+                    qps = cols['dest_qp'][has_bth]
+                    stats['ts_min'].append(ts.min())
+                    stats['ts_max'].append(ts.max())
+                    stats['qp_min'].append(qps.min() if len(qps) else 0)
+                    stats['qp_max'].append(qps.max() if len(qps) else 0)
+                    stats['bth_rows'].append(len(qps))
+                    row_start.append(row_start[-1] + len(index))
+                    if progress is not None:
+                        progress(index.end_offset)
+        finally:
+            for f in files.values():
+                f.close()
+
+        np.savez(tmp / 'index.npz', row_start=np.array(row_start, dtype=np.int64),
+                 ts_min=np.array(stats['ts_min'], dtype=np.int64), ts_max=np.array(stats['ts_max'], dtype=np.int64),
+                 qp_min=np.array(stats['qp_min'], dtype=np.uint32), qp_max=np.array(stats['qp_max'], dtype=np.uint32),
+                 bth_rows=np.array(stats['bth_rows'], dtype=np.int64),
+                 **{f'offsets_{name}': np.array(off, dtype=np.int64) for name, off in offsets.items()})
+        meta = {
+            'version': STORE_VERSION, 'source': os.path.abspath(file_name), 'n_rows': row_start[-1],
+            'chunk_rows': chunk_rows, 'codec': codec,
+            'columns': {name: np.dtype(FIELD_DTYPES[name]).str for name in STORE_COLUMNS},
+        }
+        with open(tmp / 'meta.json', 'w') as f:
+            json.dump(meta, f, indent=2)
+        # 并发构建时以先完成者为准
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            if not (path / 'meta.json').exists():
+                raise
+            shutil.rmtree(tmp, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return PacketStore(path)
+
+
+def open_store(file_name: str, cache: Optional[AnalysisCache] = None, progress=None, **build_args) -> PacketStore:
+    """按抓包内容指纹在缓存目录中查找列式存储, 不存在则构建"""
+    cache = cache or AnalysisCache()
+    key = cache.key(file_name, 'packet_store', version=STORE_VERSION, **build_args)
+    path = cache.cache_dir / f'{Path(file_name).stem}_packets_{key}.store'
+    if (path / 'meta.json').exists():
+        # 更新修改时间, 缓存淘汰按最近使用排序
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return PacketStore(path)
+    store = build_store(file_name, path, progress=progress, **build_args)
+    cache.evict(keep=path)
+    return store
@@ -0,0 +1,766 @@
+import mmap
+import os
+import socket
+import struct
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+# pcap / pcapng 文件格式常量
+PCAP_MAGIC_USEC = 0xa1b2c3d4
+PCAP_MAGIC_NSEC = 0xa1b23c4d
+PCAP_GLOBAL_HDR_LEN = 24
+PCAP_RECORD_HDR_LEN = 16
+
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_IDB = 0x00000001
+PCAPNG_SPB = 0x00000003
+PCAPNG_EPB = 0x00000006
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+
+LINKTYPE_ETHERNET = 1
+
+# 以太网/IP/UDP 头部偏移
+ETH_HLEN = 14
+VLAN_HLEN = 4
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_VLAN = 0x8100
+ETHERTYPE_MAC_CONTROL = 0x8808
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+ROCE_PORT = 4791
+UDP_HLEN = 8
+BTH_LEN = 12
+# PFC (802.1Qbb) 帧: opcode(2) pev(2) time[8](16)
+PFC_OPCODE = 0x0101
+PFC_PRIORITIES = 8
+PFC_HLEN = 4 + 2 * PFC_PRIORITIES
+
+# 每次处理的记录数, 决定单块临时内存的上限
+DEFAULT_CHUNK_RECORDS = 1 << 20
+# 并行扫描时每个任务覆盖的字节数
+DEFAULT_CHUNK_BYTES = 256 << 20
+# 记录边界重同步: 候选位置之后需连续校验通过的记录头数
+RESYNC_CHAIN = 32
+MAX_RECORD_LEN = 262144
+
+# 提取结果中各列的类型
+FIELD_DTYPES = {
+    'ts_ns': np.int64,        # pcap记录时间戳 (ns)
+    'mac_ts': np.uint64,      # Ether src中编码的48位交换机时间戳
+    'ethertype': np.uint16,
+    'ip_src': np.uint32,
+    'ip_dst': np.uint32,
+    'ip_proto': np.uint8,
+    'sport': np.uint16,
+    'dport': np.uint16,
+    'frame_len': np.uint32,   # 原始帧长度 (wire length)
+    'bth_opcode': np.uint8,   # InfiniBand BTH 操作码
+    'dest_qp': np.uint32,     # BTH 目的QP (24位)
+    'psn': np.uint32,         # BTH 包序列号 (24位)
+}
+DEFAULT_FIELDS = tuple(FIELD_DTYPES)
+
+# Ether src中的交换机时间戳为48位计数, ns分辨率下约78小时回绕一次
+MAC_TS_BITS = 48
+MAC_TS_MASK = (1 << MAC_TS_BITS) - 1
+MAC_TS_HALF = 1 << (MAC_TS_BITS - 1)
+# 乱序窗口: 最多保留的待定样本数; 迟到超过该窗口的样本计数后丢弃
+DEFAULT_REORDER_WINDOW = 1 << 16
+# 能通过IPv4过滤的最短记录 (记录头 + 以太网头 + IPv4头), 用于预估结果缓冲区的上限
+MIN_IPV4_RECORD = PCAP_RECORD_HDR_LEN + ETH_HLEN + 20
+
+
+class UnsupportedLinkType(Exception):
+    """非以太网链路类型, 需回退到scapy"""
+    def __init__(self, linktype: int):
+        super().__init__(f"Unsupported link type: {linktype}")
+        self.linktype = linktype
+
+
+class RecordIndex(NamedTuple):
+    """一段连续记录的索引"""
+    data_offset: np.ndarray   # 帧数据在文件中的偏移
+    caplen: np.ndarray
+    wirelen: np.ndarray
+    ts_ns: np.ndarray
+    linktype: np.ndarray
+    end_offset: int           # 该段最后一条记录之后的文件偏移
+
+    def __len__(self):
+        return len(self.data_offset)
+
+
+def ip_to_int(ip: str) -> int:
+    """点分十进制IPv4地址转换为整数"""
+    return int.from_bytes(socket.inet_aton(ip), 'big')
+
+
+def int_to_ip(value: int) -> str:
+    """整数转换为点分十进制IPv4地址"""
+    return socket.inet_ntoa(int(value).to_bytes(4, 'big'))
+
+
+class PcapFile:
+    """以mmap方式打开的pcap/pcapng文件, 不复制帧数据"""
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        self.file_size = os.path.getsize(file_name)
+        self._fd = open(file_name, 'rb')
+        if self.file_size == 0:
+            self._fd.close()
+            raise ValueError(f"Empty capture file: {file_name}")
+        self.mm = mmap.mmap(self._fd.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(self.mm, 'madvise'):
+            self.mm.madvise(mmap.MADV_SEQUENTIAL)
+        self.buf = np.frombuffer(self.mm, dtype=np.uint8)
+        self._parse_header()
+
+    def _parse_header(self):
+        magic_le = struct.unpack_from('<I', self.mm, 0)[0]
+        if magic_le == PCAPNG_SHB:
+            self.format = 'pcapng'
+            self.endian = '<' if struct.unpack_from('<I', self.mm, 8)[0] == PCAPNG_BYTE_ORDER_MAGIC else '>'
+            self.first_record = 0
+            self.linktype = None
+            return
+
+        self.format = 'pcap'
+        for endian in ('<', '>'):
+            magic = struct.unpack_from(endian + 'I', self.mm, 0)[0]
+            if magic in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC):
+                self.endian = endian
+                self.ts_scale = 1 if magic == PCAP_MAGIC_NSEC else 1000
+                break
+        else:
+            raise ValueError(f"Unknown capture format (magic 0x{magic_le:08x}): {self.file_name}")
+        self.snaplen, linktype = struct.unpack_from(self.endian + 'II', self.mm, 16)
+        self.linktype = linktype & 0xFFFF
+        self.first_record = PCAP_GLOBAL_HDR_LEN
+
+    def close(self):
+        # buf引用了mmap, 需先释放
+        self.buf = None
+        self.mm.close()
+        self._fd.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def iter_index(self, chunk_records: int = DEFAULT_CHUNK_RECORDS,
+                   start: Optional[int] = None, stop: Optional[int] = None) -> Iterator[RecordIndex]:
+        """遍历记录头, 按块产出记录索引; start/stop为记录对齐的文件偏移"""
+        start = self.first_record if start is None else start
+        stop = self.file_size if stop is None else min(stop, self.file_size)
+        if self.format == 'pcap':
+            return self._iter_pcap(chunk_records, start, stop)
+        return self._iter_pcapng(chunk_records, start, stop)
+
+    def find_record_start(self, pos: int) -> int:
+        """从任意文件偏移向后搜索第一个记录头的起始位置 (仅classic pcap)"""
+        if self.format != 'pcap':
+            raise ValueError("Record resync is only supported for classic pcap")
+        pos = max(pos, self.first_record)
+        hdr_dtype = np.dtype(self.endian + 'u4')
+        frac_limit = 1_000_000_000 if self.ts_scale == 1 else 1_000_000
+        first_sec = struct.unpack_from(self.endian + 'I', self.mm, self.first_record)[0]
+        snaplen = self.snaplen or MAX_RECORD_LEN
+        min_caplen = ETH_HLEN if self.linktype == LINKTYPE_ETHERNET else 1
+
+        def plausible(hdr):
+            ts_sec, ts_frac, caplen, wirelen = hdr
+            return ((ts_frac < frac_limit) & (caplen >= min_caplen) & (caplen <= snaplen)
+                    & (caplen <= wirelen) & (wirelen <= MAX_RECORD_LEN) & (ts_sec >= first_sec))
+
+        # 多数记录远小于最大长度, 窗口从小到大逐步扩展
+        window = 4096
+        while pos + PCAP_RECORD_HDR_LEN <= self.file_size:
+            # 先向量化筛出窗口内记录头合理的候选位置, 再逐个校验记录链
+            cand = np.arange(pos, min(pos + window, self.file_size - PCAP_RECORD_HDR_LEN + 1), dtype=np.int64)
+            hdr = self.buf[cand[:, None] + np.arange(PCAP_RECORD_HDR_LEN)].view(hdr_dtype)
+            for q in cand[plausible(hdr.T)]:
+                if self._check_chain(int(q), plausible):
+                    return int(q)
+            pos += window
+            window = min(window * 2, PCAP_RECORD_HDR_LEN + MAX_RECORD_LEN)
+        return self.file_size
+
+    def _check_chain(self, pos: int, plausible) -> bool:
+        unpack = struct.Struct(self.endian + 'IIII').unpack_from
+        prev_sec = None
+        for _ in range(RESYNC_CHAIN):
+            if pos == self.file_size:
+                return True
+            if pos + PCAP_RECORD_HDR_LEN > self.file_size:
+                return False
+            hdr = unpack(self.mm, pos)
+            if not plausible(hdr) or pos + PCAP_RECORD_HDR_LEN + hdr[2] > self.file_size:
+                return False
+            # 相邻记录的时间戳应当接近
+            if prev_sec is not None and abs(hdr[0] - prev_sec) > 3600:
+                return False
+            prev_sec = hdr[0]
+            pos += PCAP_RECORD_HDR_LEN + hdr[2]
+        return True
+
+    def split(self, chunk_bytes: int = DEFAULT_CHUNK_BYTES) -> List[int]:
+        """按记录边界把文件切分为若干段, 返回包含首尾的边界偏移列表"""
+        bounds = [self.first_record]
+        for pos in range(self.first_record + chunk_bytes, self.file_size, chunk_bytes):
+            start = self.find_record_start(pos)
+            if start > bounds[-1]:
+                bounds.append(start)
+        if bounds[-1] != self.file_size:
+            bounds.append(self.file_size)
+        return bounds
+
+    def build_index(self) -> RecordIndex:
+        """一次遍历构建整个文件的记录索引"""
+        chunks = list(self.iter_index())
+        return concat_index(chunks, self.file_size)
+
+    def _iter_pcap(self, chunk_records: int, pos: int, stop: int) -> Iterator[RecordIndex]:
+        mm = self.mm
+        hdr_struct = struct.Struct(self.endian + 'IIII')
+        unpack = hdr_struct.unpack_from
+        hdr_dtype = np.dtype(self.endian + 'u4')
+        scale = self.ts_scale
+
+        while pos + PCAP_RECORD_HDR_LEN <= stop:
+            # 记录头起始偏移, 以及其中的 caplen 字段
+            starts = np.empty(chunk_records, dtype=np.int64)
+            n = 0
+            run = 16
+            cooldown = 0
+            prev_caplen = -1
+            while n < chunk_records and pos + PCAP_RECORD_HDR_LEN <= stop:
+                caplen = unpack(mm, pos)[2]
+                if cooldown:
+                    cooldown -= 1
+                elif caplen == prev_caplen:
+                    # 连续等长记录: 用跨步视图一次验证一批记录头
+                    stride = PCAP_RECORD_HDR_LEN + caplen
+                    k = min(run, chunk_records - n, (stop - pos) // stride)
+                    if k > 1:
+                        view = np.ndarray(shape=(k,), dtype=hdr_dtype, buffer=mm,
+                                          offset=pos + 8, strides=(stride,))
+                        diff = np.flatnonzero(view != caplen)
+                        r = int(diff[0]) if len(diff) else k
+                        starts[n:n + r] = pos + stride * np.arange(r, dtype=np.int64)
+                        n += r
+                        pos += stride * r
+                        run = min(run * 2, 1 << 16) if r == k else 16
+                        # 长度频繁变化时暂停批量验证, 避免numpy调用开销
+                        cooldown = 64 if r < 8 else 0
+                        continue
+                if pos + PCAP_RECORD_HDR_LEN + caplen > stop:
+                    break
+                starts[n] = pos
+                n += 1
+                pos += PCAP_RECORD_HDR_LEN + caplen
+                prev_caplen = caplen
+
+            if n == 0:
+                break
+            starts = starts[:n]
+            # 向量化读取记录头的四个字段
+            raw = self.buf[starts[:, None] + np.arange(PCAP_RECORD_HDR_LEN)]
+            hdr = raw.view(hdr_dtype).astype(np.uint32)
+            ts_ns = hdr[:, 0].astype(np.int64) * 1_000_000_000 + hdr[:, 1].astype(np.int64) * scale
+            yield RecordIndex(
+                data_offset=starts + PCAP_RECORD_HDR_LEN,
+                caplen=hdr[:, 2],
+                wirelen=hdr[:, 3],
+                ts_ns=ts_ns,
+                linktype=np.full(len(starts), self.linktype, dtype=np.uint16),
+                end_offset=pos,
+            )
+
+    def _iter_pcapng(self, chunk_records: int, pos: int, stop: int) -> Iterator[RecordIndex]:
+        mm = self.mm
+        endian = self.endian
+        interfaces = []   # (linktype, 每秒的时间单位数)
+        offsets, caplens, wirelens, ts_list, links = [], [], [], [], []
+
+        def flush():
+            idx = RecordIndex(
+                data_offset=np.array(offsets, dtype=np.int64),
+                caplen=np.array(caplens, dtype=np.uint32),
+                wirelen=np.array(wirelens, dtype=np.uint32),
+                ts_ns=np.array(ts_list, dtype=np.int64),
+                linktype=np.array(links, dtype=np.uint16),
+                end_offset=pos,
+            )
+            for lst in (offsets, caplens, wirelens, ts_list, links):
+                lst.clear()
+            return idx
+
+        while pos + 12 <= stop:
+            block_type = struct.unpack_from('<I', mm, pos)[0]
+            if block_type == PCAPNG_SHB:
+                # 新的section, 重新确定字节序并清空接口表
+                endian = '<' if struct.unpack_from('<I', mm, pos + 8)[0] == PCAPNG_BYTE_ORDER_MAGIC else '>'
+                interfaces = []
+            block_type, block_len = struct.unpack_from(endian + 'II', mm, pos)
+            if block_len < 12 or pos + block_len > stop:
+                break
+
+            if block_type == PCAPNG_IDB:
+                linktype = struct.unpack_from(endian + 'H', mm, pos + 8)[0]
+                interfaces.append((linktype, _pcapng_tsresol(mm, endian, pos + 16, pos + block_len - 4)))
+            elif block_type == PCAPNG_EPB:
+                if_id, ts_hi, ts_lo, caplen, wirelen = struct.unpack_from(endian + 'IIIII', mm, pos + 8)
+                linktype, units_per_sec = interfaces[if_id]
+                offsets.append(pos + 28)
+                caplens.append(caplen)
+                wirelens.append(wirelen)
+                ts_list.append(((ts_hi << 32) | ts_lo) * 1_000_000_000 // units_per_sec)
+                links.append(linktype)
+            elif block_type == PCAPNG_SPB:
+                wirelen = struct.unpack_from(endian + 'I', mm, pos + 8)[0]
+                linktype = interfaces[0][0]
+                offsets.append(pos + 12)
+                caplens.append(min(wirelen, block_len - 16))
+                wirelens.append(wirelen)
+                ts_list.append(0)
+                links.append(linktype)
+            pos += block_len
+
+            if len(offsets) >= chunk_records:
+                yield flush()
+        if offsets:
+            yield flush()
+
+
+def _pcapng_tsresol(mm, endian: str, pos: int, end: int) -> int:
+    """解析IDB中的if_tsresol选项, 返回每秒的时间单位数"""
+    while pos + 4 <= end:
+        code, length = struct.unpack_from(endian + 'HH', mm, pos)
+        if code == 0:
+            break
+        if code == 9 and length >= 1:
+            res = mm[pos + 4]
+            if res & 0x80:
+                return 2 ** (res & 0x7F)
+            return 10 ** res
+        pos += 4 + ((length + 3) & ~3)
+    return 1_000_000
+
+
+def concat_index(chunks: Sequence[RecordIndex], end_offset: int) -> RecordIndex:
+    """合并多个记录索引块"""
+    if not chunks:
+        empty = np.empty(0, dtype=np.int64)
+        return RecordIndex(empty, empty.astype(np.uint32), empty.astype(np.uint32),
+                           empty, empty.astype(np.uint16), end_offset)
+    return RecordIndex(
+        *(np.concatenate([c[i] for c in chunks]) for i in range(5)),
+        end_offset=chunks[-1].end_offset,
+    )
+
+
+def _gather_be(buf: np.ndarray, offsets: np.ndarray, width: int, dtype=np.uint64) -> np.ndarray:
+    """从任意偏移读取width字节的大端(网络字节序)整数"""
+    size = np.dtype(dtype).itemsize
+    raw = np.zeros((len(offsets), size), dtype=np.uint8)
+    raw[:, size - width:] = buf[offsets[:, None] + np.arange(width)]
+    return raw.view(np.dtype(dtype).newbyteorder('>')).ravel().astype(dtype)
+
+
+def decode_chunk(buf: np.ndarray, index: RecordIndex, fields: Sequence[str] = DEFAULT_FIELDS) -> Dict[str, np.ndarray]:
+    """向量化解码一段以太网记录的头部字段; 返回各字段数组及IPv4/L4有效掩码"""
+    off = index.data_offset
+    caplen = index.caplen.astype(np.int64)
+    # 越界读取的位置统一指向0, 结果由掩码丢弃
+    safe = lambda pos, need: np.where(caplen >= need, off + pos, 0)
+
+    ethertype = _gather_be(buf, safe(12, ETH_HLEN), 2, np.uint16)
+    is_vlan = ethertype == ETHERTYPE_VLAN
+    if is_vlan.any():
+        inner = _gather_be(buf, safe(16, ETH_HLEN + VLAN_HLEN), 2, np.uint16)
+        ethertype = np.where(is_vlan, inner, ethertype)
+    l3 = np.where(is_vlan, ETH_HLEN + VLAN_HLEN, ETH_HLEN)
+
+    is_eth = index.linktype == LINKTYPE_ETHERNET
+    is_ipv4 = is_eth & (ethertype == ETHERTYPE_IPV4) & (caplen >= l3 + 20)
+    ver_ihl = buf[np.where(is_ipv4, off + l3, 0)]
+    is_ipv4 &= (ver_ihl >> 4) == 4
+    l4 = l3 + (ver_ihl & 0x0F).astype(np.int64) * 4
+    ip_proto = np.where(is_ipv4, buf[np.where(is_ipv4, off + l3 + 9, 0)], 0).astype(np.uint8)
+    has_ports = is_ipv4 & ((ip_proto == IPPROTO_UDP) | (ip_proto == IPPROTO_TCP)) & (caplen >= l4 + 4)
+
+    out = {'valid_ipv4': is_ipv4, 'valid_l4': has_ports}
+    ipv4_pos = np.where(is_ipv4, off + l3, 0)
+    l4_pos = np.where(has_ports, off + l4, 0)
+    if any(name in ('bth_opcode', 'dest_qp', 'psn') for name in fields):
+        # UDP负载起始处的BTH: opcode(1) flags(1) pkey(2) rsvd(1) destQP(3) A/rsvd(1) PSN(3)
+        has_bth = has_ports & (ip_proto == IPPROTO_UDP) & (caplen >= l4 + UDP_HLEN + BTH_LEN)
+        bth_pos = np.where(has_bth, off + l4 + UDP_HLEN, 0)
+        out['valid_bth'] = has_bth
+    for name in fields:
+        if name == 'ts_ns':
+            col = index.ts_ns
+        elif name == 'mac_ts':
+            col = _gather_be(buf, safe(6, 12), 6)
+        elif name == 'ethertype':
+            col = ethertype
+        elif name == 'ip_src':
+            col = _gather_be(buf, ipv4_pos + 12, 4, np.uint32)
+        elif name == 'ip_dst':
+            col = _gather_be(buf, ipv4_pos + 16, 4, np.uint32)
+        elif name == 'ip_proto':
+            col = ip_proto
+        elif name == 'sport':
+            col = _gather_be(buf, l4_pos, 2, np.uint16)
+        elif name == 'dport':
+            col = _gather_be(buf, l4_pos + 2, 2, np.uint16)
+        elif name == 'frame_len':
+            col = index.wirelen
+        elif name == 'bth_opcode':
+            col = np.where(has_bth, buf[bth_pos], 0)
+        elif name == 'dest_qp':
+            col = np.where(has_bth, _gather_be(buf, bth_pos + 5, 3, np.uint32), 0)
+        elif name == 'psn':
+            col = np.where(has_bth, _gather_be(buf, bth_pos + 9, 3, np.uint32), 0)
+        else:
+            raise KeyError(f"Unknown field: {name}")
+        out[name] = col.astype(FIELD_DTYPES[name], copy=False)
+    return out
+
+
+def filter_mask(cols: Dict[str, np.ndarray], src_ip: Optional[str] = None,
+                sport: Optional[int] = None) -> np.ndarray:
+    """源IP/UDP源端口过滤; sport不为空时要求为UDP包"""
+    mask = cols['valid_ipv4'].copy()
+    if src_ip is not None:
+        mask &= cols['ip_src'] == ip_to_int(src_ip)
+    if sport is not None:
+        mask &= cols['valid_l4'] & (cols['ip_proto'] == IPPROTO_UDP) & (cols['sport'] == sport)
+    return mask
+
+
+def iter_extract(pcap: PcapFile, src_ip: Optional[str] = None, sport: Optional[int] = None,
+                 fields: Sequence[str] = DEFAULT_FIELDS,
+                 chunk_records: int = DEFAULT_CHUNK_RECORDS,
+                 start: Optional[int] = None, stop: Optional[int] = None) -> Iterator[Dict[str, np.ndarray]]:
+    """逐块提取匹配记录的字段; 每块附带'_end_offset'用于进度显示"""
+    for index in pcap.iter_index(chunk_records, start, stop):
+        if not (index.linktype == LINKTYPE_ETHERNET).all():
+            raise UnsupportedLinkType(int(index.linktype[index.linktype != LINKTYPE_ETHERNET][0]))
+        # 先只解码过滤所需字段, 其余字段仅对匹配记录解码
+        cols = decode_chunk(pcap.buf, index, ('ip_src', 'ip_proto', 'sport'))
+        mask = filter_mask(cols, src_ip, sport)
+        matched = RecordIndex(*(col[mask] for col in index[:5]), end_offset=index.end_offset)
+        cols = decode_chunk(pcap.buf, matched, fields)
+        chunk = {name: cols[name] for name in fields}
+        chunk['_end_offset'] = index.end_offset
+        yield chunk
+
+
+def extract_packets(file_name: str, src_ip: Optional[str] = None, sport: Optional[int] = None,
+                    fields: Sequence[str] = DEFAULT_FIELDS, progress=None) -> Dict[str, np.ndarray]:
+    """提取匹配包的字段数组; progress(已处理字节数)用于进度回调"""
+    try:
+        with PcapFile(file_name) as pcap:
+            parts = []
+            for chunk in iter_extract(pcap, src_ip, sport, fields):
+                if progress is not None:
+                    progress(chunk.pop('_end_offset'))
+                parts.append(chunk)
+            return _concat_fields(parts, fields)
+    except UnsupportedLinkType:
+        return _extract_with_scapy(file_name, src_ip, sport, fields)
+
+
+class MacTimestampUnwrapper:
+    """把48位回绕计数展开为uint64时间线; 相邻样本的差按有符号48位解释, 可跨块延续"""
+
+    def __init__(self):
+        self.last_raw = None
+        self.last = None
+        self.wraps = 0
+
+    def __call__(self, raw: np.ndarray) -> np.ndarray:
+        raw = np.asarray(raw, dtype=np.uint64).astype(np.int64)
+        if len(raw) == 0:
+            return np.empty(0, dtype=np.uint64)
+        prev_raw = raw[0] if self.last_raw is None else self.last_raw
+        base = raw[0] if self.last is None else self.last
+        step = np.diff(raw, prepend=prev_raw)
+        # 差值落在 [-2^47, 2^47) 内: 向前跨过0记为回绕, 小的负差为乱序
+        delta = ((step + MAC_TS_HALF) & MAC_TS_MASK) - MAC_TS_HALF
+        self.wraps += int(((step < 0) & (delta > 0)).sum())
+        out = base + np.cumsum(delta)
+        self.last_raw, self.last = int(raw[-1]), int(out[-1])
+        return out.astype(np.uint64)
+
+
+class ReorderWindow:
+    """有界乱序窗口: 保留最近window个样本等待迟到的包, 只在出现乱序时对窗口和新块做自适应排序
+
+    out_of_order为晚于此前最大值到达的样本数, dropped为迟到超出窗口、无法归位而丢弃的样本数.
+    window为0时保持抓包顺序不变, 只计数.
+    """
+
+    def __init__(self, window: int = DEFAULT_REORDER_WINDOW):
+        self.window = window
+        self.carry = np.empty(0, dtype=np.uint64)
+        self.seen_max = None
+        self.released_max = None
+        self.out_of_order = 0
+        self.dropped = 0
+
+    def push(self, ts: np.ndarray) -> np.ndarray:
+        """加入一块按抓包顺序的时间戳, 返回已可确定顺序的部分"""
+        if len(ts) == 0:
+            return ts
+        running = np.maximum.accumulate(ts)
+        if self.seen_max is not None:
+            running = np.maximum(running, self.seen_max)
+        late = np.empty(len(ts), dtype=bool)
+        late[0] = self.seen_max is not None and ts[0] < self.seen_max
+        late[1:] = ts[1:] < running[:-1]
+        self.seen_max = running[-1]
+        n_late = int(late.sum())
+        self.out_of_order += n_late
+        if self.window == 0:
+            return ts
+
+        merged = np.concatenate([self.carry, ts])
+        if n_late:
+            # 近乎有序的数据上timsort接近线性
+            merged = np.sort(merged, kind='stable')
+            if self.released_max is not None:
+                keep = merged >= self.released_max
+                self.dropped += len(merged) - int(keep.sum())
+                merged = merged[keep]
+        cut = max(0, len(merged) - self.window)
+        self.carry = merged[cut:]
+        if cut:
+            self.released_max = merged[cut - 1]
+        return merged[:cut]
+
+    def flush(self) -> np.ndarray:
+        out, self.carry = self.carry, np.empty(0, dtype=np.uint64)
+        return out
+
+
+def _collect_timestamps(chunks, out: np.ndarray, reorder: ReorderWindow) -> np.ndarray:
+    """展开回绕并按乱序窗口归位后写入out; out可以与输入块共用内存 (写位置不超过已读位置)"""
+    unwrap = MacTimestampUnwrapper()
+    n = 0
+
+    def append(ts):
+        nonlocal out, n
+        if n + len(ts) > len(out):
+            out = np.resize(out, max(2 * len(out), n + len(ts)))
+        out[n:n + len(ts)] = ts
+        n += len(ts)
+
+    for raw in chunks:
+        append(reorder.push(unwrap(raw)))
+    append(reorder.flush())
+    return out[:n]
+
+
+def iter_mac_timestamps(file_name: str, src_ip: Optional[str] = None, sport: Optional[int] = None,
+                        reorder: Optional[ReorderWindow] = None,
+                        start: Optional[int] = None, stop: Optional[int] = None) -> Iterator[np.ndarray]:
+    """逐块产出按时间顺序的展开时间戳 (uint64), 内存只与块大小和乱序窗口有关"""
+    reorder = reorder if reorder is not None else ReorderWindow()
+    unwrap = MacTimestampUnwrapper()
+    try:
+        with PcapFile(file_name) as pcap:
+            for chunk in iter_extract(pcap, src_ip, sport, ('mac_ts',), start=start, stop=stop):
+                yield reorder.push(unwrap(chunk['mac_ts']))
+    except UnsupportedLinkType:
+        raw = _extract_with_scapy(file_name, src_ip, sport, ('mac_ts',))['mac_ts']
+        yield reorder.push(unwrap(raw))
+    yield reorder.flush()
+
+
+def extract_mac_timestamps(file_name: str, src_ip: Optional[str] = None, sport: Optional[int] = None,
+                           progress=None, workers: int = 1,
+                           reorder: Optional[ReorderWindow] = None) -> np.ndarray:
+    """按抓包顺序提取匹配包Ether src中的48位时间戳, 展开回绕为单调的uint64
+
+    乱序窗口内的迟到样本被归位, 计数见reorder.out_of_order / reorder.dropped;
+    传入ReorderWindow(0)则完全保持抓包顺序.
+    """
+    reorder = reorder if reorder is not None else ReorderWindow()
+    if workers > 1:
+        raw = extract_packets_parallel(file_name, src_ip, sport, ('mac_ts',), progress, workers)['mac_ts']
+        # 原地展开: 每块先被复制成新数组, 再写回不超过已读位置的区间
+        chunks = (raw[i:i + DEFAULT_CHUNK_RECORDS] for i in range(0, len(raw), DEFAULT_CHUNK_RECORDS))
+        return _collect_timestamps(chunks, raw, reorder)
+
+    # 结果缓冲区按最短记录预估上限一次分配; 未写入的页不会占用物理内存
+    out = np.empty(os.path.getsize(file_name) // MIN_IPV4_RECORD + 1, dtype=np.uint64)
+    try:
+        with PcapFile(file_name) as pcap:
+            def chunks():
+                for chunk in iter_extract(pcap, src_ip, sport, ('mac_ts',)):
+                    if progress is not None:
+                        progress(chunk['_end_offset'])
+                    yield chunk['mac_ts']
+
+            return _collect_timestamps(chunks(), out, reorder)
+    except UnsupportedLinkType:
+        raw = _extract_with_scapy(file_name, src_ip, sport, ('mac_ts',))['mac_ts']
+        return _collect_timestamps([raw], out, reorder)
+
+
+def _extract_range(file_name: str, start: int, stop: int, src_ip: Optional[str],
+                   sport: Optional[int], fields: Sequence[str]):
+    """进程池任务: 扫描[start, stop)内的记录, 返回字段数组和实际结束偏移"""
+    with PcapFile(file_name) as pcap:
+        parts = list(iter_extract(pcap, src_ip, sport, fields, start=start, stop=stop))
+    end_offset = parts[-1].pop('_end_offset') if parts else start
+    return _concat_fields(parts, fields), end_offset
+
+
+def _run_ranges(file_name: str, task, task_args: tuple, progress=None, workers: Optional[int] = None,
+                chunk_bytes: int = DEFAULT_CHUNK_BYTES):
+    """按记录边界把文件分段, 在进程池中对每段执行task(file_name, start, stop, *task_args)
+
+    task返回(结果, 实际结束偏移); 结果按抓包顺序返回. 无法分段或重同步有误时返回None, 由调用方回退串行.
+    """
+    with PcapFile(file_name) as pcap:
+        if pcap.format != 'pcap' or pcap.linktype != LINKTYPE_ETHERNET:
+            # pcapng无法从任意偏移重同步, 非以太网需走scapy, 均回退串行
+            return None
+        workers = workers or os.cpu_count()
+        # 每个进程至少分到几段, 便于负载均衡和进度显示
+        chunk_bytes = max(1 << 20, min(chunk_bytes, pcap.file_size // (workers * 4) + 1))
+        bounds = pcap.split(chunk_bytes)
+
+    results = [None] * (len(bounds) - 1)
+    done = bounds[0]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(task, file_name, bounds[i], bounds[i + 1], *task_args): i
+            for i in range(len(results))
+        }
+        for future in as_completed(futures):
+            i = futures[future]
+            results[i] = future.result()
+            done += bounds[i + 1] - bounds[i]
+            if progress is not None:
+                progress(done)
+
+    # 每段必须恰好扫描到下一段的起点, 否则说明重同步有误
+    if any(end != bounds[i + 1] for i, (_, end) in enumerate(results[:-1])):
+        return None
+    return [part for part, _ in results]
+
+
+def extract_packets_parallel(file_name: str, src_ip: Optional[str] = None, sport: Optional[int] = None,
+                             fields: Sequence[str] = DEFAULT_FIELDS, progress=None,
+                             workers: Optional[int] = None,
+                             chunk_bytes: int = DEFAULT_CHUNK_BYTES) -> Dict[str, np.ndarray]:
+    """多进程分段提取, 结果按抓包顺序合并, 与extract_packets输出一致"""
+    parts = _run_ranges(file_name, _extract_range, (src_ip, sport, fields), progress, workers, chunk_bytes)
+    if parts is None:
+        return extract_packets(file_name, src_ip, sport, fields, progress)
+    return _concat_fields(parts, fields)
+
+
+def decode_pfc(buf: np.ndarray, index: RecordIndex) -> Dict[str, np.ndarray]:
+    """向量化解码一段记录中的PFC帧 (以太类型0x8808, opcode 0x0101), 布局同struct pfc_header"""
+    ethertype = decode_chunk(buf, index, ('ethertype',))['ethertype']
+    sel = (index.linktype == LINKTYPE_ETHERNET) & (ethertype == ETHERTYPE_MAC_CONTROL)
+    # 带VLAN标签时MAC控制头后移4字节
+    l2 = np.where(_gather_be(buf, np.where(sel, index.data_offset + 12, 0), 2, np.uint16) == ETHERTYPE_VLAN,
+                  ETH_HLEN + VLAN_HLEN, ETH_HLEN)
+    sel &= index.caplen >= l2 + PFC_HLEN
+    pos = (index.data_offset + l2)[sel]
+    opcode = _gather_be(buf, pos, 2, np.uint16)
+    keep = opcode == PFC_OPCODE
+    pos = pos[keep]
+    # time[0..7]紧跟在opcode和pev之后, 均为网络字节序
+    quanta = _gather_be(buf, (pos[:, None] + 4 + 2 * np.arange(PFC_PRIORITIES)).ravel(), 2, np.uint16)
+    return {
+        'ts_ns': index.ts_ns[sel][keep],
+        'pev': _gather_be(buf, pos + 2, 2, np.uint16),
+        'quanta': quanta.reshape(-1, PFC_PRIORITIES),
+    }
+
+
+def _concat_pfc(parts) -> Dict[str, np.ndarray]:
+    if not parts:
+        return {'ts_ns': np.empty(0, dtype=np.int64), 'pev': np.empty(0, dtype=np.uint16),
+                'quanta': np.empty((0, PFC_PRIORITIES), dtype=np.uint16)}
+    return {name: np.concatenate([p[name] for p in parts]) for name in ('ts_ns', 'pev', 'quanta')}
+
+
+def _extract_pfc_range(file_name: str, start: Optional[int] = None, stop: Optional[int] = None,
+                       progress=None, chunk_records: int = DEFAULT_CHUNK_RECORDS):
+    parts = []
+    end_offset = start
+    with PcapFile(file_name) as pcap:
+        for index in pcap.iter_index(chunk_records, start, stop):
+            parts.append(decode_pfc(pcap.buf, index))
+            end_offset = index.end_offset
+            if progress is not None:
+                progress(end_offset)
+    return _concat_pfc(parts), end_offset
+
+
+def extract_pfc_frames(file_name: str, progress=None, workers: int = 1) -> Dict[str, np.ndarray]:
+    """提取抓包中所有PFC帧: 记录时间戳ts_ns, 优先级使能向量pev, 以及 (n, 8) 的各优先级quanta"""
+    if workers > 1:
+        parts = _run_ranges(file_name, _extract_pfc_range, (), progress, workers)
+        if parts is not None:
+            return _concat_pfc(parts)
+    return _extract_pfc_range(file_name, progress=progress)[0]
+
+
+def _concat_fields(parts, fields: Sequence[str]) -> Dict[str, np.ndarray]:
+    return {
+        name: np.concatenate([p[name] for p in parts]) if parts
+        else np.empty(0, dtype=FIELD_DTYPES[name])
+        for name in fields
+    }
+
+
+def _extract_with_scapy(file_name: str, src_ip: Optional[str], sport: Optional[int],
+                        fields: Sequence[str]) -> Dict[str, np.ndarray]:
+    """非以太网链路类型的回退路径, 逐包用scapy解析"""
+    from scapy.all import PcapReader, Ether, IP, UDP, TCP
+
+    rows = {name: [] for name in fields}
+    with PcapReader(file_name) as reader:
+        for packet in reader:
+            if not packet.haslayer(IP):
+                continue
+            ip = packet[IP]
+            if src_ip is not None and ip.src != src_ip:
+                continue
+            l4 = packet[UDP] if packet.haslayer(UDP) else packet[TCP] if packet.haslayer(TCP) else None
+            if sport is not None and (not packet.haslayer(UDP) or packet[UDP].sport != sport):
+                continue
+            bth = bytes(packet[UDP].payload)[:BTH_LEN] if packet.haslayer(UDP) else b''
+            if len(bth) < BTH_LEN:
+                bth = bytes(BTH_LEN)
+            values = {
+                'ts_ns': int(packet.time * 1_000_000_000),
+                'mac_ts': int(packet[Ether].src.replace(':', ''), 16) if packet.haslayer(Ether) else 0,
+                'ethertype': ETHERTYPE_IPV4,
+                'ip_src': ip_to_int(ip.src),
+                'ip_dst': ip_to_int(ip.dst),
+                'ip_proto': ip.proto,
+                'sport': l4.sport if l4 is not None else 0,
+                'dport': l4.dport if l4 is not None else 0,
+                'frame_len': packet.wirelen or len(packet),
+                'bth_opcode': bth[0],
+                'dest_qp': int.from_bytes(bth[5:8], 'big'),
+                'psn': int.from_bytes(bth[9:12], 'big'),
+            }
+            for name in fields:
+                rows[name].append(values[name])
+    return {name: np.array(rows[name], dtype=FIELD_DTYPES[name]) for name in fields}
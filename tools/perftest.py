@@ -1,86 +1,101 @@
+import argparse
+import itertools
+import logging
 import os
-import subprocess
-import time
-import socket
+import sys
 from datetime import datetime
 
+from perftest_runner import PerftestPair, PerftestRunner
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
 # 设置参数
-MAX_RESTARTS = 30
-REPEAT_COUNT = 10000  # -n 参数的值
-PACKET_SIZE = 65536
-restart_count = 0
-
-# 文件名参数
-ft_value = 0  # 可以根据需要修改
-thre_value = 0  # 可以根据需要修改
-version = "v3"  # 可以根据需要修改
-
-
-RESOURCES_DIR = "./resources/prototype/" +version 
-FILENAME = f"prototype_ft_{ft_value}_thre_{thre_value}_{version}.log"
-LOG_FILE = os.path.join(RESOURCES_DIR, FILENAME)  
-MODE = "ib_send_lat"
-wait_time = None
-
-# 获取主机名
-hostname = socket.gethostname()
-
-# 创建resources目录（如果不存在）  
-os.makedirs(RESOURCES_DIR, exist_ok=True)  
-
-# 删除已存在的日志文件并创建新的
-if os.path.exists(LOG_FILE):
-    os.remove(LOG_FILE)
-open(LOG_FILE, 'a').close()
-
-print(f"Starting application monitor... Maximum restarts: {MAX_RESTARTS}")
-print(f"Current hostname: {hostname}")
-print(f"Log file: {LOG_FILE}")
-
-while restart_count < MAX_RESTARTS:
-    # 根据主机名构建不同的命令
-    if hostname == "FNIL-2022DEC-GPU-7":
-        cmd = ["sudo", MODE, "-d", "mlx5_1", "-n", str(REPEAT_COUNT),"-s", str(PACKET_SIZE)]
-        wait_time = 1
-
-    elif hostname == "FNIL-2022DEC-GPU-8":
-        cmd = ["sudo", MODE, "10.10.10.4", "-n", str(REPEAT_COUNT),"-s", str(PACKET_SIZE)]
-        wait_time = 3
-    else:
-        message = f"Unsupported hostname: {hostname}"
-        print(message)
-        with open(LOG_FILE, 'a') as log:
-            log.write(message + '\n')
-        break
-    
-    # 打开日志文件以追加模式
-    with open(LOG_FILE, 'a') as log:
-        # 记录当前执行的命令
-        log.write(f"\nExecuting command: {' '.join(cmd)} at {datetime.now()}\n")
-        
-        # 运行命令并重定向输出到日志文件
-        process = subprocess.run(
-            cmd,
-            stdout=log,
-            stderr=subprocess.STDOUT,
-            text=True
+MAX_RESTARTS = 30      # 每组参数的重复次数
+RUN_TIMEOUT = 120      # 单次运行超时 (s)
+
+# 参数网格: 命令模板中的 {size} {iterations} {mode} 以及日志文件名中的 ft/thre/version
+PARAM_GRID = {
+    'ft': [0],
+    'thre': [0],
+    'version': ['v3'],
+    'mode': ['ib_send_lat'],
+    'size': [65536],
+    'iterations': [10000],
+}
+
+RESOURCES_DIR = "./resources/prototype/"
+LOG_TEMPLATE = os.path.join(RESOURCES_DIR, "{version}", "prototype_ft_{ft}_thre_{thre}_{version}.log")
+
+# 独立的client/server对; 配置多对时并发运行
+SERVER_HOST = "FNIL-2022DEC-GPU-7"
+# --apply-params 时每次运行前通过遥测socket切换数据面参数, 无需重启数据面;
+# 切换失败 (数据面未运行、参数被拒绝、sudo需要密码) 的运行记为失败, 不写入日志.
+# 默认不切换, ft/thre 只作为日志文件名中的标签
+DATAPLANE_SETUP = ['sudo', '-n', sys.executable,
+                   os.path.join(os.path.dirname(os.path.abspath(__file__)), 'telemetry_view.py'),
+                   '--set', 'flowlet_timeout={ft},time_gap={thre}']
+
+
+# 超时后结束远端残留的server; 退出码为0表示已没有同名进程
+SERVER_CLEANUP = ['ssh', SERVER_HOST, 'sudo pkill -KILL -x {mode}; sleep 0.5; ! pgrep -x {mode}']
+
+
+def testbed_pairs(apply_params: bool = False):
+    return [
+        PerftestPair(
+            name='gpu7-gpu8',
+            server_cmd=['ssh', SERVER_HOST, 'sudo', '{mode}', '-d', 'mlx5_1', '-n', '{iterations}', '-s', '{size}'],
+            client_cmd=['sudo', '{mode}', '10.10.10.4', '-n', '{iterations}', '-s', '{size}'],
+            setup_cmd=DATAPLANE_SETUP if apply_params else None,
+            server_cleanup_cmd=SERVER_CLEANUP,
+        ),
+    ]
+
+
+def stand_in_pairs(count: int):
+    """本地替身对, 用 fake_perftest.py 代替 ib_send_* 测试运行器"""
+    fake = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_perftest.py')
+    return [
+        PerftestPair(
+            name=f'stand-in-{i}',
+            server_cmd=[sys.executable, fake, '-n', '{iterations}', '-s', '{size}'],
+            client_cmd=[sys.executable, fake, '127.0.0.1', '-n', '{iterations}', '-s', '{size}'],
         )
-    
-    # 增加重启计数
-    restart_count += 1
-    
-    # 如果达到最大重启次数，退出循环
-    if restart_count == MAX_RESTARTS:
-        message = f"Maximum restart count ({MAX_RESTARTS}) reached at {datetime.now()}. Stopping monitor..."
-        print(message)
-        with open(LOG_FILE, 'a') as log:
-            log.write(message + '\n')
-        break
-    
-    # 应用退出后，输出重启信息到日志
-    message = f"Application exited at {datetime.now()}. Restart count: {restart_count}/{MAX_RESTARTS}. Waiting {wait_time} second before restart..."
-    print(message)
-    with open(LOG_FILE, 'a') as log:
-        log.write(message + '\n')
-    
-    time.sleep(wait_time)
\ No newline at end of file
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run perftest over a parameter grid')
+    parser.add_argument('--stand-in', type=int, default=0, metavar='N',
+                        help='run against N local fake_perftest.py pairs instead of the testbed')
+    parser.add_argument('--repeat', type=int, default=MAX_RESTARTS)
+    parser.add_argument('--timeout', type=float, default=RUN_TIMEOUT)
+    parser.add_argument('--apply-params', action='store_true',
+                        help='push each run\'s ft/thre to the live dataplane before it starts (single pair only)')
+    args = parser.parse_args()
+
+    pairs = stand_in_pairs(args.stand_in) if args.stand_in else testbed_pairs(args.apply_params)
+    results_file = os.path.join(RESOURCES_DIR, f"perftest_results_{datetime.now():%Y%m%d_%H%M%S}.npz")
+
+    # 删除本次网格对应的旧日志
+    for values in itertools.product(*PARAM_GRID.values()):
+        log_file = LOG_TEMPLATE.format(**dict(zip(PARAM_GRID, values)))
+        if os.path.exists(log_file):
+            os.remove(log_file)
+
+    print(f"Starting perftest runner... Repeats per setting: {args.repeat}")
+    print(f"Pairs: {', '.join(p.name for p in pairs)}")
+    print(f"Results file: {results_file}")
+
+    runner = PerftestRunner(pairs, results_file, timeout=args.timeout, log_template=LOG_TEMPLATE)
+    rows = runner.run(PARAM_GRID, repeat=args.repeat)
+    failed = sum(row['status'] != 'ok' for row in rows)
+    print(f"Finished {len(rows)} result rows, {failed} failed. Results saved to {results_file}")
+
+
+if __name__ == '__main__':
+    main()
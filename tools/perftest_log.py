@@ -0,0 +1,188 @@
+import glob
+import hashlib
+import json
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+# perftest结果表头, 例如:
+#  #bytes #iterations    t_min[usec] ... 99% percentile[usec]   99.9% percentile[usec]
+#  #bytes     #iterations    BW peak[MB/sec]    BW average[MB/sec]   MsgRate[Mpps]
+HEADER_RE = re.compile(r'^\s*#bytes\b')
+COLUMN_RE = re.compile(r'#\w+|(?:BW\s+|[\d.]+%\s+)?[A-Za-z_]+(?:\[[^\]]*\])?')
+ROW_RE = re.compile(r'^\s*\d+\s+\d+(?:\s+[-+\d.eE]+)+\s*$')
+
+
+def normalize_column(name: str) -> str:
+    """表头列名规范化: 去掉单位, '99.9% percentile' -> 'p99.9', 'BW average' -> 'bw_average'"""
+    name = re.sub(r'\[[^\]]*\]', '', name).strip().lstrip('#')
+    m = re.match(r'([\d.]+)%\s+percentile', name)
+    if m:
+        return 'p' + m.group(1)
+    return re.sub(r'\s+', '_', name).lower()
+
+
+def parse_header(line: str) -> List[str]:
+    return [normalize_column(c) for c in COLUMN_RE.findall(line)]
+
+
+class PerftestParser:
+    """逐行解析perftest输出, 按最近一次出现的表头把数据行解析为字典"""
+
+    def __init__(self):
+        self.columns: Optional[List[str]] = None
+
+    def feed(self, line: str) -> Optional[Dict[str, float]]:
+        if HEADER_RE.match(line):
+            self.columns = parse_header(line)
+            return None
+        if self.columns is None or not ROW_RE.match(line):
+            return None
+        values = line.split()
+        if len(values) != len(self.columns):
+            return None
+        return dict(zip(self.columns, map(float, values)))
+
+
+# ---------------------------------------------------------------------------
+# 增量日志导入
+# ---------------------------------------------------------------------------
+
+EXEC_RE = re.compile(r'^\s*Executing command:')
+LOG_NAME_RE = re.compile(r'prototype_ft_(?P<ft>-?\d+)_thre_(?P<thre>-?\d+)_(?P<version>\w+)\.log$')
+INGEST_DIR = './cache/perftest'
+# 检查点记录偏移前这么多字节的摘要, 用于识别日志被重写
+CHECKPOINT_TAIL = 256
+
+
+def rows_to_table(rows: List[Dict[str, float]]) -> Dict[str, np.ndarray]:
+    """行字典列表转换为列数组, 缺失值为nan"""
+    columns = list(dict.fromkeys(k for row in rows for k in row))
+    return {name: np.array([row.get(name, np.nan) for row in rows], dtype=np.float64) for name in columns}
+
+
+def concat_tables(tables: Sequence[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """按列拼接多个表, 列取并集, 缺失部分填nan (字符串列填空串)"""
+    tables = [t for t in tables if t and len(next(iter(t.values())))]
+    columns = list(dict.fromkeys(k for t in tables for k in t))
+    out = {}
+    for name in columns:
+        parts = []
+        for t in tables:
+            n = len(next(iter(t.values())))
+            if name in t:
+                parts.append(t[name])
+            elif any(t2.get(name) is not None and t2[name].dtype.kind == 'U' for t2 in tables):
+                parts.append(np.full(n, ''))
+            else:
+                parts.append(np.full(n, np.nan))
+        out[name] = np.concatenate(parts)
+    return out
+
+
+def table_len(table: Dict[str, np.ndarray]) -> int:
+    return len(next(iter(table.values()))) if table else 0
+
+
+class LogIngestor:
+    """perftest日志的增量解析: 每个日志保存字节偏移检查点, 日志增长后只解析新增部分"""
+
+    def __init__(self, state_dir: str = INGEST_DIR):
+        self.state_dir = state_dir
+        os.makedirs(state_dir, exist_ok=True)
+
+    def _state_file(self, log_file: str) -> str:
+        digest = hashlib.blake2b(os.path.abspath(log_file).encode(), digest_size=8).hexdigest()
+        return os.path.join(self.state_dir, f'{os.path.basename(log_file)}.{digest}.npz')
+
+    def _load_state(self, log_file: str):
+        try:
+            with np.load(self._state_file(log_file)) as npz:
+                meta = json.loads(str(npz['__meta__']))
+                table = {name: npz[name] for name in npz.files if name != '__meta__'}
+            return meta, table
+        except (FileNotFoundError, KeyError, ValueError):
+            return None, {}
+
+    def _save_state(self, log_file: str, meta: Dict, table: Dict[str, np.ndarray]):
+        path = self._state_file(log_file)
+        fd, tmp = tempfile.mkstemp(dir=self.state_dir, prefix='.tmp_', suffix='.npz')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, __meta__=json.dumps(meta), **table)
+        os.replace(tmp, path)
+
+    def ingest(self, log_file: str) -> Dict[str, np.ndarray]:
+        """返回日志中所有结果行的列数组; 'run'列为所属的第几次运行"""
+        meta, table = self._load_state(log_file)
+        size = os.path.getsize(log_file)
+        with open(log_file, 'rb') as f:
+            if meta is not None and not self._checkpoint_valid(f, meta, size):
+                meta, table = None, {}
+            if meta is None:
+                meta = {'offset': 0, 'columns': None, 'run': -1, 'tail': ''}
+            if meta['offset'] == size:
+                return table
+
+            f.seek(meta['offset'])
+            data = f.read(size - meta['offset'])
+            # 只处理到最后一个完整行, 未写完的行留到下次
+            end = data.rfind(b'\n') + 1
+            if end == 0:
+                return table
+            parser = PerftestParser()
+            parser.columns = meta['columns']
+            run = meta['run']
+            rows = []
+            for line in data[:end].decode(errors='replace').splitlines():
+                if EXEC_RE.match(line):
+                    run += 1
+                    continue
+                row = parser.feed(line)
+                if row is not None:
+                    row['run'] = max(run, 0)
+                    rows.append(row)
+
+            offset = meta['offset'] + end
+            f.seek(max(0, offset - CHECKPOINT_TAIL))
+            tail = hashlib.blake2b(f.read(offset - max(0, offset - CHECKPOINT_TAIL))).hexdigest()
+
+        table = concat_tables([table, rows_to_table(rows)])
+        meta = {'offset': offset, 'columns': parser.columns, 'run': run, 'tail': tail}
+        self._save_state(log_file, meta, table)
+        return table
+
+    @staticmethod
+    def _checkpoint_valid(f, meta: Dict, size: int) -> bool:
+        """日志被截断或重写时检查点作废"""
+        offset = meta['offset']
+        if offset > size:
+            return False
+        f.seek(max(0, offset - CHECKPOINT_TAIL))
+        tail = hashlib.blake2b(f.read(offset - max(0, offset - CHECKPOINT_TAIL))).hexdigest()
+        return tail == meta['tail']
+
+
+def _ingest_one(args):
+    state_dir, log_file = args
+    table = LogIngestor(state_dir).ingest(log_file)
+    m = LOG_NAME_RE.search(os.path.basename(log_file))
+    n = table_len(table)
+    if m and n:
+        table['ft'] = np.full(n, float(m.group('ft')))
+        table['thre'] = np.full(n, float(m.group('thre')))
+        table['version'] = np.full(n, m.group('version'))
+    return table
+
+
+def ingest_tree(root: str, state_dir: str = INGEST_DIR, workers: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """并行增量导入目录树下所有 prototype_ft_*_thre_*.log, 合并为一张列式表"""
+    log_files = sorted(glob.glob(os.path.join(root, '**', 'prototype_ft_*_thre_*.log'), recursive=True))
+    if not log_files:
+        return {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        tables = list(pool.map(_ingest_one, [(state_dir, f) for f in log_files]))
+    return concat_tables(tables)
@@ -0,0 +1,236 @@
+import asyncio
+import itertools
+import logging
+import os
+import re
+import signal
+import tempfile
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from perftest_log import PerftestParser
+
+logger = logging.getLogger(__name__)
+
+
+class PerftestPair(NamedTuple):
+    """一对独立的client/server; 命令为模板, 用运行参数格式化, 如 '-s {size}'"""
+    name: str
+    client_cmd: Sequence[str]
+    server_cmd: Optional[Sequence[str]] = None
+    # server输出匹配该模式即认为就绪, 最多等待server_timeout秒
+    ready_pattern: str = r'Waiting for client'
+    server_timeout: float = 5.0
+    # 每次运行前执行的命令模板 (如切换数据面参数), 可为空; 失败时该次运行记为失败且不写日志.
+    # 它通常修改全局状态, 因此只允许单个pair使用
+    setup_cmd: Optional[Sequence[str]] = None
+    # server需被强制结束时执行的清理命令模板, 退出码为0表示server已不存在.
+    # 经ssh启动的远端server不会随本地ssh进程结束, 残留的server占着端口, 之后的client会连到它
+    server_cleanup_cmd: Optional[Sequence[str]] = None
+
+
+class RunSpec(NamedTuple):
+    run_id: int
+    params: Dict
+
+
+def expand_grid(grid: Dict[str, Sequence], repeat: int = 1) -> List[RunSpec]:
+    """参数网格展开为运行列表, 每组参数重复repeat次"""
+    names = list(grid)
+    specs = []
+    for values in itertools.product(*(grid[n] for n in names)):
+        for r in range(repeat):
+            specs.append(RunSpec(len(specs), dict(zip(names, values), repeat=r)))
+    return specs
+
+
+def write_columns(path: str, rows: List[Dict]):
+    """把结果行按列写入npz文件; 缺失的数值为nan, 缺失的字符串为空串; 原子替换"""
+    columns = list(dict.fromkeys(k for row in rows for k in row))
+    arrays = {}
+    for name in columns:
+        values = [row.get(name) for row in rows]
+        if all(v is None or isinstance(v, (int, float, np.integer, np.floating)) for v in values):
+            arrays[name] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+        else:
+            arrays[name] = np.array(['' if v is None else str(v) for v in values])
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.tmp_', suffix='.npz')
+    with os.fdopen(fd, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, path)
+
+
+class PerftestRunner:
+    """按参数网格执行perftest: 各client/server对并发, 同一对内顺序执行; 输出逐行流式解析"""
+
+    def __init__(self, pairs: Sequence[PerftestPair], results_file: str,
+                 timeout: float = 120.0, log_template: Optional[str] = None):
+        self.pairs = list(pairs)
+        if len(self.pairs) > 1 and any(pair.setup_cmd for pair in self.pairs):
+            # setup会在其他pair运行中途修改共享的数据面参数
+            raise ValueError("setup_cmd changes shared dataplane state and cannot be used with more than one pair")
+        self.results_file = results_file
+        self.timeout = timeout
+        # 原始输出按参数追加到日志, 兼容 BandwidthAnalyzer 读取的 prototype_ft_*_thre_* 日志
+        self.log_template = log_template
+        self.rows: List[Dict] = []
+        # 远端server清理失败的pair, 不再继续运行
+        self.stale_pairs = set()
+
+    def run(self, grid: Dict[str, Sequence], repeat: int = 1) -> List[Dict]:
+        return asyncio.run(self.run_grid(grid, repeat))
+
+    async def run_grid(self, grid: Dict[str, Sequence], repeat: int = 1) -> List[Dict]:
+        queue: asyncio.Queue = asyncio.Queue()
+        for spec in expand_grid(grid, repeat):
+            queue.put_nowait(spec)
+        logger.info(f"Running {queue.qsize()} runs on {len(self.pairs)} pair(s)")
+        await asyncio.gather(*(self._pair_worker(pair, queue) for pair in self.pairs))
+        self.rows.sort(key=lambda row: row['run_id'])
+        write_columns(self.results_file, self.rows)
+        return self.rows
+
+    async def _pair_worker(self, pair: PerftestPair, queue: asyncio.Queue):
+        while True:
+            try:
+                spec = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            rows = await self.run_one(pair, spec)
+            self.rows.extend(rows)
+            # 每次运行后刷新结果文件, 中断的扫描也保留已完成部分
+            write_columns(self.results_file, sorted(self.rows, key=lambda row: row['run_id']))
+            if pair.name in self.stale_pairs:
+                logger.error(f"Stopping {pair.name}: its server may still be running, "
+                             f"later runs would connect to it with the wrong parameters")
+                return
+
+    async def run_one(self, pair: PerftestPair, spec: RunSpec) -> List[Dict]:
+        params = spec.params
+        base = {'run_id': spec.run_id, 'pair': pair.name, **params}
+        log_lines = [f"\nExecuting command: {' '.join(_format(pair.client_cmd, params))} at {datetime.now()}\n"]
+        rows: List[Dict] = []
+        status = 'ok'
+
+        if pair.setup_cmd:
+            setup = await _spawn(_format(pair.setup_cmd, params))
+            try:
+                output, _ = await asyncio.wait_for(setup.communicate(), self.timeout)
+            except asyncio.TimeoutError:
+                _kill(setup)
+                await setup.wait()
+                output = b''
+            if setup.returncode != 0:
+                # 参数未生效, 不能把结果记到该参数的日志下
+                status = f'setup exit {setup.returncode}'
+                logger.warning(f"Run {spec.run_id} on {pair.name}: setup failed ({setup.returncode}), "
+                               f"skipping: {output.decode(errors='replace').strip()}")
+                return [{**base, 'status': status}]
+
+        server = None
+        server_drain = None
+        if pair.server_cmd:
+            server = await _spawn(_format(pair.server_cmd, params))
+            server_drain = await _wait_ready(server, pair.ready_pattern, pair.server_timeout)
+
+        client = await _spawn(_format(pair.client_cmd, params))
+        parser = PerftestParser()
+
+        async def consume():
+            async for raw in client.stdout:
+                line = raw.decode(errors='replace')
+                log_lines.append(line)
+                row = parser.feed(line)
+                if row is not None:
+                    rows.append({**base, **row})
+            await client.wait()
+
+        try:
+            await asyncio.wait_for(consume(), self.timeout)
+        except asyncio.TimeoutError:
+            status = 'timeout'
+            _kill(client)
+            await client.wait()
+            logger.warning(f"Run {spec.run_id} on {pair.name} timed out after {self.timeout}s")
+        finally:
+            killed = False
+            if server is not None:
+                if server.returncode is None:
+                    _kill(server)
+                    killed = True
+                await server.wait()
+                server_drain.cancel()
+
+        if killed and pair.server_cleanup_cmd:
+            # 本地只结束了ssh, 远端server需显式清理
+            cleanup = await _spawn(_format(pair.server_cleanup_cmd, params))
+            try:
+                output, _ = await asyncio.wait_for(cleanup.communicate(), self.timeout)
+            except asyncio.TimeoutError:
+                _kill(cleanup)
+                await cleanup.wait()
+                output = b''
+            if cleanup.returncode != 0:
+                status = f'{status}, server cleanup exit {cleanup.returncode}'
+                self.stale_pairs.add(pair.name)
+                logger.warning(f"Run {spec.run_id} on {pair.name}: server cleanup failed ({cleanup.returncode}): "
+                               f"{output.decode(errors='replace').strip()}")
+
+        if status == 'ok' and client.returncode != 0:
+            status = f'exit {client.returncode}'
+        if not rows:
+            rows.append(dict(base))
+        for row in rows:
+            row['status'] = status
+        self._write_log(params, log_lines)
+        logger.info(f"Run {spec.run_id} on {pair.name} {params}: {status}, {len(rows)} row(s)")
+        return rows
+
+    def _write_log(self, params: Dict, lines: List[str]):
+        if self.log_template is None:
+            return
+        path = self.log_template.format(**params)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # 一次写入整个运行的输出, 并发运行之间不会交错
+        with open(path, 'a') as log:
+            log.write(''.join(lines))
+
+
+def _format(template: Sequence[str], params: Dict) -> List[str]:
+    return [token.format(**params) for token in template]
+
+
+async def _spawn(cmd: List[str]) -> asyncio.subprocess.Process:
+    # 独立进程组, 超时时可连同sudo派生的子进程一起终止
+    return await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+        start_new_session=True)
+
+
+def _kill(proc: asyncio.subprocess.Process):
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+async def _wait_ready(server: asyncio.subprocess.Process, pattern: str, timeout: float) -> asyncio.Task:
+    """等待server输出就绪提示而不是固定sleep; 之后持续读取其输出防止管道阻塞"""
+    ready = asyncio.Event()
+    regex = re.compile(pattern)
+
+    async def drain():
+        async for raw in server.stdout:
+            if regex.search(raw.decode(errors='replace')):
+                ready.set()
+        ready.set()
+
+    task = asyncio.ensure_future(drain())
+    try:
+        await asyncio.wait_for(ready.wait(), timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Server not ready after {timeout}s, starting client anyway")
+    return task
@@ -0,0 +1,126 @@
+import argparse
+import logging
+import os
+from typing import Dict, Optional
+
+import numpy as np
+
+from analysis_cache import AnalysisCache
+from flowlet_replay import QUANTA_DURATION_NS
+from pcap_reader import PFC_PRIORITIES, extract_pfc_frames
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# 覆盖率和发送速率的默认统计窗口 (ns)
+WINDOW_NS = 100_000
+
+
+def load_pfc_frames(pcap_file: str, workers: int = 1, cache: Optional[AnalysisCache] = None) -> Dict[str, np.ndarray]:
+    """按抓包指纹缓存的PFC帧解码结果"""
+    cache = cache or AnalysisCache()
+    return cache.get_or_compute(pcap_file, 'pfc_frames', lambda: extract_pfc_frames(pcap_file, workers=workers))
+
+
+def pause_intervals(frames: Dict[str, np.ndarray], prio: int,
+                    quanta_ns: float = QUANTA_DURATION_NS) -> Dict[str, np.ndarray]:
+    """单个优先级的暂停区间
+
+    每个使能该优先级的帧从其时间戳起暂停 quanta * quanta_ns; 后一帧到达时重置计时器,
+    因此有效区间截止于 min(本帧结束, 下一帧到达). overlap为前一帧在下一帧到达时仍剩余的暂停时长.
+    """
+    enabled = (frames['pev'] >> prio) & 1 == 1
+    start = frames['ts_ns'][enabled].astype(np.int64)
+    order = np.argsort(start, kind='stable')
+    start = start[order]
+    length = frames['quanta'][enabled, prio][order].astype(np.float64) * quanta_ns
+    end = start + length
+    next_start = np.append(start[1:], np.iinfo(np.int64).max).astype(np.float64)
+    return {
+        'start': start,
+        'end': np.minimum(end, next_start),
+        'requested_ns': length,
+        'overlap_ns': np.maximum(end[:-1] - start[1:], 0),
+    }
+
+
+def covered_before(intervals: Dict[str, np.ndarray], t: np.ndarray) -> np.ndarray:
+    """[0, t) 内被暂停覆盖的总时长; 有效区间互不重叠且按起点有序"""
+    start, end = intervals['start'], intervals['end']
+    if len(start) == 0:
+        return np.zeros(len(t))
+    length = end - start
+    cum = np.concatenate([[0.0], np.cumsum(length)])
+    # 起点不晚于t的区间数; 其中最后一个可能只覆盖到一部分
+    k = np.searchsorted(start, t, side='right')
+    last = np.maximum(k - 1, 0)
+    part = np.where(k > 0, np.clip(t - start[last], 0, length[last]), 0)
+    return cum[last] + part
+
+
+def analyze(frames: Dict[str, np.ndarray], window_ns: int = WINDOW_NS,
+            quanta_ns: float = QUANTA_DURATION_NS) -> Dict[str, np.ndarray]:
+    """按窗口统计各优先级的暂停覆盖率、PFC发送速率, 以及相邻暂停的重叠"""
+    ts = frames['ts_ns'].astype(np.int64)
+    if len(ts) == 0:
+        return {'edges': np.zeros(1, dtype=np.int64), 'rate': np.zeros(0), 'coverage': np.zeros((PFC_PRIORITIES, 0)),
+                'frames': np.zeros(PFC_PRIORITIES, dtype=np.int64), 'pause_ns': np.zeros(PFC_PRIORITIES),
+                'overlaps': np.zeros(PFC_PRIORITIES, dtype=np.int64), 'overlap_ns': np.zeros(PFC_PRIORITIES)}
+    t0 = int(ts.min())
+    n_windows = int(ts.max() - t0) // window_ns + 1
+    edges = t0 + window_ns * np.arange(n_windows + 1, dtype=np.int64)
+    # 每个窗口的PFC帧数, 换算为每秒帧数
+    rate = np.bincount((ts - t0) // window_ns, minlength=n_windows) * (1e9 / window_ns)
+
+    coverage = np.zeros((PFC_PRIORITIES, n_windows))
+    counts = np.zeros(PFC_PRIORITIES, dtype=np.int64)
+    pause_ns = np.zeros(PFC_PRIORITIES)
+    overlaps = np.zeros(PFC_PRIORITIES, dtype=np.int64)
+    overlap_ns = np.zeros(PFC_PRIORITIES)
+    for prio in range(PFC_PRIORITIES):
+        iv = pause_intervals(frames, prio, quanta_ns)
+        counts[prio] = len(iv['start'])
+        if not counts[prio]:
+            continue
+        coverage[prio] = np.diff(covered_before(iv, edges.astype(np.float64))) / window_ns
+        pause_ns[prio] = float((iv['end'] - iv['start']).sum())
+        overlaps[prio] = int((iv['overlap_ns'] > 0).sum())
+        overlap_ns[prio] = float(iv['overlap_ns'].sum())
+    return {'edges': edges, 'rate': rate, 'coverage': coverage, 'frames': counts,
+            'pause_ns': pause_ns, 'overlaps': overlaps, 'overlap_ns': overlap_ns}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Decode PFC pause frames from a capture and report pause coverage')
+    parser.add_argument('pcap')
+    parser.add_argument('--window-us', type=float, default=WINDOW_NS / 1000, help='coverage/rate window')
+    parser.add_argument('--quanta-ns', type=float, default=QUANTA_DURATION_NS, help='duration of one pause quantum')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--output', help='save the per-window series to this .npz file')
+    args = parser.parse_args()
+
+    frames = load_pfc_frames(args.pcap, args.workers)
+    logger.info(f"Decoded {len(frames['ts_ns']):,} PFC frames from {args.pcap}")
+    result = analyze(frames, int(args.window_us * 1000), args.quanta_ns)
+    span_ns = int(result['edges'][-1] - result['edges'][0])
+
+    print(f"{'prio':>4} {'frames':>10} {'pause_ms':>10} {'coverage':>9} {'peak_cov':>9} {'overlaps':>9} {'overlap_ms':>10}")
+    for prio in range(PFC_PRIORITIES):
+        if not result['frames'][prio]:
+            continue
+        print(f"{prio:>4} {result['frames'][prio]:>10} {result['pause_ns'][prio] / 1e6:>10.3f} "
+              f"{result['pause_ns'][prio] / span_ns if span_ns else 0:>9.2%} {result['coverage'][prio].max():>9.2%} "
+              f"{result['overlaps'][prio]:>9} {result['overlap_ns'][prio] / 1e6:>10.3f}")
+    if len(result['rate']):
+        print(f"PFC rate: mean {result['rate'].mean():,.0f}/s, peak {result['rate'].max():,.0f}/s "
+              f"over {len(result['rate'])} windows of {args.window_us:g} us")
+    if args.output:
+        np.savez(args.output, **result)
+        logger.info(f"Saved per-window series to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,31 +1,43 @@
-from scapy.all import rdpcap,IP,TCP
 import numpy as np
-import matplotlib.pyplot as plt
+from pcap_reader import DEFAULT_REORDER_WINDOW, ReorderWindow, extract_mac_timestamps
+from analysis_cache import AnalysisCache
+from gap_stats import GapStats, scan_gap_stats
 source_ip = '10.10.10.2'
 file_name = './resources/timegap.pcap'
+max_gap = 10000    # 10us
+cache = AnalysisCache()
 
 
 def extract_ethernet_src_address(pcap_file):
-    # 读取PCAP文件  
-    packets = rdpcap(pcap_file)
-    print(f"Read over packets: {len(packets)}")
-
-    # 创建一个集合以存储唯一的以太网源地址  
-    src_addresses = []
-
-    # 遍历每一个数据包  
-    for packet in packets:
-        # 检查数据包是否包含以太网层  
-        if packet.haslayer(IP) and packet[IP].src==source_ip and packet.haslayer('Ether'):
-            src = packet['Ether'].src
-            src_addresses.append(int(src.replace(':',''),16))
-
-    return sorted(src_addresses)
-
-def cal_diff(data):
-    diff= np.diff(data)
-    
-    return diff[diff<10000]    # 10us
+    # 以mmap方式读取PCAP文件, 按抓包顺序提取源IP匹配的包的以太网源地址(时间戳), 回绕已展开
+    def extract():
+        reorder = ReorderWindow()
+        src_addresses = extract_mac_timestamps(pcap_file, src_ip=source_ip, reorder=reorder)
+        print(f"Read over, matched packets: {len(src_addresses)}, "
+              f"out of order: {reorder.out_of_order}, dropped: {reorder.dropped}")
+        return src_addresses
+
+    return cache.get_or_compute(pcap_file, 'mac_ts', extract, source_ip=source_ip,
+                                reorder_window=DEFAULT_REORDER_WINDOW)
+
+def cal_gap_stats(pcap_file):
+    # 边读边统计间隔, 不再生成完整的差分数组; max_gap以内的间隔另按值精确计数
+    return GapStats.from_arrays(cache.get_or_compute(
+        pcap_file, 'gap_stats',
+        lambda: scan_gap_stats(pcap_file, src_ip=source_ip, exact_below=max_gap).to_arrays(),
+        source_ip=source_ip, reorder_window=DEFAULT_REORDER_WINDOW, exact_below=max_gap))
+
+def load_histogram(pcap_file):
+    # 直方图及其所需的间隔统计均按抓包指纹缓存
+    def compute():
+        stats = cal_gap_stats(pcap_file)
+        print(f"p50 {stats.quantile(0.5):.0f} ns, p99 {stats.quantile(0.99):.0f} ns, "
+              f"p99.9 {stats.quantile(0.999):.0f} ns over {stats.count} gaps")
+        # 与 np.histogram(diff[diff < max_gap]) 相同: 10个桶, 范围为保留下来的间隔的最小到最大值
+        counts, edges = stats.exact_histogram(10)
+        return {'counts': counts, 'edges': edges}
+
+    return cache.get_or_compute(pcap_file, 'hist', compute, source_ip=source_ip, max_gap=max_gap, exact_below=max_gap)
 
 def gen_step(y,x):
     y=np.append(y,y[-1])
@@ -37,12 +49,12 @@ def gen_step(y,x):
     y=np.append(y,0)
     return y,x
 
-def plot_histogram(r):
-    bins = 20
+def plot_histogram(hist):
+    import matplotlib.pyplot as plt
     plt.clf()  # 清除画布
 
-    # 计算直方图数据  
-    r_y, r_x = gen_step(*np.histogram(r,density=False))
+    # 直方图数据  
+    r_y, r_x = gen_step(hist['counts'], hist['edges'])
     # plt.figure(figsize=(10, 8))
 
 
@@ -65,8 +77,7 @@ def plot_histogram(r):
 
 if __name__=='__main__':
     print(f'{file_name} processing...')
-    t_addresses = extract_ethernet_src_address(file_name)
-    t=cal_diff(t_addresses)
-    plot_histogram(t)
+    hist = load_histogram(file_name)
+    plot_histogram(hist)
     print(f'{file_name} complete...')
     print('over...')
\ No newline at end of file
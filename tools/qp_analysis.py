@@ -0,0 +1,155 @@
+import argparse
+import os
+from typing import Dict, Optional
+
+import numpy as np
+
+from analysis_cache import AnalysisCache
+from flowlet_replay import FLOWLET_TIMEOUT
+from pcap_reader import ROCE_PORT, MacTimestampUnwrapper, extract_packets, extract_packets_parallel
+
+PSN_MOD = 1 << 24
+QP_FIELDS = ('mac_ts', 'dest_qp', 'psn', 'bth_opcode', 'frame_len')
+
+
+def group_by_qp(cols: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """按目的QP稳定排序分组, 组内保持抓包顺序; 返回排序后的各列及每个QP的起始位置和包数"""
+    order = np.argsort(cols['dest_qp'], kind='stable')
+    grouped = {name: col[order] for name, col in cols.items()}
+    qp, start, count = np.unique(grouped['dest_qp'], return_index=True, return_counts=True)
+    grouped.update(qp=qp, start=start, count=count)
+    return grouped
+
+
+def qp_gaps(ts: np.ndarray, group_start: np.ndarray) -> np.ndarray:
+    """分组后的时间戳差分; 每组第一个包没有前驱, 其间隔记为-1
+
+    乱序包的间隔同样可能为负, 判断组起点应使用 group_start_mask 而不是间隔的符号
+    """
+    gaps = np.empty(len(ts), dtype=np.int64)
+    if len(ts):
+        gaps[1:] = np.diff(ts.astype(np.int64))
+        gaps[group_start] = -1
+    return gaps
+
+
+def group_start_mask(n: int, group_start: np.ndarray) -> np.ndarray:
+    first = np.zeros(n, dtype=bool)
+    first[group_start] = True
+    return first
+
+
+def psn_deltas(psn: np.ndarray, group_start: np.ndarray) -> np.ndarray:
+    """组内相邻包的PSN差 (模2^24, 映射到[-2^23, 2^23)); 每组第一个包记为1"""
+    delta = np.ones(len(psn), dtype=np.int64)
+    if len(psn):
+        delta[1:] = (np.diff(psn.astype(np.int64)) + PSN_MOD // 2) % PSN_MOD - PSN_MOD // 2
+        delta[group_start] = 1
+    return delta
+
+
+def qp_summary(grouped: Dict[str, np.ndarray], flowlet_timeout: int = FLOWLET_TIMEOUT) -> Dict[str, np.ndarray]:
+    """每个QP的包数、flowlet数、PSN缺口/乱序/重复计数及间隔统计"""
+    start, count = grouped['start'], grouped['count']
+    group_id = np.repeat(np.arange(len(start)), count)
+    n_groups = len(start)
+
+    gaps = qp_gaps(grouped['mac_ts'], start)
+    has_gap = ~group_start_mask(len(gaps), start)
+    # 组内间隔超过超时即开始新的flowlet, 每组第一个包总是flowlet起点
+    flowlet_start = ~has_gap | (gaps > flowlet_timeout)
+    delta = psn_deltas(grouped['psn'], start)
+
+    def per_qp(mask_or_weights):
+        return np.bincount(group_id, weights=mask_or_weights, minlength=n_groups)
+
+    gap_count = per_qp(has_gap.astype(np.float64))
+    gap_sum = per_qp(np.where(has_gap, gaps, 0).astype(np.float64))
+    return {
+        'qp': grouped['qp'],
+        'packets': count,
+        'bytes': per_qp(grouped['frame_len'].astype(np.float64)).astype(np.int64),
+        'flowlets': per_qp(flowlet_start.astype(np.float64)).astype(np.int64),
+        'mean_gap': np.divide(gap_sum, gap_count, out=np.full(n_groups, np.nan), where=gap_count > 0),
+        'psn_gaps': per_qp((delta > 1).astype(np.float64)).astype(np.int64),
+        'psn_missing': per_qp(np.where(delta > 1, delta - 1, 0).astype(np.float64)).astype(np.int64),
+        'psn_reorders': per_qp((delta < 0).astype(np.float64)).astype(np.int64),
+        'psn_duplicates': per_qp((delta == 0).astype(np.float64)).astype(np.int64),
+    }
+
+
+class QPAnalyzer:
+    """按BTH目的QP拆分RoCE流, 分别计算流内间隔、flowlet边界和PSN异常"""
+
+    def __init__(self, file_name: str, source_ip: Optional[str] = '10.10.10.2', source_port=ROCE_PORT,
+                 flowlet_timeout: int = FLOWLET_TIMEOUT, workers: int = 1,
+                 cache: Optional[AnalysisCache] = None):
+        self.file_name = file_name
+        self.source_ip = source_ip
+        self.source_port = source_port
+        self.flowlet_timeout = flowlet_timeout
+        self.workers = workers
+        self.cache = cache or AnalysisCache()
+        self.cache_params = {'source_ip': source_ip, 'source_port': source_port}
+
+    def load_packets(self) -> Dict[str, np.ndarray]:
+        """抓包顺序的时间戳和BTH字段"""
+        def extract():
+            if self.workers > 1:
+                return extract_packets_parallel(self.file_name, self.source_ip, self.source_port,
+                                                QP_FIELDS, workers=self.workers)
+            return extract_packets(self.file_name, self.source_ip, self.source_port, QP_FIELDS)
+        return self.cache.get_or_compute(self.file_name, 'roce_bth', extract, **self.cache_params)
+
+    def load_groups(self) -> Dict[str, np.ndarray]:
+        def compute():
+            packets = dict(self.load_packets())
+            # 按抓包顺序展开48位回绕后再分组, 否则回绕处的间隔为很大的负数
+            packets['mac_ts'] = MacTimestampUnwrapper()(packets['mac_ts'])
+            return group_by_qp(packets)
+        return self.cache.get_or_compute(self.file_name, 'qp_groups', compute, unwrapped=True, **self.cache_params)
+
+    def summary(self) -> Dict[str, np.ndarray]:
+        return self.cache.get_or_compute(
+            self.file_name, 'qp_summary',
+            lambda: qp_summary(self.load_groups(), self.flowlet_timeout),
+            flowlet_timeout=self.flowlet_timeout, unwrapped=True, **self.cache_params)
+
+    def flow(self, qp: int) -> Dict[str, np.ndarray]:
+        """单个QP的时间戳、PSN、间隔和flowlet起点; 按QP单独缓存, 再次查询无需加载全部分组"""
+        def compute():
+            grouped = self.load_groups()
+            i = np.searchsorted(grouped['qp'], qp)
+            if i == len(grouped['qp']) or grouped['qp'][i] != qp:
+                raise KeyError(f"QP {qp} not found in {self.file_name}")
+            sl = slice(grouped['start'][i], grouped['start'][i] + grouped['count'][i])
+            flow = {name: grouped[name][sl] for name in QP_FIELDS}
+            gaps = qp_gaps(flow['mac_ts'], np.array([0]))
+            flow['gaps'] = gaps
+            flow['flowlet_start'] = np.r_[0, np.flatnonzero(gaps[1:] > self.flowlet_timeout) + 1]
+            flow['psn_delta'] = psn_deltas(flow['psn'], np.array([0]))
+            return flow
+        return self.cache.get_or_compute(self.file_name, 'qp_flow', compute, qp=int(qp),
+                                         flowlet_timeout=self.flowlet_timeout, unwrapped=True, **self.cache_params)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-QP gap, flowlet and PSN analysis of a RoCE capture')
+    parser.add_argument('pcap')
+    parser.add_argument('--source-ip', default='10.10.10.2')
+    parser.add_argument('--flowlet-timeout', type=int, default=FLOWLET_TIMEOUT)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    analyzer = QPAnalyzer(args.pcap, args.source_ip, flowlet_timeout=args.flowlet_timeout, workers=args.workers)
+    s = analyzer.summary()
+    print(f"{'QP':>10} {'packets':>10} {'flowlets':>10} {'mean_gap':>12} {'psn_gaps':>10} "
+          f"{'missing':>10} {'reorders':>10} {'dups':>8}")
+    for i, qp in enumerate(s['qp']):
+        print(f"{qp:>10} {s['packets'][i]:>10} {s['flowlets'][i]:>10} {s['mean_gap'][i]:>12.1f} "
+              f"{s['psn_gaps'][i]:>10} {s['psn_missing'][i]:>10} {s['psn_reorders'][i]:>10} "
+              f"{s['psn_duplicates'][i]:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+import argparse
+import logging
+from typing import Dict
+
+import numpy as np
+
+from flowlet_replay import FLOWLET_TIMEOUT, TIME_GAP, FlowReplay, flow_keys
+from gap_stats import GapStats
+from pcap_reader import (DEFAULT_CHUNK_RECORDS, LINKTYPE_ETHERNET, ROCE_PORT, PcapFile, UnsupportedLinkType,
+                         decode_chunk, decode_pfc, filter_mask)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# 超过该时延的PFC不再归因于之前的触发包 (ns)
+MAX_LATENCY_NS = 1_000_000
+
+
+class AsOfJoin:
+    """触发包与PFC帧的有序as-of连接, 可逐块进行
+
+    每个PFC帧匹配时间上不晚于它的最近一个触发包, 两者相差不超过max_latency;
+    每个触发包至多匹配一个PFC, 同一触发包后的其余PFC及找不到触发包的PFC记为多余.
+    两个有序序列用稳定排序合并 (timsort识别两段有序数据, 线性时间), 不做逐个查找.
+    间隔小于反应时延的相邻触发包无法区分, 此时PFC归于较晚的那个.
+    时延分布记入GapStats, 内存与数据量无关.
+    """
+
+    def __init__(self, max_latency: int = MAX_LATENCY_NS):
+        self.max_latency = max_latency
+        self.latency = GapStats()
+        self.triggers = 0
+        self.pauses = 0
+        self.matched = 0
+        self.spurious = 0
+        # 上一块最后一个触发包及其是否已匹配, 供下一块开头的PFC使用
+        self.carry_ts = None
+        self.carry_matched = False
+
+    def push(self, triggers: np.ndarray, pauses: np.ndarray):
+        """加入一块的触发包和PFC时间戳 (均为抓包记录时间, ns)"""
+        triggers = np.sort(np.asarray(triggers, dtype=np.int64), kind='stable')
+        pauses = np.sort(np.asarray(pauses, dtype=np.int64), kind='stable')
+        self.triggers += len(triggers)
+        self.pauses += len(pauses)
+        carried = self.carry_ts is not None
+        trig = np.concatenate([[self.carry_ts], triggers]) if carried else triggers
+        if len(trig):
+            self.carry_ts = int(trig[-1])
+        if len(pauses) == 0:
+            if len(triggers):
+                self.carry_matched = False
+            return
+        if len(trig) == 0:
+            # 尚未出现任何触发包, 本块的PFC都无从归因
+            self.spurious += len(pauses)
+            return
+
+        # 合并两个有序序列; 时间相同时触发包在前
+        merged = np.concatenate([trig, pauses])
+        order = np.argsort(merged, kind='stable')
+        is_trigger = order < len(trig)
+        trig_idx = np.where(is_trigger, order, -1)
+        # 每个PFC之前最近的触发包下标
+        last = np.maximum.accumulate(trig_idx)[~is_trigger]
+        pause_ts = merged[order][~is_trigger]
+
+        has_trigger = last >= 0
+        latency = pause_ts - np.where(has_trigger, trig[np.maximum(last, 0)], 0)
+        ok = has_trigger & (latency <= self.max_latency)
+        # 同一触发包只取第一个PFC; 上一块留下的触发包若已匹配则不再参与
+        first = np.r_[True, last[1:] != last[:-1]]
+        if carried and self.carry_matched:
+            first &= last != 0
+        match = ok & first
+        self.matched += int(match.sum())
+        self.spurious += len(pauses) - int(match.sum())
+        self.latency.update(latency[match])
+        if len(trig):
+            last_trig = len(trig) - 1
+            self.carry_matched = bool(match[last == last_trig].any()) or \
+                (carried and last_trig == 0 and self.carry_matched)
+
+    def summary(self) -> Dict[str, float]:
+        stats = self.latency.summary()
+        return {
+            'triggers': self.triggers, 'pauses': self.pauses, 'matched': self.matched,
+            'unmatched_triggers': self.triggers - self.matched, 'spurious_pauses': self.spurious,
+            'latency_mean': stats['mean'], 'latency_min': stats['min'], 'latency_max': stats['max'],
+            'latency_p50': stats['p50'], 'latency_p99': stats['p99'], 'latency_p99.9': stats['p99.9'],
+        }
+
+
+def reaction_latency(pcap_file: str, time_gap: int = TIME_GAP, flowlet_timeout: int = FLOWLET_TIMEOUT,
+                     stop_time: int = 0, max_latency: int = MAX_LATENCY_NS,
+                     chunk_records: int = DEFAULT_CHUNK_RECORDS, progress=None) -> AsOfJoin:
+    """单遍扫描抓包: 按数据面的每流判定重放出触发包, 与同一抓包中的PFC帧逐块做as-of连接"""
+    replay = FlowReplay(time_gap, flowlet_timeout, stop_time)
+    join = AsOfJoin(max_latency)
+    with PcapFile(pcap_file) as pcap:
+        for index in pcap.iter_index(chunk_records):
+            if not (index.linktype == LINKTYPE_ETHERNET).all():
+                raise UnsupportedLinkType(int(index.linktype[index.linktype != LINKTYPE_ETHERNET][0]))
+            cols = decode_chunk(pcap.buf, index, ('ts_ns', 'mac_ts', 'ip_src', 'ip_proto', 'sport', 'dest_qp'))
+            roce = filter_mask(cols, sport=ROCE_PORT)
+            # 数据面按MAC中编码的原始48位时间戳判定 (与C代码一样不展开回绕), 时延按两个方向共用的抓包时钟计算
+            result = replay(cols['mac_ts'][roce], flow_keys(cols['ip_src'][roce], cols['dest_qp'][roce]))
+            join.push(cols['ts_ns'][roce][result.fire], decode_pfc(pcap.buf, index)['ts_ns'])
+            if progress is not None:
+                progress(index.end_offset)
+    return join
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Match PFC frames to their triggering RoCE packets and report reaction latency')
+    parser.add_argument('pcap', help='capture containing both the RoCE traffic and the PFC frames the dataplane sent')
+    parser.add_argument('--time-gap', type=int, default=TIME_GAP)
+    parser.add_argument('--flowlet-timeout', type=int, default=FLOWLET_TIMEOUT)
+    parser.add_argument('--stop-time', type=int, default=0)
+    parser.add_argument('--max-latency-us', type=float, default=MAX_LATENCY_NS / 1000,
+                        help='pauses later than this after a trigger count as spurious')
+    parser.add_argument('--output', help='save the latency histogram (mergeable GapStats arrays) to this .npz file')
+    args = parser.parse_args()
+
+    join = reaction_latency(args.pcap, args.time_gap, args.flowlet_timeout, args.stop_time,
+                            int(args.max_latency_us * 1000))
+    s = join.summary()
+    print(f"Triggers: {s['triggers']:,}, PFC frames: {s['pauses']:,}, matched: {s['matched']:,}")
+    print(f"Unmatched triggers: {s['unmatched_triggers']:,}, spurious pauses: {s['spurious_pauses']:,}")
+    if s['matched']:
+        print(f"Reaction latency (ns): mean {s['latency_mean']:.0f}, min {s['latency_min']}, "
+              f"p50 {s['latency_p50']:.0f}, p99 {s['latency_p99']:.0f}, p99.9 {s['latency_p99.9']:.0f}, "
+              f"max {s['latency_max']}")
+    if args.output:
+        np.savez(args.output, **join.latency.to_arrays())
+        logger.info(f"Saved latency histogram to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+import argparse
+import json
+import logging
+import os
+import socket
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from perftest_runner import write_columns
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+SOCKET_NAME = 'dpdk_telemetry.v2'
+DEFAULT_PREFIX = 'rte'
+
+
+def socket_path(prefix: str = DEFAULT_PREFIX) -> str:
+    """DPDK运行时目录: root为/var/run/dpdk, 普通用户为$XDG_RUNTIME_DIR/dpdk (缺省/tmp/dpdk)"""
+    if os.geteuid() == 0:
+        base = '/var/run'
+    else:
+        base = os.environ.get('XDG_RUNTIME_DIR', '/tmp')
+    return os.path.join(base, 'dpdk', prefix, SOCKET_NAME)
+
+
+class TelemetryClient:
+    """DPDK遥测socket的客户端, 每条命令返回 {命令: 数据}"""
+
+    def __init__(self, path: str):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self.sock.connect(path)
+        info = json.loads(self.sock.recv(1024).decode())
+        self.max_output_len = info.get('max_output_len', 16384)
+
+    def query(self, cmd: str, params: Optional[str] = None):
+        full = cmd if params is None else f'{cmd},{params}'
+        self.sock.send(full.encode())
+        reply = json.loads(self.sock.recv(self.max_output_len).decode())
+        if reply.get(cmd) is None:
+            raise RuntimeError(f'{full} returned no data (unknown command or invalid parameter)')
+        return reply[cmd]
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def sample(client: TelemetryClient, queue: Optional[int] = None) -> Dict:
+    """一次采样: 计数器加两个直方图, time为本机墙钟时间, 便于和perftest结果对齐"""
+    params = None if queue is None else str(queue)
+    row = {'time': time.time()}
+    row.update(client.query('/prototype/stats', params))
+    row['gap_hist'] = np.asarray(client.query('/prototype/gap_hist', params), dtype=np.uint64)
+    row['cycle_hist'] = np.asarray(client.query('/prototype/cycle_hist', params), dtype=np.uint64)
+    return row
+
+
+def set_params(client: TelemetryClient, assignments: str, timeout: float = 5.0) -> Dict:
+    """修改数据面flowlet参数, 等到所有worker都应用新版本后返回当前参数"""
+    reply = client.query('/prototype/set_params', assignments)
+    if 'error' in reply:
+        raise ValueError(reply['error'])
+    deadline = time.monotonic() + timeout
+    while reply['applied'] != reply['generation']:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"workers applied generation {reply['applied']}, expected {reply['generation']}")
+        time.sleep(0.01)
+        reply = client.query('/prototype/params')
+    return reply
+
+
+def rates(prev: Dict, cur: Dict) -> Dict:
+    """两次采样之间的速率, 计数器单调递增"""
+    secs = cur['time'] - prev['time']
+    bursts = cur['reaction_bursts'] - prev['reaction_bursts']
+    roce = cur['roce_pkts'] - prev['roce_pkts']
+    return {
+        'time': cur['time'],
+        'rx_mpps': (cur['rx_pkts'] - prev['rx_pkts']) / secs / 1e6,
+        'roce_mpps': roce / secs / 1e6,
+        'pfc_per_s': (cur['pfc_sent'] - prev['pfc_sent']) / secs,
+        'below_ratio': (cur['gaps_below'] - prev['gaps_below']) / roce if roce else np.nan,
+        'above_ratio': (cur['gaps_above'] - prev['gaps_above']) / roce if roce else np.nan,
+        'reaction_ns': ((cur['reaction_cycles'] - prev['reaction_cycles']) / bursts * 1e9 / cur['tsc_hz']
+                        if bursts else np.nan),
+        'flows_active': cur['flows_active'],
+        'tx_failed': cur['tx_failed'],
+        'alloc_failed': cur['alloc_failed'],
+    }
+
+
+def hist_quantile(hist: np.ndarray, q: float) -> float:
+    """log2直方图的分位数上界: 桶i的上界为2^i"""
+    total = int(hist.sum())
+    if total == 0:
+        return np.nan
+    bucket = int(np.searchsorted(np.cumsum(hist), q * total))
+    return float(1 << bucket)
+
+
+class LivePlot:
+    """速率曲线加两个直方图的实时窗口"""
+
+    def __init__(self, history: int):
+        import matplotlib.pyplot as plt
+        self.plt = plt
+        self.history = history
+        plt.ion()
+        self.fig, (self.ax_rate, self.ax_gap, self.ax_cycle) = plt.subplots(3, 1, figsize=(10, 9))
+        self.ax_pfc = self.ax_rate.twinx()
+
+    def update(self, series: List[Dict], cur: Dict):
+        recent = series[-self.history:]
+        t = np.array([r['time'] for r in recent]) - recent[0]['time']
+        self.ax_rate.clear()
+        self.ax_rate.plot(t, [r['rx_mpps'] for r in recent], label='RX Mpps')
+        self.ax_rate.plot(t, [r['roce_mpps'] for r in recent], label='RoCE Mpps')
+        self.ax_rate.set_xlabel('Time (s)')
+        self.ax_rate.legend(loc='upper left')
+        self.ax_pfc.clear()
+        self.ax_pfc.plot(t, [r['pfc_per_s'] for r in recent], color='#FF6B6B', label='PFC/s')
+        self.ax_pfc.legend(loc='upper right')
+
+        for ax, hist, xlabel in ((self.ax_gap, cur['gap_hist'], 'Per-flow gap (ns, log2 bucket upper bound)'),
+                                 (self.ax_cycle, cur['cycle_hist'], 'Cycles per burst (log2 bucket upper bound)')):
+            ax.clear()
+            ax.bar(np.arange(len(hist)), hist, color='#5B9BD5')
+            ax.set_yscale('symlog')
+            ax.set_xlabel(xlabel)
+            ax.set_xticks(np.arange(0, len(hist), 4))
+            ax.set_xticklabels([f'2^{i}' for i in range(0, len(hist), 4)])
+        self.fig.tight_layout()
+        self.fig.canvas.draw_idle()
+        self.plt.pause(0.001)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Poll the dataplane telemetry socket')
+    parser.add_argument('--prefix', default=DEFAULT_PREFIX, help='EAL --file-prefix of the dataplane')
+    parser.add_argument('--socket', help='telemetry socket path (overrides --prefix)')
+    parser.add_argument('--queue', type=int, help='only this queue (default: sum of all queues)')
+    parser.add_argument('--interval', type=float, default=1.0)
+    parser.add_argument('--count', type=int, default=0, help='number of samples, 0 = until interrupted')
+    parser.add_argument('--plot', action='store_true', help='live matplotlib window')
+    parser.add_argument('--history', type=int, default=120, help='samples shown in the live plot')
+    parser.add_argument('--output', help='write per-interval rates and raw counters to this npz file')
+    parser.add_argument('--set', metavar='NAME=VALUE[,...]',
+                        help='change flowlet parameters (e.g. flowlet_timeout=6000,time_gap=4000), wait until '
+                             'all workers use them and exit')
+    args = parser.parse_args()
+
+    path = args.socket or socket_path(args.prefix)
+    if args.set:
+        with TelemetryClient(path) as client:
+            params = set_params(client, args.set)
+        print(', '.join(f'{k}={v}' for k, v in params.items()))
+        return
+
+    plot = LivePlot(args.history) if args.plot else None
+    series = []
+    with TelemetryClient(path) as client:
+        prev = sample(client, args.queue)
+        n = 0
+        try:
+            while args.count == 0 or n < args.count:
+                time.sleep(args.interval)
+                cur = sample(client, args.queue)
+                r = rates(prev, cur)
+                print(f"RX {r['rx_mpps']:.3f} Mpps, RoCE {r['roce_mpps']:.3f} Mpps, PFC {r['pfc_per_s']:.0f}/s, "
+                      f"<TIME_GAP {r['below_ratio']:.1%}, >FLOWLET_TIMEOUT {r['above_ratio']:.1%}, "
+                      f"reaction {r['reaction_ns']:.0f} ns, gap p50 <= {hist_quantile(cur['gap_hist'], 0.5):.0f} ns, "
+                      f"flows {r['flows_active']}")
+                row = dict(r)
+                row.update({k: v for k, v in cur.items() if not isinstance(v, np.ndarray)})
+                series.append(row)
+                if plot is not None:
+                    plot.update(series, cur)
+                prev = cur
+                n += 1
+        except KeyboardInterrupt:
+            pass
+        except (ConnectionError, json.JSONDecodeError) as e:
+            logger.info(f'Telemetry connection closed: {e}')
+
+    if args.output and series:
+        write_columns(args.output, series)
+        logger.info(f'Wrote {len(series)} samples to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
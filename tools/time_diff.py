@@ -1,30 +1,64 @@
-from scapy.all import rdpcap,IP,TCP
+import argparse
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-import matplotlib.pyplot as plt
+from gap_stats import GapStats, scan_gap_stats
+from pcap_reader import DEFAULT_REORDER_WINDOW
+from analysis_cache import AnalysisCache
+logger = logging.getLogger(__name__)
 source_ip = '10.10.10.2'
+max_gap = 120000    # 120us
+bins = 20
+# 乱序窗口: 迟到不超过该样本数的包会被归位, 结果与全量排序一致
+reorder_window = DEFAULT_REORDER_WINDOW
+cache = AnalysisCache()
 file_list=['AliStorage','Hadoop','Solar','WebSearch']
 paper_names=['AliCloud Storage','Meta Hadoop','Solar RPC','Web Search']
 
 
-def extract_ethernet_src_address(pcap_file):
-    # 读取PCAP文件  
-    packets = rdpcap(pcap_file)
-
-    # 创建一个集合以存储唯一的以太网源地址  
-    src_addresses = []
-
-    # 遍历每一个数据包  
-    for packet in packets:
-        # 检查数据包是否包含以太网层  
-        if packet.haslayer(IP) and packet[IP].src==source_ip and packet.haslayer('Ether'):
-            src = packet['Ether'].src
-            src_addresses.append(int(src.replace(':',''),16))
-
-    return sorted(src_addresses)
-
-def cal_diff(data):
-    diff= np.diff(data)
-    return diff[diff<120000]    # 120us
+def capture_files(file_name):
+    return f'../sniffer/capture_{file_name}_RDMA.pcap', f'../sniffer/tcp_{file_name}.pcap'
+
+def cal_gap_stats(pcap_file):
+    # 流式统计间隔, max_gap以内的间隔另按值精确计数, 直方图由计数精确重新分桶
+    return scan_gap_stats(pcap_file, src_ip=source_ip, reorder_window=reorder_window, exact_below=max_gap)
+
+def load_gap_stats(pcap_file):
+    stats = GapStats.from_arrays(cache.get_or_compute(
+        pcap_file, 'gap_stats', lambda: cal_gap_stats(pcap_file).to_arrays(),
+        source_ip=source_ip, reorder_window=reorder_window, exact_below=max_gap))
+    if stats.reordered:
+        logger.warning(f"{pcap_file}: {stats.reordered} timestamps reordered beyond the {reorder_window}-sample reorder window, dropped")
+    return stats
+
+def density(counts, edges):
+    total = counts.sum()
+    return counts / total / np.diff(edges) if total else np.zeros(len(counts))
+
+def gap_max(stats):
+    # max_gap以内最大的间隔
+    values, _ = stats.exact_values()
+    return int(values[-1]) if len(values) else 0
+
+def cal_histogram(r_stats,t_stats):
+    # 只取 max_gap 以内的间隔, 分桶上界为两者在此范围内的最大间隔
+    bin_max = max(gap_max(r_stats), gap_max(t_stats))
+    shared_bins = np.linspace(0, bin_max, bins + 1)
+    r_y = density(r_stats.exact_histogram(shared_bins)[0], shared_bins)
+    t_y = density(t_stats.exact_histogram(shared_bins)[0], shared_bins)
+    return {'edges': shared_bins, 'rdma': r_y, 'tcp': t_y}
+
+def load_histogram(pcap_file_rdma,pcap_file_tcp,r_stats=None,t_stats=None):
+    # 两个抓包共享分桶, 直方图按两者的指纹共同寻址
+    def compute():
+        r = load_gap_stats(pcap_file_rdma) if r_stats is None else r_stats
+        t = load_gap_stats(pcap_file_tcp) if t_stats is None else t_stats
+        return cal_histogram(r, t)
+
+    return cache.get_or_compute(
+        [pcap_file_rdma, pcap_file_tcp], 'hist', compute,
+        source_ip=source_ip, max_gap=max_gap, bins=bins, reorder_window=reorder_window, exact_below=max_gap)
 
 def gen_step(y,x):
     y=np.append(y,y[-1])
@@ -36,17 +70,17 @@ def gen_step(y,x):
     y=np.append(y,0)
     return y,x
 
-def plot_histogram(r,t,index):
-    pro_name=pcap_file_rdma.split('_')[1]
-    bins = 20
-    bin_min = min(r.min(), t.min())  
-    bin_max = max(r.max(), t.max())  
-    shared_bins = np.linspace(0, bin_max, bins + 1)  
-    plt.clf()  # 清除画布
-
-    # 计算直方图数据  
-    r_y, r_x = gen_step(*np.histogram(r, bins=shared_bins,density=True))
-    t_y, t_x = gen_step(*np.histogram(t, bins=shared_bins,density=True))
+def plot_histogram(hist,index):
+    # 绘图库只在出图时导入
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    pro_name=file_list[index]
+    fig = plt.figure()
+
+    # 直方图数据  
+    r_y, r_x = gen_step(hist['rdma'], hist['edges'])
+    t_y, t_x = gen_step(hist['tcp'], hist['edges'])
     # plt.figure(figsize=(10, 8))
 
 
@@ -66,20 +100,36 @@ def plot_histogram(r,t,index):
     plt.legend(fontsize=18)
     plt.tight_layout()
 
-    # 显示图表
+    # 保存图表
     plt.savefig(pro_name+'_density.pdf')
+    plt.close(fig)
+
+def render_workload(index,r_stats,t_stats):
+    # 进程池任务: 由两个抓包的间隔统计得到共享分桶直方图并绘图
+    pcap_file_rdma, pcap_file_tcp = capture_files(file_list[index])
+    hist = load_histogram(pcap_file_rdma, pcap_file_tcp, r_stats, t_stats)
+    plot_histogram(hist,index)
+    return file_list[index]
+
+def run_pipeline(workers=None):
+    # 第一遍: 所有抓包并行流式统计间隔; 第二遍: 各负载在进程中重新分桶并绘图
+    captures = [f for name in file_list for f in capture_files(name)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        stats = dict(zip(captures, pool.map(load_gap_stats, captures)))
+        for f in captures:
+            summary = stats[f].summary()
+            print(f"{f}: {summary['count']} gaps, mean {summary['mean']:.1f} ns, "
+                  f"p50 {summary['p50']:.0f} p99 {summary['p99']:.0f} p99.9 {summary['p99.9']:.0f} ns")
+        futures = [
+            pool.submit(render_workload, i, *(stats[f] for f in capture_files(name)))
+            for i, name in enumerate(file_list)
+        ]
+        for future in futures:
+            print(f'{future.result()} complete...')
 
 if __name__=='__main__':
-    i =0
-    for file_name in file_list:
-        print(f'{file_name} processing...')
-        pcap_file_tcp = f'../sniffer/tcp_{file_name}.pcap'
-        pcap_file_rdma = f'../sniffer/capture_{file_name}_RDMA.pcap'
-        r_addresses = extract_ethernet_src_address(pcap_file_rdma)
-        t_addresses = extract_ethernet_src_address(pcap_file_tcp)
-        r=cal_diff(r_addresses)
-        t=cal_diff(t_addresses)
-        plot_histogram(r,t,i)
-        print(f'{file_name} complete...')
-        i+=1
-    print('over...')
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Compare RDMA/TCP time gap distributions across workloads')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    run_pipeline(args.workers)
+    print('over...')
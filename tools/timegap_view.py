@@ -1,11 +1,12 @@
-import matplotlib.pyplot as plt  
 import numpy as np  
-from scapy.all import PcapReader, IP, UDP  
-from tqdm import tqdm  
 import os  
 import logging  
 from datetime import datetime  
 from pathlib import Path  
+from pcap_reader import DEFAULT_REORDER_WINDOW, MacTimestampUnwrapper, ReorderWindow, extract_mac_timestamps
+from packet_store import PacketStore, open_store, row_filter
+from analysis_cache import AnalysisCache
+from gap_stats import GapStats, scan_gap_stats
 
 # 配置日志  
 logging.basicConfig(  
@@ -15,84 +16,57 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)  
 
 class PacketAnalyzer:  
-    def __init__(self, file_name: str, source_ip='10.10.10.2', source_port=4791):  
+    def __init__(self, file_name: str, source_ip='10.10.10.2', source_port=4791, workers=1,
+                 cache: AnalysisCache = None):  
         self.file_name = file_name  
         self.source_ip = source_ip  
         self.source_port = source_port  
+        # workers > 1 时按记录边界分段, 多进程并行提取
+        self.workers = workers  
         self.file_size = os.path.getsize(file_name)  
         
-        # 创建缓存文件路径  
-        self.cache_dir = Path('./cache')  
-        self.cache_dir.mkdir(exist_ok=True)  
-        
-        # 使用pcap文件名、源IP和端口号创建唯一的缓存文件名  
-        pcap_name = Path(file_name).stem  
-        self.cache_file = self.cache_dir / f'{pcap_name}_{source_ip}_{source_port}_mac.npy'  
+        # 缓存按抓包内容指纹和过滤参数寻址, 抓包重新生成后自动失效  
+        self.cache = cache or AnalysisCache()  
+        self.cache_params = {'source_ip': source_ip, 'source_port': source_port,  
+                             'reorder_window': DEFAULT_REORDER_WINDOW}  
 
     def load_or_extract_mac_addresses(self) -> np.ndarray:  
         """从缓存加载或重新提取MAC地址"""  
-        if self.cache_file.exists():  
-            logger.info(f"Loading MAC addresses from cache: {self.cache_file}")  
-            try:  
-                return np.load(self.cache_file)  
-            except Exception as e:  
-                logger.warning(f"Error loading cache file: {e}")  
-                logger.info("Falling back to extraction from pcap")  
-                
+        data = self.cache.load(self.file_name, 'mac', **self.cache_params)  
+        if data is not None:  
+            return data  
         return self.extract_and_cache_mac_addresses()  
 
     def extract_and_cache_mac_addresses(self) -> np.ndarray:  
         """提取MAC地址并缓存结果"""  
-        mac_addresses = []  
-        packets_processed = 0  
-        matched_packets = 0  
-        
+        from tqdm import tqdm  
         with tqdm(total=self.file_size,   
                 desc="Reading packets",   
                 unit='B',   
                 unit_scale=True) as pbar:  
-            
+
+            # 进度按已扫描到的文件偏移更新, 不再逐包序列化
+            def progress(offset):
+                pbar.update(offset - pbar.n)
+
+            # 保持抓包顺序, 乱序窗口内的迟到包归位, 48位回绕展开为uint64
+            reorder = ReorderWindow()
             try:  
-                with PcapReader(self.file_name) as pcap_reader:  
-                    while True:  
-                        try:  
-                            packet = pcap_reader.read_packet()  
-                            if packet is None:  # 文件结束  
-                                logger.info("Reached end of pcap file")  
-                                break  
-                                
-                            # 更新进度条使用实际的包大小  
-                            pbar.update(len(bytes(packet)))  
-                            
-                            packets_processed += 1  
-                            
-                            if (packet.haslayer(UDP) and packet.haslayer(IP) and  
-                                packet[IP].src == self.source_ip and   
-                                packet[UDP].sport == self.source_port):  
-                                mac_hex = packet['Ether'].src.replace(':', '')  
-                                mac_addresses.append(int(mac_hex, 16))  
-                                matched_packets += 1  
-                                
-                            if packets_processed % 100000 == 0:  
-                                logger.info(f"Processed {packets_processed:,} packets, "  
-                                        f"matched {matched_packets:,}")  
-                                
-                        except EOFError:  # 明确处理文件结束  
-                            logger.info("Reached EOF")  
-                            break  
-                        except Exception as e:  
-                            logger.warning(f"Error processing packet: {e}")  
-                            continue  
-                            
+                mac_array = extract_mac_timestamps(self.file_name,
+                                                   src_ip=self.source_ip,
+                                                   sport=self.source_port,
+                                                   progress=progress,
+                                                   workers=self.workers,
+                                                   reorder=reorder)
             except Exception as e:  
                 logger.error(f"Error reading pcap file: {e}")  
                 raise  
-                
-        logger.info(f"Finished processing {packets_processed:,} packets, "  
-               f"found {matched_packets:,} matching packets")  
+            pbar.update(self.file_size - pbar.n)
+
+        logger.info(f"Finished processing {self.file_name}, "  
+               f"found {len(mac_array):,} matching packets "  
+               f"({reorder.out_of_order:,} out of order, {reorder.dropped:,} dropped)")  
     
-        # 转换为numpy数组并缓存  
-        mac_array = np.array(mac_addresses)  
         self.save_to_cache(mac_array)  
         
         return mac_array  
@@ -100,8 +74,7 @@ class PacketAnalyzer:
     def save_to_cache(self, data: np.ndarray):  
         """保存数据到缓存文件"""  
         try:  
-            np.save(self.cache_file, data)  
-            logger.info(f"Saved {len(data)} MAC addresses to cache: {self.cache_file}")  
+            self.cache.save(self.file_name, 'mac', data, **self.cache_params)  
         except Exception as e:  
             logger.error(f"Error saving cache file: {e}")  
 
@@ -114,13 +87,76 @@ class PacketAnalyzer:
         logger.info(f"Found {len(filtered_diff)} valid time gaps")  
         return filtered_diff  
 
+    def load_or_calculate_time_gaps(self, min_gap=0, max_gap=20000) -> np.ndarray:  
+        """从缓存加载或重新计算过滤后的时间间隔"""  
+        return self.cache.get_or_compute(  
+            self.file_name, 'gaps',  
+            lambda: self.calculate_time_gaps(self.load_or_extract_mac_addresses(), min_gap, max_gap),  
+            min_gap=min_gap, max_gap=max_gap, **self.cache_params)  
+
+    def load_or_calculate_gap_stats(self) -> GapStats:  
+        """流式统计全部时间间隔, 截断窗口和分位数可事后从直方图得到"""  
+        def compute():
+            logger.info("Streaming gap statistics...")  
+            return scan_gap_stats(self.file_name, src_ip=self.source_ip, sport=self.source_port,
+                                  workers=self.workers).to_arrays()
+
+        return GapStats.from_arrays(self.cache.get_or_compute(  
+            self.file_name, 'gap_stats', compute, **self.cache_params))  
+
+    def load_store(self) -> PacketStore:  
+        """打开(必要时构建)该抓包的列式元数据存储"""  
+        from tqdm import tqdm  
+        with tqdm(total=self.file_size, desc="Building packet store", unit='B', unit_scale=True) as pbar:  
+            store = open_store(self.file_name, self.cache, progress=lambda offset: pbar.update(offset - pbar.n))  
+            pbar.update(self.file_size - pbar.n)  
+        return store  
+
+    def load_gap_window(self, start_idx: int, sample_size: int, min_gap=0, max_gap=20000) -> np.ndarray:  
+        """过滤后间隔序列中 [start_idx, start_idx+sample_size) 的部分
+
+        按抓包顺序逐块读取列式存储, 凑够窗口即停止, 只解压窗口之前的少数几个块;
+        与缓存的时间戳和间隔统计一样经过同样大小的乱序窗口归位, 下标与它们一致
+        """  
+        store = self.load_store()  
+        unwrap = MacTimestampUnwrapper()  
+        reorder = ReorderWindow(DEFAULT_REORDER_WINDOW)  
+
+        def ordered():  
+            for chunk in store.iter_chunks(('mac_ts', 'ip_src', 'ip_proto', 'sport')):  
+                yield reorder.push(unwrap(chunk['mac_ts'][row_filter(chunk, self.source_ip, self.source_port)]))  
+            yield reorder.flush()  
+
+        need = start_idx + sample_size  
+        prev = None  
+        seen = 0  
+        window = []  
+        for ts in ordered():  
+            ts = ts.astype(np.int64)  
+            if not len(ts):  
+                continue  
+            diff = np.diff(ts) if prev is None else np.diff(ts, prepend=prev)  
+            prev = ts[-1]  
+            gaps = diff[(diff > min_gap) & (diff < max_gap)]  
+            if start_idx - seen < len(gaps) and need > seen:  
+                window.append(gaps[max(start_idx - seen, 0):need - seen])  
+            seen += len(gaps)  
+            if seen >= need:  
+                break  
+        logger.info(f"Read {store.bytes_read / 1024:.1f} KiB from the packet store for gaps "  
+                    f"{start_idx}..{need}")  
+        store.close()  
+        return np.concatenate(window) if window else np.empty(0, dtype=np.int64)  
+
     def plot_time_gaps(self, data: np.ndarray, start_idx=10000, sample_size=100,   
-                      output_file='time_gap_analysis.png'):  
-        """绘制时间间隔分析图"""  
+                      output_file='time_gap_analysis.png', offset=0):  
+        """绘制时间间隔分析图; offset为data[0]在完整间隔序列中的下标"""  
+        # 绘图库只在需要出图时导入, 统计和缓存命中路径不受其启动开销影响  
+        import matplotlib.pyplot as plt  
         logger.info(f"Plotting time gaps from index {start_idx} to {start_idx + sample_size}")  
         
-        end_idx = min(start_idx + sample_size, len(data))  
-        sample_data = data[start_idx:end_idx]  
+        end_idx = min(start_idx + sample_size, offset + len(data))  
+        sample_data = data[start_idx - offset:end_idx - offset]  
         
         with plt.style.context('seaborn'):  
             fig, ax = plt.subplots(figsize=(12, 6), dpi=100)  
@@ -183,20 +219,27 @@ def main():
     analyzer = PacketAnalyzer(  
         file_name=file_name,  
         source_ip='10.10.10.2',  
-        source_port=4791  
+        source_port=4791,  
+        workers=os.cpu_count()  
     )  
     
     try:  
         logger.info("Starting packet analysis...")  
         
-        # 从缓存加载或重新提取MAC地址  
-        mac_addresses = analyzer.load_or_extract_mac_addresses()  
-        
-        # 计算时间间隔  
-        time_gaps = analyzer.calculate_time_gaps(mac_addresses,min_gap=200)  
+        # 全量间隔的汇总统计, 与绘图所用的截断窗口无关  
+        stats = analyzer.load_or_calculate_gap_stats()  
+        summary = stats.summary()  
+        logger.info(f"{summary['count']:,} gaps: mean {summary['mean']:.1f} ns, std {summary['std']:.1f} ns, "  
+                    f"p50 {summary['p50']:.0f} ns, p99 {summary['p99']:.0f} ns, p99.9 {summary['p99.9']:.0f} ns; "  
+                    f"{stats.count_between(201, 20000):,.0f} within (200, 20000) ns")  
+
+        # 只从列式存储读取绘图窗口所需的块, 不加载完整的间隔数组  
+        start_idx, sample_size = 10200, 200  
+        time_gaps = analyzer.load_gap_window(start_idx, sample_size, min_gap=200)  
         
         # 生成图表  
-        analyzer.plot_time_gaps(time_gaps, output_file=output_file,start_idx=10200,sample_size=200)  
+        analyzer.plot_time_gaps(time_gaps, output_file=output_file,start_idx=start_idx,sample_size=sample_size,  
+                                offset=start_idx)  
         
         logger.info("Analysis completed successfully")  
         
@@ -0,0 +1,238 @@
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from dataplane_bench import git_commit, load
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = './resources/bench/'
+DATA_DIR = os.path.join(RESULTS_DIR, 'data')
+SIZES = (1_000_000, 10_000_000, 100_000_000)
+# 基准数据的生成参数: 突发间隔, 8个QP, 少量PFC帧
+GEN_ARGS = ('--gap-mode', 'bursty', '--gap', '800', '--burst', '64', '--idle', '20000',
+            '--qps', '8', '--pfc-ratio', '0.001', '--seed', '1')
+
+
+# 各阶段: 在计时外准备输入, 返回的函数为被测部分, 其返回值为处理的包数;
+# 间隔统计的包数为间隔数加1. 峰值RSS针对整个子进程, 包含准备阶段
+def _timegap_extract(pcap: str, log: str):
+    from analysis_cache import AnalysisCache
+    from timegap_view import PacketAnalyzer
+    analyzer = PacketAnalyzer(pcap, cache=AnalysisCache('./cache'))
+    return lambda: len(analyzer.extract_and_cache_mac_addresses())
+
+
+def _timegap_gaps(pcap: str, log: str):
+    from analysis_cache import AnalysisCache
+    from timegap_view import PacketAnalyzer
+    analyzer = PacketAnalyzer(pcap, cache=AnalysisCache('./cache'))
+    data = analyzer.extract_and_cache_mac_addresses()
+
+    def run():
+        analyzer.calculate_time_gaps(data)
+        return len(data)
+    return run
+
+
+def _timegap_gap_stats(pcap: str, log: str):
+    from analysis_cache import AnalysisCache
+    from timegap_view import PacketAnalyzer
+    analyzer = PacketAnalyzer(pcap, cache=AnalysisCache('./cache'))
+    return lambda: analyzer.load_or_calculate_gap_stats().count + 1
+
+
+def _time_diff_gap_stats(pcap: str, log: str):
+    import time_diff
+
+    def run():
+        stats = time_diff.cal_gap_stats(pcap)
+        time_diff.cal_histogram(stats, stats)
+        return stats.count + 1
+    return run
+
+
+def _prototype_extract(pcap: str, log: str):
+    import prototype_timediff
+    return lambda: len(prototype_timediff.extract_ethernet_src_address(pcap))
+
+
+def _prototype_histogram(pcap: str, log: str):
+    import prototype_timediff
+
+    def run():
+        prototype_timediff.load_histogram(pcap)
+        return prototype_timediff.cal_gap_stats(pcap).count + 1
+    return run
+
+
+def _draw_cdf_load(pcap: str, log: str):
+    import draw_cdf
+    return lambda: len(draw_cdf.load_log(log))
+
+
+def _draw_cdf_stats(pcap: str, log: str):
+    import draw_cdf
+    data = draw_cdf.load_log(log)
+
+    def run():
+        draw_cdf.get_cdf(data)
+        draw_cdf.windowed_utilization(data, window_ns=1000)
+        return len(data)
+    return run
+
+
+def _hft_gaps_cached(pcap: str, log: str):
+    # 统一入口在缓存命中时的冷启动: 计时包含解释器启动和全部导入
+    cmd = [sys.executable, os.path.join(TOOLS_DIR, 'hft.py'), '--json', 'gaps', pcap]
+    subprocess.run(cmd, check=True, capture_output=True)
+
+    def run():
+        proc = subprocess.run(cmd, check=True, capture_output=True, text=True)
+        return json.loads(proc.stdout)['count'] + 1
+    return run
+
+
+STAGES: Dict[str, Callable] = {
+    'timegap_view.extract': _timegap_extract,
+    'timegap_view.gaps': _timegap_gaps,
+    'timegap_view.gap_stats': _timegap_gap_stats,
+    'time_diff.gap_stats': _time_diff_gap_stats,
+    'prototype_timediff.extract': _prototype_extract,
+    'prototype_timediff.histogram': _prototype_histogram,
+    'draw_cdf.load_log': _draw_cdf_load,
+    'draw_cdf.cdf': _draw_cdf_stats,
+    'hft.gaps_cached': _hft_gaps_cached,
+}
+# 越大越好/越小越好的指标
+METRICS = [('pps', -1), ('peak_rss_mb', 1)]
+
+
+def ensure_data(packets: int, data_dir: str = DATA_DIR) -> Tuple[str, str]:
+    """按包数生成 (或复用) 基准抓包及对应的draw_cdf日志"""
+    os.makedirs(data_dir, exist_ok=True)
+    pcap = os.path.join(data_dir, f'roce_{packets}.pcap')
+    log = os.path.join(data_dir, f'roce_{packets}.log')
+    if not (os.path.exists(pcap) and os.path.exists(log)):
+        logger.info(f"Generating {packets:,}-packet benchmark input in {data_dir}")
+        # 先写临时文件再改名, 中断后不会留下不完整的输入
+        cmd = [sys.executable, os.path.join(TOOLS_DIR, 'gen_roce_pcap.py'), pcap + '.tmp',
+               '--packets', str(packets), '--log', log + '.tmp', *GEN_ARGS]
+        subprocess.run(cmd, check=True)
+        os.replace(pcap + '.tmp', pcap)
+        os.replace(log + '.tmp', log)
+    return pcap, log
+
+
+def run_stage(stage: str, pcap: str, log: str) -> Dict:
+    """在独立子进程中运行单个阶段, 由wait4取得该进程的峰值RSS; 缓存目录为临时目录, 每次都重新计算"""
+    with tempfile.TemporaryDirectory() as tmp:
+        out_file = os.path.join(tmp, 'stage.json')
+        cmd = [sys.executable, os.path.abspath(__file__), '_stage', stage,
+               os.path.abspath(pcap), os.path.abspath(log), out_file]
+        proc = subprocess.Popen(cmd, cwd=tmp, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        stderr = proc.stderr.read()
+        _, status, usage = os.wait4(proc.pid, 0)
+        code = os.waitstatus_to_exitcode(status)
+        if code != 0:
+            raise RuntimeError(f"Stage {stage} exited with {code}:\n{stderr.decode()}")
+        with open(out_file) as f:
+            result = json.load(f)
+    # Linux上ru_maxrss以KiB为单位
+    result['peak_rss_mb'] = usage.ru_maxrss / 1024
+    result['pps'] = result['packets'] / result['seconds'] if result['seconds'] else 0.0
+    return result
+
+
+def _stage_main(stage: str, pcap: str, log: str, out_file: str):
+    sys.path.insert(0, TOOLS_DIR)
+    logging.disable(logging.INFO)
+    run = STAGES[stage](pcap, log)
+    start = time.perf_counter()
+    packets = run()
+    seconds = time.perf_counter() - start
+    with open(out_file, 'w') as f:
+        json.dump({'packets': int(packets), 'seconds': seconds}, f)
+
+
+def run_suite(sizes, stages: List[str], data_dir: str = DATA_DIR) -> Dict:
+    results = {}
+    for packets in sizes:
+        pcap, log = ensure_data(packets, data_dir)
+        for stage in stages:
+            result = run_stage(stage, pcap, log)
+            results[f'{stage}@{packets}'] = result
+            logger.info(f"{stage} @ {packets:,}: {result['pps'] / 1e6:.2f} Mpps, "
+                        f"{result['seconds']:.2f} s, peak RSS {result['peak_rss_mb']:.0f} MiB")
+    return {'commit': git_commit(), 'results': results}
+
+
+def compare(base: Dict, new: Dict, threshold: float) -> List[str]:
+    """逐项比较吞吐和峰值内存, 返回超过阈值的回退项"""
+    regressions = []
+    print(f"{'stage':<40} {'metric':<12} {base.get('commit', 'base'):>12} {new.get('commit', 'new'):>12} {'change':>9}")
+    for name, n in new['results'].items():
+        b = base['results'].get(name)
+        if b is None:
+            continue
+        for metric, sign in METRICS:
+            change = (n[metric] - b[metric]) / b[metric] if b[metric] else 0.0
+            flag = ' <-- regression' if sign * change > threshold else ''
+            print(f"{name:<40} {metric:<12} {b[metric]:>12.1f} {n[metric]:>12.1f} {change:>+9.1%}{flag}")
+            if flag:
+                regressions.append(f'{name} {metric}')
+    return regressions
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '_stage':
+        _stage_main(*sys.argv[2:6])
+        return
+
+    parser = argparse.ArgumentParser(description='Benchmark the offline analysis tools on synthetic RoCE captures')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run = sub.add_parser('run', help='run the suite and store the JSON result under the current commit')
+    run.add_argument('--packets', type=int, nargs='+', default=list(SIZES))
+    run.add_argument('--stage', nargs='+', choices=list(STAGES), default=list(STAGES))
+    run.add_argument('--data-dir', default=DATA_DIR, help='where generated inputs are kept between runs')
+    run.add_argument('--output', help=f'result file (default: {RESULTS_DIR}tools_<commit>.json)')
+    run.add_argument('--baseline', help='compare against this result and fail on regression')
+    run.add_argument('--threshold', type=float, default=0.1, help='allowed relative loss in pps / growth in RSS')
+
+    cmp = sub.add_parser('compare', help='compare two stored results')
+    cmp.add_argument('base')
+    cmp.add_argument('new')
+    cmp.add_argument('--threshold', type=float, default=0.1)
+    args = parser.parse_args()
+
+    baseline: Optional[str] = None
+    if args.command == 'run':
+        result = run_suite(args.packets, args.stage, args.data_dir)
+        output = args.output or os.path.join(RESULTS_DIR, f"tools_{result['commit']}.json")
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(result, f, indent=2)
+        logger.info(f"Saved results to {output}")
+        baseline, new = args.baseline, result
+    else:
+        baseline, new = args.base, load(args.new)
+
+    if baseline:
+        regressions = compare(load(baseline), new, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()